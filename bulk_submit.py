@@ -0,0 +1,296 @@
+# bulk_submit.py
+"""
+Submits many /build and /revise requests to a running ds-project-builder
+and records how each one went. Used for load tests and for replaying
+captured production traffic after a change.
+
+Payloads are read from JSONL files (one request per line), JSON files
+(one request or a list of them) or directories of either. Requests for
+the same task are sent in round order, each round once the previous one
+has finished, so round-1/round-2 pairs replay correctly; different tasks
+run concurrently. Round 1 goes to /build and later rounds to /revise.
+
+Each job is followed via /jobs/<id> until it completes (or is "lost" if
+the server no longer knows it), and one JSON line per request (status,
+latencies, commit_sha, pages_url, stage timings) is written to the
+results file.
+
+    python bulk_submit.py requests/ --url http://127.0.0.1:8000 --concurrency 8 --rate 2
+    python bulk_submit.py captured.jsonl --fresh-nonces --task-suffix -replay --output replay.jsonl
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+import requests
+
+
+def load_payloads(paths: list) -> list[tuple[str, dict]]:
+    """(source, payload) pairs from JSONL/JSON files and directories, in file order."""
+    payloads = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.endswith((".json", ".jsonl"))
+            )
+            payloads += load_payloads(files)
+            continue
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for number, line in enumerate(f, 1):
+                    if line.strip():
+                        payloads.append((f"{path}:{number}", json.loads(line)))
+                continue
+            document = json.load(f)
+        for index, payload in enumerate(document if isinstance(document, list) else [document]):
+            payloads.append((f"{path}[{index}]" if isinstance(document, list) else path, payload))
+    return payloads
+
+
+def prepare(payloads: list, args) -> list[tuple[str, dict]]:
+    """Applies the command-line overrides to each payload."""
+    prepared = []
+    for source, payload in payloads:
+        payload = dict(payload)
+        if args.secret is not None:
+            payload["secret"] = args.secret
+        if args.evaluation_url:
+            payload["evaluation_url"] = args.evaluation_url
+        if args.task_suffix:
+            payload["task"] = f"{payload['task']}{args.task_suffix}"
+        if args.fresh_nonces:
+            # A replayed nonce would be answered from the server's idempotency store
+            payload["nonce"] = f"{payload.get('nonce', '')}-{uuid.uuid4().hex[:8]}"
+        prepared.append((source, payload))
+    return prepared
+
+
+def group_by_task(payloads: list) -> list[list[tuple[str, dict]]]:
+    """Per-task sequences in round order; tasks keep the order they first appear in."""
+    groups = {}
+    for source, payload in payloads:
+        groups.setdefault(payload.get("task"), []).append((source, payload))
+    return [sorted(group, key=lambda item: item[1].get("round", 1)) for group in groups.values()]
+
+
+class RatePacer:
+    """Spaces submissions at most `rate` per second (0 for no limit)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class BulkSubmitter:
+    """
+    Sends requests with at most `concurrency` in flight. HTTP calls run
+    on worker threads, each with its own keep-alive session.
+    """
+
+    def __init__(self, base_url: str, concurrency: int = 4, rate: float = 0, follow: bool = True,
+                 poll_interval: float = 2, job_timeout: float = 900, busy_retries: int = 0,
+                 endpoint: str | None = None, timeout: float = 60):
+        self.base_url = base_url.rstrip("/")
+        self.follow = follow
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+        self.busy_retries = busy_retries
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.pacer = RatePacer(rate)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._local = threading.local()
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        # Runs on a worker thread; sessions aren't shared between threads
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+
+    async def run_task(self, group: list, on_result) -> None:
+        """Submits one task's rounds in order, stopping at the first that fails."""
+        for position, (source, payload) in enumerate(group):
+            result = await self.submit(source, payload)
+            on_result(result)
+            if result["status"] not in ("complete", "accepted") and position < len(group) - 1:
+                for skipped_source, skipped in group[position + 1:]:
+                    on_result({**self._describe(skipped_source, skipped), "status": "skipped",
+                               "error": f"round {payload.get('round')} ended with status {result['status']}"})
+                return
+
+    async def submit(self, source: str, payload: dict) -> dict:
+        # A slot is held until the job is finished (or submitted, without following)
+        async with self._semaphore:
+            return await self._submit(source, payload)
+
+    async def _submit(self, source: str, payload: dict) -> dict:
+        result = self._describe(source, payload)
+        for attempt in range(self.busy_retries + 1):
+            await self.pacer.wait()
+            submitted = time.time()
+            try:
+                response = await asyncio.to_thread(self._request, "POST", result["endpoint"], json=payload)
+            except requests.RequestException as e:
+                return {**result, "status": "failed", "error": str(e)}
+            result.update(http_status=response.status_code, submit_latency=round(time.time() - submitted, 3))
+            retry_after = response.headers.get("Retry-After")
+            if response.status_code != 503 or attempt == self.busy_retries:
+                break
+            # The server is shedding load; wait as long as it asks
+            await asyncio.sleep(float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt)
+
+        if response.status_code not in (200, 202):
+            return {**result, "status": "rejected", "error": response.text[:500]}
+        try:
+            body = response.json()
+        except ValueError:
+            # e.g. an HTML page from a proxy in front of the service
+            return {**result, "status": "failed", "error": f"response is not JSON: {response.text[:200]}"}
+        result.update(job_id=body.get("job_id"), duplicate=body.get("duplicate", False))
+        if body.get("result") or not self.follow or not body.get("job_id"):
+            # Already finished (a duplicate of a done job), or not asked to wait
+            return {**result, **self._outcome(body.get("status"), body.get("result"), None, None), "latency": None}
+        return await self._follow(result, submitted)
+
+    async def _follow(self, result: dict, submitted: float) -> dict:
+        while time.time() - submitted < self.job_timeout:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                response = await asyncio.to_thread(self._request, "GET", f"/jobs/{result['job_id']}")
+            except requests.RequestException:
+                continue
+            if response.status_code == 404:
+                # The server no longer knows the job (e.g. it restarted); it will never finish
+                return {**result, "status": "lost", "error": "job not found on the server"}
+            if response.status_code != 200:
+                continue
+            try:
+                job = response.json()
+            except ValueError:
+                continue
+            if job["status"] in ("complete", "error"):
+                # Measured on our clock; the server's own accept-to-finish time is reported separately
+                # (finished_at is set just after the status changes, so a poll can see it missing)
+                server_latency = job["finished_at"] and round(job["finished_at"] - job["created_at"], 3)
+                return {**result, **self._outcome(job["status"], job["result"], job["error"], job["timings"]),
+                        "latency": round(time.time() - submitted, 3), "server_latency": server_latency}
+        return {**result, "status": "timeout", "error": f"job not finished after {self.job_timeout}s"}
+
+    def _describe(self, source: str, payload: dict) -> dict:
+        round_number = payload.get("round", 1)
+        return {
+            "source": source,
+            "task": payload.get("task"),
+            "round": round_number,
+            "nonce": payload.get("nonce"),
+            "endpoint": self.endpoint or ("/build" if round_number == 1 else "/revise"),
+        }
+
+    @staticmethod
+    def _outcome(status: str | None, job_result: dict | None, error: str | None, timings: dict | None) -> dict:
+        details = (job_result or {}).get("details") or {}
+        return {
+            "status": status,
+            "error": error,
+            "commit_sha": details.get("commit_sha"),
+            "pages_url": details.get("pages_url"),
+            "repo_url": details.get("repo_url"),
+            "pages_ready": ((job_result or {}).get("pages") or {}).get("ready"),
+            "timings": timings,
+        }
+
+
+def percentile(values: list, p: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))]
+
+
+def print_summary(results: list, wall: float):
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    print(f"{len(results)} request(s) in {wall:.1f}s: " + ", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+    latencies = [result["latency"] for result in results if result.get("latency") is not None]
+    if latencies:
+        print(f"job latency: p50 {percentile(latencies, 50):.1f}s, p95 {percentile(latencies, 95):.1f}s, "
+              f"max {max(latencies):.1f}s")
+
+
+async def run(args) -> list:
+    payloads = prepare(load_payloads(args.inputs), args)
+    groups = group_by_task(payloads)
+    print(f"🚀 Submitting {len(payloads)} request(s) for {len(groups)} task(s) to {args.url}")
+    submitter = BulkSubmitter(
+        args.url, concurrency=args.concurrency, rate=args.rate, follow=not args.no_follow,
+        poll_interval=args.poll_interval, job_timeout=args.job_timeout, busy_retries=args.busy_retries,
+        endpoint=args.endpoint, timeout=args.timeout,
+    )
+    results = []
+    with open(args.output, "w", encoding="utf-8") as out:
+        def on_result(result: dict):
+            # Written as results arrive, so an interrupted run still leaves a usable file
+            results.append(result)
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            print(f"  {result['status']:<8} {result['task']} round {result['round']}"
+                  + (f" ({result['latency']}s)" if result.get("latency") is not None else "")
+                  + (f": {result['error'][:120]}" if result.get("error") else ""))
+
+        await asyncio.gather(*(submitter.run_task(group, on_result) for group in groups))
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="JSONL/JSON files or directories of request payloads")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="base URL of the service")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight at once")
+    parser.add_argument("--rate", type=float, default=0, help="max submissions per second (0: no limit)")
+    parser.add_argument("--endpoint", help="send everything here instead of choosing /build or /revise by round")
+    parser.add_argument("--secret", help="replace each payload's secret")
+    parser.add_argument("--evaluation-url", help="replace each payload's evaluation_url")
+    parser.add_argument("--task-suffix", help="append this to every task name, to replay into separate repos")
+    parser.add_argument("--fresh-nonces", action="store_true", help="make nonces unique so replays aren't deduplicated")
+    parser.add_argument("--no-follow", action="store_true", help="don't wait for jobs to finish")
+    parser.add_argument("--poll-interval", type=float, default=2, help="seconds between job status checks")
+    parser.add_argument("--job-timeout", type=float, default=900, help="give up following a job after this many seconds")
+    parser.add_argument("--busy-retries", type=int, default=0, help="resubmit a 503 (busy) this many times, honouring Retry-After")
+    parser.add_argument("--timeout", type=float, default=60, help="per HTTP request timeout")
+    parser.add_argument("--output", default="bulk_results.jsonl", help="results file (one JSON line per request)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    started = time.perf_counter()
+    try:
+        results = asyncio.run(run(args))
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        return 2
+    print_summary(results, time.perf_counter() - started)
+    print(f"Results written to {args.output}")
+    return 0 if all(result["status"] == "complete" for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,41 @@
-# main.py
+# app.py
 
 import os # <-- Import the os module
 import re
-from fastapi import FastAPI, Request, HTTPException
-from pydantic import BaseModel
+import hmac
+import math
+import asyncio
+import uuid
+from fastapi import FastAPI, Request, HTTPException, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional
 import json
 from dotenv import load_dotenv
-from llm_handler import generate_app_with_llm, revise_app_with_llm # <-- Add revise_app_with_llm
-from github_handler import create_and_push_to_github, get_file_from_repo 
-from evaluation_handler import notify_evaluation_server # <-- IMPORT NOTIFIER
-
 
+# Before the local imports below, which read their settings at import time
 load_dotenv() # <-- Load variables from .env file
 
+import llm_handler
+from llm_handler import generate_app_with_llm, generate_until_valid, revise_app_with_llm # <-- Add revise_app_with_llm
+from output_validator import VALIDATION_MODE, VALIDATION_RETRIES, check_js_syntax, validate_files
+from github_handler import create_and_push_to_github, get_latest_files
+from github_client import get_github_client
+from artifact_store import get_artifact_store
+from circuit_breaker import JOBS_SHED, breaker_status, get_breaker
+from notification_outbox import OutboxDispatcher, get_outbox
+from job_manager import JobQueueFull, StageError, create_job_manager_from_env
+from pages_tracker import get_pages_tracker
+from idempotency import IdempotencyStore, create_idempotency_store_from_env
+from observability import get_logger, observe_stage, render_metrics, request_id_var
+from repo_pool import REPO_POOL_SIZE, RepoPoolProvisioner, get_repo_pool
+from request_spool import BodyTooLarge, Spool, read_spooled_json
+from warmup import WarmUp
+
+logger = get_logger(__name__)
+
+
 app = FastAPI()
 
 # GitHub Actions workflow for deploying to GitHub Pages
@@ -97,7 +119,7 @@ def sanitize_repo_name(task_name: str) -> str:
     
     return sanitized[:100]  # GitHub repo name max length
 
-# --- Pydantic models (no changes here) ---
+# --- Pydantic models ---
 class Attachment(BaseModel):
     name: str
     url: str
@@ -112,55 +134,127 @@ class BuildRequest(BaseModel):
     checks: List[str]
     evaluation_url: str
     attachments: Optional[List[Attachment]] = None
+    use_cache: bool = True  # Set to false to force a fresh LLM generation
 
-# --- Update the API endpoint ---
-# main.py
-
-# ... (other imports are the same) ...
+class BatchRequest(BaseModel):
+    requests: List[BuildRequest]
 
-from dotenv import load_dotenv
-from llm_handler import generate_app_with_llm # <-- IMPORT our new function
-
-load_dotenv()
-app = FastAPI()
+def json_body(model) -> dict:
+    # Documents a body that the endpoint reads itself with read_request()
+    schema = model.model_json_schema()
+    definitions = schema.pop("$defs", {})
 
-# ... (Pydantic models are the same) ...
-
-@app.post("/build")
-async def build_endpoint(req: BuildRequest):
-    
-    # 1. Verify Secret (no change here)
-    expected_secret = os.getenv("PROJECT_SECRET")
-    if req.secret != expected_secret:
-        raise HTTPException(status_code=403, detail="Invalid secret")
-    print("✅ --- SECRET VERIFIED --- ✅")
-
-    # 2. Generate code using the LLM (with attachments if provided)
-    # Convert Pydantic Attachment models to dicts for the LLM handler
-    attachments_list = [att.model_dump() for att in req.attachments] if req.attachments else None
-    
-    generated_files = generate_app_with_llm(req.brief, attachments_list)
-    
-    # 3. Check if files were generated and print them
-    if not generated_files:
-        return {"status": "error", "message": "LLM failed to generate code"}
-    print("✅ --- CODE GENERATED --- ✅")
+    def inline(node):
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return inline(definitions[node["$ref"].rsplit("/", 1)[-1]])
+            return {key: inline(value) for key, value in node.items()}
+        return [inline(value) for value in node] if isinstance(node, list) else node
 
-    # 3. Add a LICENSE file (as required by the project brief)
-    generated_files["LICENSE"] = MIT_LICENSE
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": inline(schema)}}}}
 
-    generated_files[".github/workflows/deploy.yml"] = GITHUB_PAGES_WORKFLOW
-    
-    # 4. Create repo and push files to GitHub
-    # Sanitize the task name to create a valid GitHub repo name
-    repo_name = sanitize_repo_name(req.task)
-    print(f"📝 Using sanitized repo name: {repo_name} (from task: {req.task})")
-    
-    github_details = create_and_push_to_github(repo_name, generated_files)
-    if not github_details:
-        return {"status": "error", "message": "Failed to push to GitHub"}
-    print("✅ --- CODE PUSHED TO GITHUB --- ✅")    # 5. Prepare and send the final notification
-    evaluation_payload = {
+async def read_request(request: Request, model):
+    """
+    Parses the JSON body into `model`, streaming it so attachment payloads
+    are spooled to disk instead of held in memory. Returns the parsed
+    model and its Spool; pass the spool on to release_spool_when_done().
+    """
+    spool = Spool()
+    try:
+        data = await read_spooled_json(request, spool)
+        parsed = model.model_validate(data)
+    except BodyTooLarge as e:
+        spool.cleanup()
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValidationError as e:
+        spool.cleanup()
+        # Same shape as FastAPI's own body validation errors
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)])
+    except ValueError as e:
+        spool.cleanup()
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+    except BaseException:
+        spool.cleanup()
+        raise
+    for req in parsed.requests if isinstance(parsed, BatchRequest) else [parsed]:
+        spool.adopt(req.attachments)
+    return parsed, spool
+
+_spool_releases = set()
+
+def release_spool_when_done(spool: Spool, entries: list):
+    # Attachment files stay on disk until every job that reads them has finished
+    jobs = [job_manager.get(entry["job_id"]) for entry in entries if entry.get("job_id")]
+    jobs = [job for job in jobs if job is not None and job.context.get("spool") is spool]
+    if not jobs:
+        spool.cleanup()
+        return
+
+    async def release():
+        await asyncio.gather(*(job.wait() for job in jobs))
+        spool.cleanup()
+
+    task = asyncio.get_running_loop().create_task(release())
+    _spool_releases.add(task)
+    task.add_done_callback(_spool_releases.discard)
+
+def request_attachments(ctx: dict) -> list | None:
+    # Lightweight references to the spooled files, never the payloads themselves
+    spool = ctx.get("spool")
+    return spool.resolve(ctx["req"].attachments) if spool else None
+
+job_manager = create_job_manager_from_env()
+idempotency_store = create_idempotency_store_from_env()
+outbox_dispatcher = OutboxDispatcher(get_outbox(), concurrency=int(os.getenv("OUTBOX_CONCURRENCY", "8")))
+
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    # Tags every log line for this request (and the job it starts) with one id
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    request_id_var.set(request_id)
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+# Slow initialization runs after startup; /ready reports when it is done
+warm_up = WarmUp({
+    "llm_sdk": lambda: llm_handler.llm_client.model,
+    "github": lambda: get_github_client().call("GET", "/rate_limit"),  # Free call; opens the TLS connection
+    "artifact_store": get_artifact_store,
+    "js_checker": lambda: check_js_syntax(""),  # Starts the Node.js syntax checker, if installed
+}, retry_interval=float(os.getenv("WARMUP_RETRY_INTERVAL", "10")))
+
+# Pre-created repos with Pages already live, so a new task only pays for its own push and deploy
+repo_pool = get_repo_pool() if REPO_POOL_SIZE > 0 else None
+repo_pool_provisioner = RepoPoolProvisioner(
+    repo_pool, {"LICENSE": MIT_LICENSE, ".github/workflows/deploy.yml": GITHUB_PAGES_WORKFLOW},
+    retry_interval=float(os.getenv("REPO_POOL_RETRY_INTERVAL", "30")),
+) if repo_pool else None
+
+@app.on_event("startup")
+async def start_outbox_dispatcher():
+    outbox_dispatcher.start()
+
+@app.on_event("startup")
+async def start_warm_up():
+    warm_up.start()
+
+@app.on_event("startup")
+async def start_repo_pool_provisioner():
+    if repo_pool_provisioner:
+        repo_pool_provisioner.start()
+
+@app.on_event("shutdown")
+async def stop_outbox_dispatcher():
+    await outbox_dispatcher.stop()
+
+@app.on_event("shutdown")
+async def stop_repo_pool_provisioner():
+    if repo_pool_provisioner:
+        await repo_pool_provisioner.stop()
+
+def _evaluation_payload(req: BuildRequest, github_details: dict) -> dict:
+    return {
         "email": req.email,
         "task": req.task,
         "round": req.round,
@@ -169,64 +263,300 @@ async def build_endpoint(req: BuildRequest):
         "commit_sha": github_details["commit_sha"],
         "pages_url": github_details["pages_url"],
     }
-    notify_evaluation_server(req.evaluation_url, evaluation_payload)
-    
-    print("✅ --- ENTIRE BUILD PROCESS COMPLETE --- ✅")
-    return {"status": "complete", "details": github_details}
 
-@app.get("/")
-def read_root():
-    return {"message": "API is running."}
+# --- Job stages (each runs inside its own bounded worker pool) ---
+
+async def generate_validated(generate, req: BuildRequest, trace: dict) -> dict | None:
+    # Catches truncated or broken output in milliseconds, instead of after a push and Pages deploy
+    if VALIDATION_MODE == "off":
+        return await generate(None)
+    files, problems = await generate_until_valid(
+        generate, lambda files: asyncio.to_thread(validate_files, files, req.checks), trace, VALIDATION_RETRIES
+    )
+    if problems:
+        if VALIDATION_MODE == "enforce":
+            raise StageError(f"Generated files failed validation: {'; '.join(problems)}")
+        logger.warning("⚠️ Pushing files that failed validation.")
+    return files
+
+async def generate_stage(ctx: dict):
+    req = ctx["req"]
+    attachments_list = request_attachments(ctx)
+    trace = ctx.setdefault("llm_trace", {})
+
+    generated_files = await generate_validated(lambda feedback: generate_app_with_llm(
+        req.brief, attachments_list, use_cache=req.use_cache, trace=trace, feedback=feedback
+    ), req, trace)
+    if not generated_files:
+        raise StageError("LLM failed to generate code")
+    logger.info("✅ --- CODE GENERATED --- ✅")
 
+    # Add a LICENSE file (as required by the project brief)
+    generated_files["LICENSE"] = MIT_LICENSE
+    generated_files[".github/workflows/deploy.yml"] = GITHUB_PAGES_WORKFLOW
+    ctx["files"] = generated_files
 
+def fetch_existing_stage(ctx: dict):
+    repo_name = ctx["repo_name"]
+    logger.info(f"🔄 Revising repo: {repo_name}")
 
-@app.post("/revise")
-async def revise_endpoint(req: BuildRequest):
-    # 1. Verify Secret
-    expected_secret = os.getenv("PROJECT_SECRET")
-    if req.secret != expected_secret:
-        raise HTTPException(status_code=403, detail="Invalid secret")
-    print("✅ --- REVISE REQUEST: SECRET VERIFIED --- ✅")
-
-    # 2. Sanitize the task name to get the repo name
-    repo_name = sanitize_repo_name(req.task)
-    print(f"🔄 Revising repo: {repo_name}")
+    existing_files = get_latest_files(repo_name)
+    if not existing_files or not existing_files.get("index.html"):
+        raise StageError(f"Could not fetch existing code from repo '{repo_name}'")
+    ctx["existing_html"] = existing_files["index.html"]
 
-    # 3. Fetch the existing index.html from the repo
-    existing_html = get_file_from_repo(repo_name, "index.html")
-    if not existing_html:
-        return {"status": "error", "message": f"Could not fetch existing code from repo '{repo_name}'"}
+async def revise_stage(ctx: dict):
+    req = ctx["req"]
+    attachments_list = request_attachments(ctx)
+    trace = ctx.setdefault("llm_trace", {})
 
-    # 4. Generate the revised code using the LLM (with attachments if provided)
-    # Convert Pydantic Attachment models to dicts for the LLM handler
-    attachments_list = [att.model_dump() for att in req.attachments] if req.attachments else None
-    
-    revised_files = revise_app_with_llm(req.brief, existing_html, attachments_list)
+    revised_files = await generate_validated(lambda feedback: revise_app_with_llm(
+        req.brief, ctx["existing_html"], attachments_list, use_cache=req.use_cache, trace=trace, feedback=feedback
+    ), req, trace)
     if not revised_files:
-        return {"status": "error", "message": "LLM failed to revise the code"}
-    print("✅ --- CODE REVISED BY LLM --- ✅")
+        raise StageError("LLM failed to revise the code")
+    logger.info("✅ --- CODE REVISED BY LLM --- ✅")
 
-    # 5. Add the deployment workflow file and LICENSE to ensure Pages keeps working
+    # Add the deployment workflow file and LICENSE to ensure Pages keeps working
     revised_files[".github/workflows/deploy.yml"] = GITHUB_PAGES_WORKFLOW
     revised_files["LICENSE"] = MIT_LICENSE
+    ctx["files"] = revised_files
 
-    # 6. Push the updated files back to the same GitHub repo
-    github_details = create_and_push_to_github(repo_name, revised_files)
+def push_stage(ctx: dict):
+    repo_name = ctx["repo_name"]
+    logger.info(f"📝 Using sanitized repo name: {repo_name} (from task: {ctx['req'].task})")
+
+    files = ctx.pop("files")
+    with observe_stage("github_push"):
+        github_details = create_and_push_to_github(repo_name, files, repo_pool=repo_pool)
     if not github_details:
-        return {"status": "error", "message": "Failed to push revised code to GitHub"}
-    print("✅ --- REVISED CODE PUSHED TO GITHUB --- ✅")
+        raise StageError("Failed to push to GitHub")
+    logger.info("✅ --- CODE PUSHED TO GITHUB --- ✅")
+    ctx["github_details"] = github_details
+
+    # Remember exactly what was pushed so the next /revise needn't fetch it
+    req = ctx["req"]
+    get_artifact_store().record_push(
+        repo_name, github_details["commit_sha"], files,
+        prompt_hash=ctx.get("llm_trace", {}).get("prompt_hash"), round=req.round, nonce=req.nonce,
+    )
+
+async def pages_stage(ctx: dict):
+    # Waits on the shared tracker's loop, so no worker thread is held meanwhile
+    github_details = ctx["github_details"]
+    with observe_stage("pages_wait"):
+        ctx["pages_status"] = await get_pages_tracker().wait(
+            ctx["repo_name"], github_details["commit_sha"], github_details["pages_url"]
+        )
+
+def notify_stage(ctx: dict):
+    # Persist the notification; OutboxDispatcher delivers it in the background
+    req = ctx["req"]
+    github_details = ctx["github_details"]
+    with observe_stage("notify_enqueue"):
+        notification_id = get_outbox().enqueue(req.evaluation_url, _evaluation_payload(req, github_details))
+    ctx["result"] = {
+        "status": "complete",
+        "details": github_details,
+        "pages": ctx.get("pages_status"),
+        "notification_id": notification_id,
+    }
 
-    # 7. Notify the evaluation server
-    evaluation_payload = {
-        "email": req.email,
-        "task": req.task,
-        "round": req.round,
-        "nonce": req.nonce,
-        "repo_url": github_details["repo_url"],
-        "commit_sha": github_details["commit_sha"],
-        "pages_url": github_details["pages_url"],
+BUILD_STAGES = [
+    ("generate", "llm", generate_stage),
+    ("push", "github", push_stage),
+    ("pages_wait", "pages", pages_stage),
+    ("notify", "notify", notify_stage),
+]
+
+REVISE_STAGES = [
+    ("fetch_existing", "github", fetch_existing_stage),
+    ("revise", "llm", revise_stage),
+    ("push", "github", push_stage),
+    ("pages_wait", "pages", pages_stage),
+    ("notify", "notify", notify_stage),
+]
+
+def verify_secret(req: BuildRequest):
+    with observe_stage("secret_check"):
+        expected_secret = os.getenv("PROJECT_SECRET")
+        if req.secret != expected_secret:
+            raise HTTPException(status_code=403, detail="Invalid secret")
+
+def has_operator_secret(request: Request) -> bool:
+    # Operational endpoints reveal student data and evaluation URLs, so they take the project secret
+    expected_secret = os.getenv("PROJECT_SECRET")
+    supplied_secret = request.headers.get("X-Project-Secret")
+    return bool(expected_secret and supplied_secret) and hmac.compare_digest(supplied_secret.encode(), expected_secret.encode())
+
+def enqueue_job(kind: str, stages: list, req: BuildRequest, response: Response, spool: Spool | None = None) -> dict:
+    # A retry of the same (email, task, round, nonce) reuses the original job
+    key = IdempotencyStore.key_for(req)
+    job = idempotency_store.get(key)
+    if job:
+        logger.info(f"♻️ Duplicate request for job {job.id} ({job.status})")
+        if job.done:
+            response.status_code = 200
+            return {"status": job.status, "job_id": job.id, "duplicate": True, "result": job.result}
+        return {"status": "accepted", "job_id": job.id, "status_url": f"/jobs/{job.id}", "duplicate": True}
+
+    # Every job needs Gemini and GitHub; while either is failing fast, refuse work instead of queueing it
+    unavailable = [breaker for breaker in (llm_handler.llm_client.breaker, get_breaker("github")) if breaker.is_open]
+    if unavailable:
+        for breaker in unavailable:
+            JOBS_SHED.inc(dependency=breaker.name)
+        retry_after = max(breaker.retry_after() for breaker in unavailable)
+        names = ", ".join(breaker.name for breaker in unavailable)
+        logger.warning(f"🚧 Rejected {kind} request: {names} unavailable")
+        raise HTTPException(status_code=503, detail=f"Temporarily unavailable: {names} is failing",
+                            headers={"Retry-After": str(math.ceil(retry_after) or 1)})
+
+    try:
+        # Same-repo jobs run fetch -> push one at a time, in arrival order, so rounds never race
+        repo_name = sanitize_repo_name(req.task)
+        context = {"req": req, "repo_name": repo_name, "spool": spool}
+        job = job_manager.submit(kind, stages, context, lock_key=repo_name, lock_until="push")
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Server is busy: {e}")
+    idempotency_store.put(key, job)
+    return {"status": "accepted", "job_id": job.id, "status_url": f"/jobs/{job.id}"}
+
+@app.post("/build", status_code=202, openapi_extra=json_body(BuildRequest))
+async def build_endpoint(request: Request, response: Response):
+    req, spool = await read_request(request, BuildRequest)
+    entries = []
+    try:
+        verify_secret(req)
+        logger.info("✅ --- SECRET VERIFIED --- ✅")
+        entries.append(enqueue_job("build", BUILD_STAGES, req, response, spool))
+        return entries[0]
+    finally:
+        release_spool_when_done(spool, entries)
+
+@app.get("/")
+def read_root():
+    return {"message": "API is running."}
+
+@app.get("/ready")
+def ready_endpoint():
+    # "/" answers as soon as the process is up; this waits for dependencies to be warm
+    status = warm_up.status()
+    if repo_pool:
+        # Informational only: an empty pool just means new repos are created on demand
+        status["repo_pool"] = {"size": REPO_POOL_SIZE, **repo_pool.counts()}
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+
+@app.get("/status")
+def status_endpoint(request: Request):
+    # Operational snapshot: dependency circuits, queue depth and stage pools. Breakers carry
+    # evaluation URLs and error text, so anonymous callers only learn whether we're ready.
+    if not has_operator_secret(request):
+        return {"ready": warm_up.ready}
+    return {
+        "ready": warm_up.ready,
+        "dependencies": breaker_status(),
+        "jobs": {"pending": job_manager.pending_count(), "max_pending": job_manager.max_pending},
+        "stages": {name: {"active": pool.active, "workers": pool.workers} for name, pool in job_manager.pools.items()},
+        "notifications": get_outbox().stats(),
     }
-    notify_evaluation_server(req.evaluation_url, evaluation_payload)
 
-    print("✅ --- ENTIRE REVISE PROCESS COMPLETE --- ✅")
-    return {"status": "complete", "details": github_details}
\ No newline at end of file
+@app.post("/revise", status_code=202, openapi_extra=json_body(BuildRequest))
+async def revise_endpoint(request: Request, response: Response):
+    req, spool = await read_request(request, BuildRequest)
+    entries = []
+    try:
+        verify_secret(req)
+        logger.info("✅ --- REVISE REQUEST: SECRET VERIFIED --- ✅")
+        entries.append(enqueue_job("revise", REVISE_STAGES, req, response, spool))
+        return entries[0]
+    finally:
+        release_spool_when_done(spool, entries)
+
+# --- Batch endpoints: every item is its own job, so items pipeline through the stage pools ---
+
+MAX_BATCH_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "100"))
+
+def enqueue_batch(kind: str, stages: list, batch: BatchRequest, spool: Spool) -> list[dict]:
+    if len(batch.requests) > MAX_BATCH_REQUESTS:
+        spool.cleanup()
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {MAX_BATCH_REQUESTS} requests")
+
+    entries = []
+    for index, req in enumerate(batch.requests):
+        # Items are judged individually: one bad secret or a full queue rejects only that item
+        try:
+            verify_secret(req)
+            entry = enqueue_job(kind, stages, req, Response(), spool)
+        except HTTPException as e:
+            entry = {"status": "rejected", "status_code": e.status_code, "error": e.detail}
+        entries.append({"index": index, "task": req.task, **entry})
+    logger.info(f"📦 Queued {kind} batch of {len(entries)} request(s)")
+    release_spool_when_done(spool, entries)
+    return entries
+
+def _batch_item_result(entry: dict, job) -> dict:
+    if job is None:
+        return entry
+    return {"index": entry["index"], "task": entry["task"], "job_id": job.id, "status": job.status,
+            "result": job.result, "error": job.error, "timings": job.timings}
+
+async def _stream_batch_results(entries: list, jobs: dict):
+    # One NDJSON line per item, in completion order
+    for entry in entries:
+        if entry["index"] not in jobs:
+            yield json.dumps(entry) + "\n"
+    waiting = {asyncio.ensure_future(job.wait()): index for index, job in jobs.items()}
+    try:
+        while waiting:
+            finished, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            for future in finished:
+                index = waiting.pop(future)
+                yield json.dumps(_batch_item_result(entries[index], jobs[index])) + "\n"
+    finally:
+        for future in waiting:
+            future.cancel()
+
+async def batch_response(entries: list, stream: bool, wait: bool):
+    jobs = {entry["index"]: job_manager.get(entry["job_id"]) for entry in entries if entry.get("job_id")}
+    jobs = {index: job for index, job in jobs.items() if job is not None}
+    if stream:
+        return StreamingResponse(_stream_batch_results(entries, jobs), media_type="application/x-ndjson")
+    if wait:
+        await asyncio.gather(*(job.wait() for job in jobs.values()))
+        return {"results": [_batch_item_result(entry, jobs.get(entry["index"])) for entry in entries]}
+    return JSONResponse(status_code=202, content={"results": entries})
+
+@app.post("/build/batch", openapi_extra=json_body(BatchRequest))
+async def build_batch_endpoint(request: Request, stream: bool = False, wait: bool = False):
+    """
+    Queues many builds at once. Returns the per-item job handles (202), or
+    with ?wait=true every item's final result, or with ?stream=true one
+    NDJSON line per item as it finishes.
+    """
+    batch, spool = await read_request(request, BatchRequest)
+    return await batch_response(enqueue_batch("build", BUILD_STAGES, batch, spool), stream, wait)
+
+@app.post("/revise/batch", openapi_extra=json_body(BatchRequest))
+async def revise_batch_endpoint(request: Request, stream: bool = False, wait: bool = False):
+    batch, spool = await read_request(request, BatchRequest)
+    return await batch_response(enqueue_batch("revise", REVISE_STAGES, batch, spool), stream, wait)
+
+@app.get("/jobs/{job_id}")
+def job_status_endpoint(job_id: str):
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/metrics")
+def metrics_endpoint():
+    # Prometheus text exposition format
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/notifications/dead")
+def dead_notifications_endpoint(request: Request, limit: int = 100):
+    if not has_operator_secret(request):
+        raise HTTPException(status_code=403, detail="Invalid secret")
+    return {"stats": get_outbox().stats(), "dead": get_outbox().dead_letters(limit)}
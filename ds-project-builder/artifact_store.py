@@ -0,0 +1,85 @@
+# artifact_store.py
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class ArtifactStore:
+    """
+    Records every push this service makes: all generated files plus the
+    commit SHA, prompt hash and round/nonce, keyed by repo and commit.
+    /revise reads the latest artifact instead of fetching from GitHub.
+    """
+
+    def __init__(self, db_path: str, keep_per_repo: int = 10):
+        self.db_path = db_path
+        self.keep_per_repo = keep_per_repo
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    repo TEXT NOT NULL,
+                    commit_sha TEXT NOT NULL,
+                    files TEXT NOT NULL,
+                    prompt_hash TEXT,
+                    round INTEGER,
+                    nonce TEXT,
+                    created_at REAL NOT NULL,
+                    verified_at REAL NOT NULL,
+                    PRIMARY KEY (repo, commit_sha)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_latest ON artifacts (repo, created_at)")
+
+    def record_push(self, repo: str, commit_sha: str, files: dict, prompt_hash: str | None = None,
+                    round: int | None = None, nonce: str | None = None):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (repo, commit_sha, json.dumps(files), prompt_hash, round, nonce, now, now),
+            )
+            # Older pushes are only kept as a short history
+            self._conn.execute(
+                """DELETE FROM artifacts WHERE repo = ? AND commit_sha NOT IN (
+                       SELECT commit_sha FROM artifacts WHERE repo = ? ORDER BY created_at DESC LIMIT ?)""",
+                (repo, repo, self.keep_per_repo),
+            )
+
+    def latest(self, repo: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM artifacts WHERE repo = ? ORDER BY created_at DESC LIMIT 1", (repo,)
+            ).fetchone()
+        if row is None:
+            return None
+        artifact = dict(row)
+        artifact["files"] = json.loads(artifact["files"])
+        return artifact
+
+    def mark_verified(self, repo: str, commit_sha: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE artifacts SET verified_at = ? WHERE repo = ? AND commit_sha = ?",
+                (time.time(), repo, commit_sha),
+            )
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """
+    Returns the process-wide artifact store, opening the database on first use.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore(os.getenv("ARTIFACT_DB_PATH", "artifacts.db"))
+        return _store
@@ -0,0 +1,342 @@
+# attachment_profiler.py
+import codecs
+import csv
+import json
+import random
+import re
+from collections import deque
+from observability import get_logger, observe_stage
+
+logger = get_logger(__name__)
+
+SAMPLE_ROWS = 5
+# JSON documents (not JSON Lines) need a full parse; larger ones are profiled as text
+MAX_JSON_PARSE_BYTES = 5 * 1024 * 1024
+
+
+def iter_text_lines(byte_chunks):
+    """
+    Incrementally decodes UTF-8 byte chunks and yields complete lines
+    (without line endings).
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    remainder = ""
+    for chunk in byte_chunks:
+        lines = (remainder + decoder.decode(chunk)).split("\n")
+        remainder = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+    remainder += decoder.decode(b"", final=True)
+    if remainder:
+        yield remainder.rstrip("\r")
+
+
+class RowSampler:
+    """
+    Keeps the first, last and a uniform random sample of rows in bounded memory.
+    """
+
+    def __init__(self, size: int = SAMPLE_ROWS, seed: int = 0):
+        self.size = size
+        self.count = 0
+        self.head = []
+        self.tail = deque(maxlen=size)
+        self.sample = []
+        self._random = random.Random(seed)
+
+    def add(self, row):
+        self.count += 1
+        if len(self.head) < self.size:
+            self.head.append(row)
+            return
+        self.tail.append(row)
+        # Reservoir sampling over the rows after the head
+        seen = self.count - self.size
+        if len(self.sample) < self.size:
+            self.sample.append(row)
+        elif self._random.randrange(seen) < self.size:
+            self.sample[self._random.randrange(self.size)] = row
+
+
+def _value_type(value, infer_from_text: bool = True) -> str:
+    if value is None or value == "":
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "int" if isinstance(value, int) else "float"
+    if isinstance(value, (list, dict)):
+        return "array" if isinstance(value, list) else "object"
+    if not infer_from_text:
+        return "string"
+    text = str(value).strip()
+    if text.lower() in ("true", "false"):
+        return "bool"
+    if re.fullmatch(r"[-+]?\d+", text):
+        return "int"
+    if re.fullmatch(r"[-+]?(\d+\.\d*|\.\d+|\d+)([eE][-+]?\d+)?", text):
+        return "float"
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}([ T].*)?", text):
+        return "date"
+    return "string"
+
+
+class ColumnStats:
+    """
+    Tracks the observed types and numeric range of one column. CSV values
+    are all text, so their types are inferred; JSON values keep their own.
+    """
+
+    def __init__(self, infer_from_text: bool = True):
+        self.infer_from_text = infer_from_text
+        self.types = {}
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value):
+        value_type = _value_type(value, self.infer_from_text)
+        self.types[value_type] = self.types.get(value_type, 0) + 1
+        if value_type in ("int", "float"):
+            number = float(value)
+            self.minimum = number if self.minimum is None else min(self.minimum, number)
+            self.maximum = number if self.maximum is None else max(self.maximum, number)
+
+    def describe(self) -> str:
+        non_null = {t: n for t, n in self.types.items() if t != "null"}
+        if not non_null:
+            return "empty"
+        # int and float mixed together is still a numeric column
+        if set(non_null) <= {"int", "float"}:
+            kind = "float" if "float" in non_null else "int"
+        else:
+            kind = max(non_null, key=non_null.get) if len(non_null) == 1 else "mixed(" + ", ".join(sorted(non_null)) + ")"
+        description = kind
+        if self.minimum is not None and kind in ("int", "float"):
+            description += f", range {self.minimum:g}..{self.maximum:g}"
+        if self.types.get("null"):
+            description += f", {self.types['null']} empty"
+        return description
+
+
+# Prose formats: never guessed to be CSV just because a line has a comma in it
+TEXT_MIME_TYPES = {"text/plain", "text/markdown", "text/x-markdown"}
+TEXT_EXTENSIONS = (".txt", ".md", ".markdown", ".rst")
+
+
+def sniff_format(name: str, mime_type: str, first_line: str) -> str:
+    lowered = name.lower()
+    if lowered.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    if mime_type == "application/json" or lowered.endswith(".json"):
+        return "json"
+    if mime_type in ("text/csv", "text/tab-separated-values") or lowered.endswith((".csv", ".tsv")):
+        return "csv"
+    if mime_type in TEXT_MIME_TYPES or lowered.endswith(TEXT_EXTENSIONS):
+        return "text"
+    stripped = first_line.lstrip()
+    if stripped.startswith("{") and stripped.rstrip().endswith("}"):
+        return "jsonl"
+    if stripped.startswith(("{", "[")):
+        return "json"
+    # Guess from the content only when neither the type nor the name says what the file is
+    untyped = mime_type in ("", "application/octet-stream") or "." not in lowered.rsplit("/", 1)[-1]
+    if untyped and ("," in first_line or "\t" in first_line or ";" in first_line):
+        return "csv"
+    return "text"
+
+
+def _profile_csv(lines, first_line: str) -> list[str]:
+    try:
+        dialect = csv.Sniffer().sniff(first_line, delimiters=",\t;|")
+    except csv.Error:
+        dialect = csv.excel
+    rows = csv.reader(lines, dialect)
+    header = next(rows, [])
+    columns = [ColumnStats() for _ in header]
+    sampler = RowSampler()
+    for row in rows:
+        if not row:
+            continue
+        sampler.add(row)
+        for stats, value in zip(columns, row):
+            stats.add(value)
+
+    out = [f"Format: CSV (delimiter {dialect.delimiter!r}), {sampler.count} data rows, {len(header)} columns"]
+    out.append("Columns:")
+    out += [f"  - {name}: {stats.describe()}" for name, stats in zip(header, columns)]
+    out += _render_samples(sampler, lambda row: dialect.delimiter.join(row), header=dialect.delimiter.join(header))
+    return out
+
+
+def _profile_json_records(records, label: str) -> list[str]:
+    sampler = RowSampler()
+    columns = {}
+    scalar_types = ColumnStats(infer_from_text=False)
+    for record in records:
+        sampler.add(record)
+        if isinstance(record, dict):
+            for key, value in record.items():
+                columns.setdefault(key, ColumnStats(infer_from_text=False)).add(value)
+        else:
+            scalar_types.add(record)
+
+    out = [f"Format: {label}, {sampler.count} records"]
+    if columns:
+        out.append("Fields:")
+        out += [f"  - {key}: {stats.describe()}" for key, stats in columns.items()]
+    if scalar_types.types:
+        out.append(f"Non-object items: {scalar_types.describe()}")
+    out += _render_samples(sampler, lambda record: json.dumps(record, ensure_ascii=False))
+    return out
+
+
+def _iter_jsonl(lines):
+    for line in lines:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield line
+
+
+def _profile_json(text: str) -> list[str] | None:
+    try:
+        document = json.loads(text)
+    except ValueError:
+        return None
+    if isinstance(document, list):
+        return _profile_json_records(document, "JSON array")
+    if isinstance(document, dict):
+        # Profile the largest array inside the object, if any (e.g. {"data": [...]})
+        arrays = {key: value for key, value in document.items() if isinstance(value, list)}
+        out = ["Format: JSON object", "Top-level keys:"]
+        out += [f"  - {key}: {_value_type(value)}" + (f" ({len(value)} items)" if isinstance(value, list) else "")
+                for key, value in document.items()]
+        if arrays:
+            key = max(arrays, key=lambda k: len(arrays[k]))
+            out += [f"Records under '{key}':"] + _profile_json_records(arrays[key], "JSON array")
+        else:
+            out += ["Content:", json.dumps(document, ensure_ascii=False)]
+        return out
+    return ["Format: JSON scalar", json.dumps(document)]
+
+
+def _profile_text(lines) -> list[str]:
+    sampler = RowSampler()
+    characters = 0
+    for line in lines:
+        sampler.add(line)
+        characters += len(line) + 1
+    out = [f"Format: text, {sampler.count} lines, {characters} characters"]
+    out += _render_samples(sampler, lambda line: line)
+    return out
+
+
+def _render_samples(sampler: RowSampler, render, header: str | None = None) -> list[str]:
+    out = []
+    prefix = [header] if header is not None else []
+    out += ["First rows:"] + prefix + [render(row) for row in sampler.head]
+    middle = [row for row in sampler.sample if row not in sampler.tail]
+    if middle:
+        out += ["Random sample of the middle rows:"] + [render(row) for row in middle]
+    if sampler.tail:
+        out += ["Last rows:"] + [render(row) for row in sampler.tail]
+    return out
+
+
+def _fit_budget(lines: list[str], budget: int) -> str:
+    text = "\n".join(lines)
+    if len(text) <= budget:
+        return text
+    marker = "\n… (profile truncated)"
+    cut = text[:max(0, budget - len(marker))]
+    # End on a whole line unless that would drop most of the output (e.g. one long JSON line)
+    if cut.rfind("\n") >= len(cut) // 2:
+        cut = cut[:cut.rindex("\n")]
+    return cut + marker
+
+
+def fits_verbatim(decoded_size: int, budget: int) -> bool:
+    """True if a data file is small enough to send whole instead of profiled."""
+    return decoded_size <= budget
+
+
+def profile_data(name: str, mime_type: str, decoded_size: int, read_chunks, budget: int = 3000) -> str:
+    """
+    Profiles data whose bytes come from `read_chunks()`, a function
+    returning a fresh iterator of byte chunks (called again if the data
+    has to be re-read). Data that fits in `budget` is returned verbatim.
+    """
+    if fits_verbatim(decoded_size, budget):
+        return codecs.decode(b"".join(read_chunks()), "utf-8", errors="replace")
+
+    lines = iter_text_lines(read_chunks())
+    first_line = next(lines, "")
+
+    def all_lines():
+        yield first_line
+        yield from lines
+
+    data_format = sniff_format(name, mime_type, first_line)
+    out = None
+    if data_format == "json" and decoded_size <= MAX_JSON_PARSE_BYTES:
+        out = _profile_json("\n".join(all_lines()))
+        if out is None:
+            # Re-read from the start: the first pass consumed the iterator
+            lines = iter_text_lines(read_chunks())
+            first_line = next(lines, "")
+    if out is None:
+        if data_format == "csv":
+            out = _profile_csv(all_lines(), first_line)
+        elif data_format == "jsonl":
+            out = _profile_json_records(_iter_jsonl(all_lines()), "JSON Lines")
+        else:
+            out = _profile_text(all_lines())
+
+    return _fit_budget([f"Size: ~{decoded_size} bytes"] + out, budget)
+
+
+def build_attachment_context(attachments: list | None, revision: bool = False, budget: int = 3000, image_uri=None) -> str:
+    """
+    Builds the attachment section of a generate or revise prompt from
+    spooled AttachmentRefs: images are passed through as data URIs (or
+    whatever `image_uri(ref)` returns in their place), data files are
+    included whole if they fit `budget` and replaced by their profile
+    otherwise.
+    """
+    attachment_context = ""
+    if not attachments:
+        return attachment_context
+
+    new = "New " if revision else ""
+    logger.info(f"📄 Processing {len(attachments)} attachment(s)...")
+    for attachment in attachments:
+        try:
+            mime_type = attachment.mime_type
+
+            # If it's an image, we tell the LLM to use the data URI directly.
+            if mime_type.startswith('image/'):
+                attachment_context += f"\n--- {new}Asset Attachment: {attachment.name} ---\n"
+                if revision:
+                    attachment_context += "Incorporate this new asset. Use its full Data URI as a source URL:\n"
+                else:
+                    attachment_context += "Use this full Data URI as a source URL (e.g., in an <img> src attribute):\n"
+                uri = image_uri(attachment) if image_uri else attachment.data_uri()
+                attachment_context += f"```\n{uri}\n```\n"
+            # Otherwise, we assume it's data and describe it.
+            else:
+                with observe_stage("attachment_profile"):
+                    profile = profile_data(attachment.name, mime_type, attachment.size, attachment.iter_bytes, budget)
+                attachment_context += f"\n--- {new}Data Attachment: {attachment.name} ---\n"
+                if revision:
+                    attachment_context += "Incorporate this new data into the application logic.\n"
+                if fits_verbatim(attachment.size, budget):
+                    attachment_context += "Full contents of the file:\n"
+                else:
+                    attachment_context += "Profile of the data (schema and sample rows, not the full file):\n"
+                attachment_context += f"```\n{profile}\n```\n"
+
+        except Exception as e:
+            logger.warning(f"⚠️  Could not process attachment {attachment.name}: {e}")
+
+    return attachment_context
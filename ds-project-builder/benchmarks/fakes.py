@@ -0,0 +1,382 @@
+# benchmarks/fakes.py
+"""
+Local stand-ins for Gemini, the GitHub REST API (including Pages
+deployments) and an evaluation server, with configurable latency and
+error injection, so the app can be benchmarked without network access.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+from google.api_core import exceptions as google_exceptions
+
+
+def _blob_sha(data: bytes) -> str:
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    error_rate = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status: int, body=None, headers: dict | None = None):
+        data = json.dumps(body).encode() if body is not None else b""
+        etag = '"' + hashlib.md5(data).hexdigest() + '"'
+        if self.command == "GET" and status == 200 and self.headers.get("If-None-Match") == etag:
+            status, data = 304, b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def _dispatch(self, method: str):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            return self.send_json(503, {"message": "injected failure"})
+        url = urlsplit(self.path)
+        self.route(method, url.path, dict(parse_qsl(url.query)))
+
+    def route(self, method: str, path: str, query: dict):
+        raise NotImplementedError
+
+
+def _serve(handler_class, **attributes) -> ThreadingHTTPServer:
+    handler = type(handler_class.__name__, (handler_class,), attributes)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=handler_class.__name__, daemon=True).start()
+    return server
+
+
+def server_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+# --- GitHub ---
+
+class FakeGitHubState:
+    """
+    In-memory repos, blobs, trees and commits. Pages deployments for a
+    commit succeed `pages_delay` seconds after the branch moves to it.
+    """
+
+    def __init__(self, owner: str = "bench", pages_delay: float = 0.0):
+        self.owner = owner
+        self.pages_delay = pages_delay
+        self.lock = threading.RLock()
+        self.repos = {}
+        self.blobs = {}
+        self.trees = {}
+        self.commits = {}
+        self.deployed_at = {}
+        self.calls = {}
+        self.budget = 5000
+        self.reset_at = time.time() + 3600
+
+    def store_tree(self, files: dict) -> str:
+        sha = hashlib.sha1(json.dumps(sorted(files.items())).encode()).hexdigest()
+        self.trees[sha] = dict(files)
+        return sha
+
+    def store_blob(self, data: bytes) -> str:
+        sha = _blob_sha(data)
+        self.blobs[sha] = data
+        return sha
+
+    def commit(self, files: dict, message: str, parents: list) -> str:
+        sha = hashlib.sha1(uuid.uuid4().bytes).hexdigest()
+        self.commits[sha] = {"sha": sha, "tree": {"sha": self.store_tree(files)}, "message": message,
+                             "parents": [{"sha": parent} for parent in parents]}
+        return sha
+
+    def move_head(self, repo: dict, sha: str):
+        repo["head"] = sha
+        self.deployed_at[sha] = time.time() + self.pages_delay
+
+    def create_repo(self, name: str, auto_init: bool) -> dict:
+        repo = {"name": name, "default_branch": "main", "html_url": f"https://github.com/{self.owner}/{name}",
+                "has_pages": False, "head": None}
+        if auto_init:
+            self.move_head(repo, self.commit({"README.md": self.store_blob(f"# {name}\n".encode())}, "Initial commit", []))
+        self.repos[name] = repo
+        return repo
+
+    def files_at_head(self, repo: dict) -> dict:
+        return self.trees[self.commits[repo["head"]]["tree"]["sha"]] if repo["head"] else {}
+
+
+class FakeGitHubHandler(_JSONHandler):
+    state: FakeGitHubState = None
+    rate_limit_rate = 0.0
+
+    def send_json(self, status: int, body=None, headers: dict | None = None):
+        with self.state.lock:
+            self.state.budget = max(0, self.state.budget - 1)
+            budget = self.state.budget
+        rate_headers = {"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": str(budget),
+                        "X-RateLimit-Reset": str(int(self.state.reset_at))}
+        super().send_json(status, body, {**rate_headers, **(headers or {})})
+
+    def route(self, method: str, path: str, query: dict):
+        state = self.state
+        if self.rate_limit_rate and random.random() < self.rate_limit_rate:
+            with state.lock:
+                state.calls["rate_limited"] = state.calls.get("rate_limited", 0) + 1
+            return self.send_json(403, {"message": "You have exceeded a secondary rate limit."}, {"Retry-After": "1"})
+        with state.lock:
+            state.calls[method] = state.calls.get(method, 0) + 1
+            if path == "/user":
+                return self.send_json(200, {"login": state.owner})
+            if path == "/rate_limit":
+                return self.send_json(200, {"resources": {"core": {"limit": 5000, "remaining": state.budget}}})
+            if path == "/user/repos" and method == "POST":
+                body = self.read_json()
+                if body["name"] in state.repos:
+                    return self.send_json(422, {"message": "name already exists on this account"})
+                return self.send_json(201, self._repo_json(state.create_repo(body["name"], body.get("auto_init"))))
+
+            match = re.match(r"^/repos/[^/]+/([^/]+)(/.*)?$", path)
+            repo = state.repos.get(match.group(1)) if match else None
+            if repo is None:
+                return self.send_json(404, {"message": "Not Found"})
+            rest = match.group(2) or ""
+            handler = getattr(self, f"_{method.lower()}_repo", None)
+            return handler(state, repo, rest, query) if handler else self.send_json(405, {"message": "Method Not Allowed"})
+
+    def _get_repo(self, state: FakeGitHubState, repo: dict, rest: str, query: dict):
+        if rest == "":
+            return self.send_json(200, self._repo_json(repo))
+        if rest.startswith("/git/ref/heads/"):
+            if not repo["head"]:
+                return self.send_json(409, {"message": "Git Repository is empty."})
+            return self.send_json(200, {"object": {"sha": repo["head"]}})
+        if rest.startswith("/git/commits/"):
+            return self.send_json(200, state.commits[rest.rsplit("/", 1)[1]])
+        if rest.startswith("/git/trees/"):
+            sha = rest.rsplit("/", 1)[1]
+            return self.send_json(200, {"sha": sha, "tree": [
+                {"path": path, "sha": blob, "type": "blob", "mode": "100644"} for path, blob in state.trees[sha].items()
+            ]})
+        if rest.startswith("/contents/"):
+            file_path = rest[len("/contents/"):]
+            files = state.files_at_head(repo)
+            if file_path not in files:
+                return self.send_json(404, {"message": "Not Found"})
+            content = base64.b64encode(state.blobs[files[file_path]]).decode()
+            return self.send_json(200, {"sha": files[file_path], "path": file_path, "content": content})
+        if rest == "/deployments":
+            sha = query.get("sha")
+            if sha not in state.deployed_at:
+                return self.send_json(200, [])
+            statuses_url = f"http://{self.headers['Host']}/repos/{state.owner}/{repo['name']}/deployments/{sha}/statuses"
+            return self.send_json(200, [{"sha": sha, "statuses_url": statuses_url}])
+        if rest.startswith("/deployments/") and rest.endswith("/statuses"):
+            sha = rest.split("/")[2]
+            ready = time.time() >= state.deployed_at.get(sha, float("inf"))
+            return self.send_json(200, [{"state": "success" if ready else "in_progress"}])
+        return self.send_json(404, {"message": "Not Found"})
+
+    def _post_repo(self, state: FakeGitHubState, repo: dict, rest: str, query: dict):
+        body = self.read_json()
+        if rest == "/git/trees":
+            files = dict(state.trees[body["base_tree"]]) if body.get("base_tree") else {}
+            for element in body["tree"]:
+                files[element["path"]] = state.store_blob(element["content"].encode())
+            return self.send_json(201, {"sha": state.store_tree(files)})
+        if rest == "/git/commits":
+            return self.send_json(201, {"sha": state.commit(state.trees[body["tree"]], body["message"], body["parents"])})
+        if rest == "/pages":
+            if repo["has_pages"]:
+                return self.send_json(409, {"message": "GitHub Pages is already enabled."})
+            repo["has_pages"] = True
+            return self.send_json(201, {})
+        return self.send_json(404, {"message": "Not Found"})
+
+    def _put_repo(self, state: FakeGitHubState, repo: dict, rest: str, query: dict):
+        if not rest.startswith("/contents/"):
+            return self.send_json(404, {"message": "Not Found"})
+        body = self.read_json()
+        files = dict(state.files_at_head(repo))
+        files[rest[len("/contents/"):]] = state.store_blob(base64.b64decode(body["content"]))
+        state.move_head(repo, state.commit(files, body["message"], [repo["head"]] if repo["head"] else []))
+        return self.send_json(200 if body.get("sha") else 201, {"commit": {"sha": repo["head"]}})
+
+    def _patch_repo(self, state: FakeGitHubState, repo: dict, rest: str, query: dict):
+        body = self.read_json()
+        if rest == "":
+            del state.repos[repo["name"]]
+            repo["name"] = body["name"]
+            repo["html_url"] = f"https://github.com/{state.owner}/{body['name']}"
+            state.repos[body["name"]] = repo
+            return self.send_json(200, self._repo_json(repo))
+        if rest.startswith("/git/refs/heads/"):
+            state.move_head(repo, body["sha"])
+            return self.send_json(200, {"object": {"sha": repo["head"]}})
+        return self.send_json(404, {"message": "Not Found"})
+
+    @staticmethod
+    def _repo_json(repo: dict) -> dict:
+        return {key: value for key, value in repo.items() if key != "head"}
+
+
+def start_fake_github(owner: str = "bench", latency: float = 0.0, error_rate: float = 0.0, pages_delay: float = 0.0,
+                      rate_limit_rate: float = 0.0) -> tuple[ThreadingHTTPServer, FakeGitHubState]:
+    """`rate_limit_rate` of requests get a secondary rate-limit 403 with Retry-After: 1."""
+    state = FakeGitHubState(owner, pages_delay)
+    server = _serve(FakeGitHubHandler, state=state, latency=latency, error_rate=error_rate,
+                    rate_limit_rate=rate_limit_rate)
+    return server, state
+
+
+# --- Evaluation server ---
+
+class FakeEvaluatorHandler(_JSONHandler):
+    received: dict = None
+
+    def route(self, method: str, path: str, query: dict):
+        if method != "POST":
+            return self.send_json(405, {"message": "Method Not Allowed"})
+        payload = self.read_json()
+        self.received[payload.get("nonce")] = (time.time(), payload)
+        return self.send_json(200, {"status": "ok"})
+
+
+def start_fake_evaluator(latency: float = 0.0, error_rate: float = 0.0) -> tuple[ThreadingHTTPServer, dict]:
+    """Returns the server and a dict of nonce -> (received_at, payload)."""
+    received = {}
+    server = _serve(FakeEvaluatorHandler, received=received, latency=latency, error_rate=error_rate)
+    return server, received
+
+
+# --- Gemini ---
+
+def fake_index_html(size: int) -> str:
+    """
+    A page of roughly `size` characters with a stable anchor line for
+    SEARCH/REPLACE edits and an inline script for the validation gate.
+    """
+    filler = "\n".join(f"      <p>Section {i}: lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>"
+                       for i in range(max(1, size // 80)))
+    return ("<!DOCTYPE html>\n<html>\n  <head>\n    <title>Benchmark App</title>\n  </head>\n  <body>\n"
+            "    <main>\n      <!-- bench:content -->\n" + filler + "\n    </main>\n"
+            "    <script>\n      document.title = `Benchmark App (${document.querySelectorAll('p').length})`;\n    </script>\n"
+            "  </body>\n</html>\n")
+
+
+class _Usage:
+    def __init__(self, prompt_tokens: int, response_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = response_tokens
+        self.total_token_count = prompt_tokens + response_tokens
+
+
+class _TokenCount:
+    def __init__(self, total_tokens: int):
+        self.total_tokens = total_tokens
+
+
+class _Chunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _FakeResponse:
+    def __init__(self, text: str, prompt: str, chunk_delay: float = 0.0, chunk_chars: int = 2000):
+        self.text = text
+        self.usage_metadata = _Usage(len(prompt) // 4, len(text) // 4)
+        self._chunk_delay = chunk_delay
+        self._chunk_chars = chunk_chars
+
+    async def __aiter__(self):
+        for start in range(0, len(self.text), self._chunk_chars):
+            if self._chunk_delay:
+                await asyncio.sleep(self._chunk_delay)
+            yield _Chunk(self.text[start:start + self._chunk_chars])
+
+
+class FakeGenerativeModel:
+    """
+    Stands in for genai.GenerativeModel: answers generate_content_async
+    with a well-formed file-block response after `latency` seconds
+    (split across the streamed chunks), failing `error_rate` of calls
+    with a retryable ServiceUnavailable. `slow_rate` of calls take
+    `slow_latency` instead, and `malformed_rate` of responses lack their
+    file markers.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, html_size: int = 8000, chunks: int = 8,
+                 slow_rate: float = 0.0, slow_latency: float = 0.0, malformed_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.malformed_rate = malformed_rate
+        self.html_size = html_size
+        self.chunks = chunks
+        self.calls = 0
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        self.calls += 1
+        if self.error_rate and random.random() < self.error_rate:
+            await asyncio.sleep(self.latency / 4)
+            raise google_exceptions.ServiceUnavailable("injected failure")
+
+        latency = self.slow_latency if self.slow_rate and random.random() < self.slow_rate else self.latency
+        text = self._respond(prompt)
+        if self.malformed_rate and random.random() < self.malformed_rate:
+            text = "Sure! Here is your app:\n" + text.replace("[START", "[BEGIN")
+        if not stream:
+            await asyncio.sleep(latency)
+            return _FakeResponse(text, prompt)
+        chunk_chars = max(1, len(text) // self.chunks + 1)
+        return _FakeResponse(text, prompt, chunk_delay=latency / self.chunks, chunk_chars=chunk_chars)
+
+    async def count_tokens_async(self, contents: str):
+        return _TokenCount(len(contents) // 4)
+
+    def _respond(self, prompt: str) -> str:
+        readme = "[START README.md]\n# Benchmark App\n\nGenerated offline for benchmarking.\n[END README.md]\n"
+        if "[START index.html.patch]" in prompt:
+            edit = (
+                "<<<<<<< SEARCH\n      <!-- bench:content -->\n=======\n"
+                f"      <!-- bench:content -->\n      <p>Revision {uuid.uuid4().hex[:8]}</p>\n>>>>>>> REPLACE\n"
+            )
+            return f"[START index.html.patch]\n{edit}[END index.html.patch]\n{readme}"
+        html = fake_index_html(self.html_size)
+        # Use an attached image the way a real model would, by its (elided) data URI
+        image = re.search(r"data:image/[\w.+-]+;base64,[\w+/=]+", prompt)
+        if image:
+            html = html.replace("<main>", f'<main>\n      <img src="{image.group(0)}" alt="attachment">', 1)
+        return f"[START index.html]\n{html}[END index.html]\n{readme}"
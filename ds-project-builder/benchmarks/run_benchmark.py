@@ -0,0 +1,385 @@
+# benchmarks/run_benchmark.py
+"""
+Offline end-to-end benchmark of /build and /revise.
+
+Runs the real app under uvicorn against local fake Gemini, GitHub and
+evaluation servers, drives N concurrent requests through it and reports
+p50/p95/p99 latency (end to end, per job stage and until the evaluator
+is notified), throughput and memory. Results can be saved as a baseline
+and later runs compared against it.
+
+Run from the ds-project-builder directory:
+
+    python -m benchmarks.run_benchmark --requests 50 --concurrency 10
+    python -m benchmarks.run_benchmark --scenario revise --baseline benchmarks/baselines/revise.json
+    python -m benchmarks.run_benchmark --save-baseline benchmarks/baselines/build.json
+"""
+import argparse
+import base64
+import json
+import math
+import os
+import resource
+import socket
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from benchmarks.fakes import FakeGenerativeModel, server_url, start_fake_evaluator, start_fake_github
+
+SECRET = "benchmark-secret"
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def rank(p):
+        return round(ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))], 4)
+
+    return {"p50": rank(50), "p95": rank(95), "p99": rank(99), "max": round(ordered[-1], 4)}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def configure_environment(args, workdir: str, github_url: str):
+    """
+    Points the app at the fakes. Must run before `app` is imported, since
+    the app reads its configuration at import time. Anything already set
+    in the environment wins, so limits can be tuned per run.
+    """
+    defaults = {
+        "GOOGLE_API_KEY": "benchmark",
+        "GITHUB_PAT": "benchmark",
+        "GITHUB_USERNAME": "bench",
+        "GITHUB_API_URL": github_url,
+        "PROJECT_SECRET": SECRET,
+        "OUTBOX_DB_PATH": os.path.join(workdir, "outbox.db"),
+        "ARTIFACT_DB_PATH": os.path.join(workdir, "artifacts.db"),
+        "REPO_POOL_DB_PATH": os.path.join(workdir, "repo_pool.db"),
+        "REPO_POOL_SIZE": str(args.repo_pool),
+        "LLM_CACHE_ENABLED": "false",
+        "LLM_REQUESTS_PER_MINUTE": "100000",
+        "LLM_TOKENS_PER_MINUTE": "1000000000",
+        "LLM_HEDGE_MIN_DELAY": "0.1",
+        "GITHUB_WRITE_INTERVAL": str(args.github_write_interval),
+        "PAGES_WAIT_TIMEOUT": "60",
+        "PAGES_POLL_INITIAL_DELAY": "0.1",
+        "PAGES_POLL_MAX_DELAY": "0.5",
+        "JOB_MAX_PENDING": str(max(100, args.requests)),
+        "LOG_LEVEL": "INFO" if args.verbose else "WARNING",
+    }
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+
+def start_app(model: FakeGenerativeModel):
+    """
+    Starts the app under uvicorn on a free port and waits for /ready.
+    Returns (server, thread, base_url, startup timings).
+    """
+    import uvicorn
+    import_started = time.perf_counter()
+    import app
+    import_seconds = time.perf_counter() - import_started
+    import llm_handler
+
+    llm_handler.llm_client.model = model
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app.app, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, name="uvicorn", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    listening_seconds = time.perf_counter() - import_started
+    host, port = sock.getsockname()
+    base_url = f"http://{host}:{port}"
+    while requests.get(f"{base_url}/ready", timeout=5).status_code != 200:
+        time.sleep(0.01)
+    startup = {
+        "import_seconds": round(import_seconds, 3),
+        "listening_seconds": round(listening_seconds, 3),
+        "ready_seconds": round(time.perf_counter() - import_started, 3),
+    }
+    # Start measuring with a full pool, as a long-running server would have
+    while app.repo_pool and app.repo_pool.counts().get("ready", 0) < app.REPO_POOL_SIZE:
+        time.sleep(0.05)
+    return server, thread, base_url, startup
+
+
+def sample_attachments(size_kb: int) -> list:
+    """An image and a CSV file of about `size_kb` KB each, as data URIs."""
+    image = base64.b64encode(os.urandom(size_kb * 1024)).decode("ascii")
+    rows = "".join(f"{i},item-{i},{i * 1.5}\n" for i in range(size_kb * 1024 // 20))
+    csv_data = base64.b64encode(("id,name,price\n" + rows).encode()).decode("ascii")
+    return [{"name": "photo.png", "url": f"data:image/png;base64,{image}"},
+            {"name": "items.csv", "url": f"data:text/csv;base64,{csv_data}"}]
+
+
+class Driver:
+    """Submits requests from a thread pool and follows each job to completion."""
+
+    def __init__(self, base_url: str, evaluation_url: str, poll_interval: float = 0.05, job_timeout: float = 300,
+                 attachment_kb: int = 0):
+        self.base_url = base_url
+        self.evaluation_url = evaluation_url
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+        self.attachments = sample_attachments(attachment_kb) if attachment_kb else None
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def payload(self, task: str, round_number: int) -> dict:
+        return {
+            "email": "bench@example.com",
+            "secret": SECRET,
+            "task": task,
+            "round": round_number,
+            "nonce": uuid.uuid4().hex,
+            "brief": f"Round {round_number}: build a page that shows a counter and a table of sample data.",
+            "checks": ["Page has a counter", "Page has a table"],
+            "evaluation_url": self.evaluation_url,
+            "use_cache": False,
+            "attachments": self.attachments,
+        }
+
+    def run_one(self, endpoint: str, payload: dict) -> dict:
+        session = self._session()
+        submitted = time.time()
+        response = session.post(f"{self.base_url}{endpoint}", json=payload, timeout=30)
+        outcome = {"nonce": payload["nonce"], "submitted": submitted, "http_status": response.status_code}
+        if response.status_code not in (200, 202):
+            return {**outcome, "status": "rejected", "error": response.text[:200]}
+
+        job_id = response.json()["job_id"]
+        while time.time() - submitted < self.job_timeout:
+            job = session.get(f"{self.base_url}/jobs/{job_id}", timeout=30).json()
+            if job["status"] in ("complete", "error"):
+                return {**outcome, "status": job["status"], "error": job["error"], "timings": job["timings"],
+                        "latency": job["finished_at"] - submitted, "finished": job["finished_at"]}
+            time.sleep(self.poll_interval)
+        return {**outcome, "status": "timeout"}
+
+    def run_batch(self, endpoint: str, payloads: list) -> tuple[list, float]:
+        """Submits all payloads as one streamed batch request."""
+        started = time.perf_counter()
+        submitted = time.time()
+        outcomes = [{"nonce": payload["nonce"], "submitted": submitted, "status": "timeout"} for payload in payloads]
+        with self._session().post(f"{self.base_url}{endpoint}/batch", params={"stream": "true"},
+                                  json={"requests": payloads}, stream=True, timeout=self.job_timeout) as response:
+            for line in response.iter_lines():
+                item = json.loads(line)
+                outcome = outcomes[item["index"]]
+                outcome.update(status=item["status"], error=item.get("error"), timings=item.get("timings"),
+                               latency=time.time() - submitted)
+        return outcomes, time.perf_counter() - started
+
+    def run_all(self, endpoint: str, payloads: list, concurrency: int) -> tuple[list, float]:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(lambda payload: self.run_one(endpoint, payload), payloads))
+        return outcomes, time.perf_counter() - started
+
+
+def wait_for_notifications(received: dict, nonces: list, timeout: float) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline and any(nonce not in received for nonce in nonces):
+        time.sleep(0.05)
+
+
+def summarize(args, outcomes: list, wall: float, received: dict, memory: dict) -> dict:
+    completed = [outcome for outcome in outcomes if outcome["status"] == "complete"]
+    stages = {}
+    for outcome in completed:
+        for stage, seconds in outcome["timings"].items():
+            stages.setdefault(stage, []).append(seconds)
+    notify = [received[outcome["nonce"]][0] - outcome["submitted"] for outcome in completed if outcome["nonce"] in received]
+    return {
+        "scenario": args.scenario,
+        "requests": args.requests,
+        "concurrency": "batch" if args.batch else args.concurrency,
+        "repos": args.repos or args.requests,
+        "fakes": {
+            "llm_latency": args.llm_latency,
+            "llm_slow_rate": args.llm_slow_rate,
+            "llm_malformed_rate": args.llm_malformed_rate,
+            "github_latency": args.github_latency,
+            "github_rate_limit_rate": args.github_rate_limit_rate,
+            "github_write_interval": args.github_write_interval,
+            "pages_delay": args.pages_delay,
+            "evaluator_latency": args.evaluator_latency,
+            "error_rate": args.error_rate,
+        },
+        "completed": len(completed),
+        "failed": len(outcomes) - len(completed),
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(completed) / wall, 3) if wall else 0,
+        "latency": {
+            "end_to_end": percentiles([outcome["latency"] for outcome in completed]),
+            "until_notified": percentiles(notify),
+            "stages": {stage: percentiles(values) for stage, values in stages.items()},
+        },
+        "memory": memory,
+    }
+
+
+def compare_to_baseline(report: dict, baseline: dict, tolerance: float, noise_floor: float = 0.05) -> list[str]:
+    """
+    Returns a description of every p95 latency that grew, or throughput
+    that fell, by more than `tolerance` relative to the baseline.
+    Latencies under `noise_floor` seconds in the baseline are ignored.
+    """
+    regressions = []
+
+    def check_latency(name, current, previous):
+        if current and previous and previous["p95"] >= noise_floor and current["p95"] > previous["p95"] * (1 + tolerance):
+            regressions.append(f"{name} p95 {previous['p95']}s -> {current['p95']}s")
+
+    check_latency("end_to_end", report["latency"]["end_to_end"], baseline["latency"]["end_to_end"])
+    check_latency("until_notified", report["latency"]["until_notified"], baseline["latency"]["until_notified"])
+    for stage, previous in baseline["latency"]["stages"].items():
+        check_latency(f"stage {stage}", report["latency"]["stages"].get(stage), previous)
+    if "startup" in baseline and "startup" in report:
+        previous, current = baseline["startup"]["ready_seconds"], report["startup"]["ready_seconds"]
+        if previous >= noise_floor and current > previous * (1 + tolerance):
+            regressions.append(f"startup ready {previous}s -> {current}s")
+    if report["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        regressions.append(f"throughput {baseline['throughput_rps']} -> {report['throughput_rps']} req/s")
+    return regressions
+
+
+def print_report(report: dict):
+    print(f"\n{report['scenario']}: {report['completed']}/{report['requests']} complete "
+          f"at concurrency {report['concurrency']} in {report['wall_seconds']}s "
+          f"({report['throughput_rps']} req/s, {report['failed']} failed)")
+    print(f"{'':24}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    rows = [("end to end", report["latency"]["end_to_end"]), ("until notified", report["latency"]["until_notified"])]
+    rows += [(f"  {stage}", values) for stage, values in report["latency"]["stages"].items()]
+    for name, values in rows:
+        if values:
+            print(f"{name:24}" + "".join(f"{values[key]:>10.3f}" for key in ("p50", "p95", "p99", "max")))
+    memory = report["memory"]
+    if "startup" in report:
+        startup = report["startup"]
+        print(f"startup: app import {startup['import_seconds']}s, listening at {startup['listening_seconds']}s, "
+              f"ready at {startup['ready_seconds']}s")
+    print(f"memory: peak RSS {memory['peak_rss_mb']} MB (+{memory['rss_growth_mb']} MB during the run)"
+          + (f", peak traced allocations {memory['traced_peak_mb']} MB" if "traced_peak_mb" in memory else ""))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=("build", "revise"), default="build",
+                        help="revise first builds every task (unmeasured), then measures round-2 revisions")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--batch", action="store_true", help="submit everything as one streamed /batch request")
+    parser.add_argument("--repos", type=int, help="spread requests over this many repos (default: one repo per request)")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake Gemini call")
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0, help="fraction of Gemini calls that are slow")
+    parser.add_argument("--llm-slow-latency", type=float, default=5.0, help="seconds per slow Gemini call")
+    parser.add_argument("--llm-malformed-rate", type=float, default=0.0, help="fraction of responses without file markers")
+    parser.add_argument("--attachment-kb", type=int, default=0, help="attach an image and a CSV of this many KB to each request")
+    parser.add_argument("--html-size", type=int, default=8000, help="characters in each generated index.html")
+    parser.add_argument("--github-latency", type=float, default=0.02, help="seconds per fake GitHub request")
+    parser.add_argument("--github-rate-limit-rate", type=float, default=0.0,
+                        help="fraction of GitHub requests rejected with a secondary rate limit")
+    parser.add_argument("--github-write-interval", type=float, default=0.0,
+                        help="GITHUB_WRITE_INTERVAL for the app (production default is 1s)")
+    parser.add_argument("--repo-pool", type=int, default=0, help="pre-provisioned repos to keep ready (REPO_POOL_SIZE)")
+    parser.add_argument("--pages-delay", type=float, default=0.5, help="seconds until a pushed commit is deployed")
+    parser.add_argument("--evaluator-latency", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of fake calls that fail with a 503")
+    parser.add_argument("--tracemalloc", action="store_true", help="also trace Python allocations (slower)")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="compare against this JSON report; exits 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression vs. the baseline")
+    parser.add_argument("--save-baseline", help="write this run's report as the new baseline")
+    parser.add_argument("--verbose", action="store_true", help="show the app's logs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="ds-bench-")
+    github_server, github_state = start_fake_github(latency=args.github_latency, error_rate=args.error_rate,
+                                                    pages_delay=args.pages_delay,
+                                                    rate_limit_rate=args.github_rate_limit_rate)
+    evaluator_server, received = start_fake_evaluator(latency=args.evaluator_latency, error_rate=args.error_rate)
+    configure_environment(args, workdir, server_url(github_server))
+
+    model = FakeGenerativeModel(latency=args.llm_latency, error_rate=args.error_rate, html_size=args.html_size,
+                                slow_rate=args.llm_slow_rate, slow_latency=args.llm_slow_latency,
+                                malformed_rate=args.llm_malformed_rate)
+    server, thread, base_url, startup = start_app(model)
+    driver = Driver(base_url, server_url(evaluator_server), attachment_kb=args.attachment_kb)
+
+    run_id = uuid.uuid4().hex[:6]
+    repos = args.repos or args.requests
+    tasks = [f"bench-{run_id}-{i % repos}" for i in range(args.requests)]
+    if args.scenario == "revise":
+        driver.run_all("/build", [driver.payload(task, 1) for task in tasks], args.concurrency)
+        endpoint, payloads = "/revise", [driver.payload(task, 2) for task in tasks]
+    else:
+        endpoint, payloads = "/build", [driver.payload(task, 1) for task in tasks]
+
+    rss_before = peak_rss_mb()
+    if args.tracemalloc:
+        tracemalloc.start()
+    if args.batch:
+        outcomes, wall = driver.run_batch(endpoint, payloads)
+    else:
+        outcomes, wall = driver.run_all(endpoint, payloads, args.concurrency)
+    wait_for_notifications(received, [outcome["nonce"] for outcome in outcomes if outcome["status"] == "complete"], timeout=30)
+    memory = {"peak_rss_mb": peak_rss_mb(), "rss_growth_mb": round(peak_rss_mb() - rss_before, 1)}
+    if args.tracemalloc:
+        memory["traced_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+        tracemalloc.stop()
+
+    server.should_exit = True
+    thread.join(timeout=10)
+    github_server.shutdown()
+    evaluator_server.shutdown()
+
+    report = summarize(args, outcomes, wall, received, memory)
+    report["startup"] = startup
+    report["fake_calls"] = {"gemini": model.calls, "github": dict(github_state.calls)}
+    print_report(report)
+    for outcome in outcomes:
+        if outcome["status"] != "complete":
+            print(f"  {outcome['status']}: {outcome.get('error')}")
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"❌ Regressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"✅ Within {args.tolerance:.0%} of {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+# circuit_breaker.py
+import os
+import threading
+import time
+from collections import deque
+from observability import Counter, Gauge, get_logger, register
+
+logger = get_logger(__name__)
+
+CIRCUIT_BREAKERS_ENABLED = os.getenv("CIRCUIT_BREAKERS_ENABLED", "true").lower() == "true"
+
+# Calls slower than this count against a dependency's health, per dependency kind
+DEFAULT_SLOW_SECONDS = {"gemini": 90, "github": 10, "evaluation": 10}
+
+CIRCUIT_STATE = register(Gauge(
+    "ds_circuit_state", "Circuit breaker state per dependency (0 closed, 1 half-open, 2 open).", ("dependency",),
+))
+CIRCUIT_REJECTIONS = register(Counter(
+    "ds_circuit_rejections_total", "Calls failed fast because a dependency's circuit was open.", ("dependency",),
+))
+JOBS_SHED = register(Counter(
+    "ds_jobs_shed_total", "Requests rejected at enqueue because a dependency's circuit was open.", ("dependency",),
+))
+_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable (circuit open, retry in {retry_after:.0f}s)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcome and latency of calls to one dependency over a
+    rolling `window` of seconds. Once at least `min_calls` were made and
+    the share of failures reaches `failure_rate` (or the share of calls
+    slower than `slow_seconds` reaches `slow_rate`), the circuit opens
+    and calls fail fast with CircuitOpen for `open_seconds`. After that
+    it is half-open: up to `probes` calls go through, and their outcome
+    closes the circuit again or re-opens it.
+
+    Callers bracket each call with before_call() and one of
+    record_success(), record_failure() or release() (for a call that was
+    abandoned and says nothing about the dependency).
+    """
+
+    def __init__(self, name: str, window: float = 60, min_calls: int = 10, failure_rate: float = 0.5,
+                 slow_seconds: float = 10, slow_rate: float = 0.8, open_seconds: float = 30, probes: int = 1):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.state = "closed"
+        self.opened_at = None
+        self.last_error = None
+        self._calls = deque()  # (finished_at, failed, slow)
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(0, dependency=name)
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being failed fast."""
+        with self._lock:
+            return self._refresh() == "open"
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit lets a probe through (0 unless open)."""
+        with self._lock:
+            if self._refresh() != "open":
+                return 0.0
+            return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def before_call(self):
+        with self._lock:
+            state = self._refresh()
+            if state == "open" or (state == "half_open" and self._probes_in_flight >= self.probes):
+                CIRCUIT_REJECTIONS.inc(dependency=self.name)
+                retry_after = max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+                raise CircuitOpen(self.name, retry_after)
+            if state == "half_open":
+                self._probes_in_flight += 1
+
+    def record_success(self, seconds: float = 0.0):
+        self._record(failed=False, slow=seconds >= self.slow_seconds)
+
+    def record_failure(self, error: str | None = None):
+        self.last_error = error
+        self._record(failed=True, slow=False)
+
+    def release(self):
+        with self._lock:
+            if self.state == "half_open":
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def _record(self, failed: bool, slow: bool):
+        with self._lock:
+            state = self._refresh()
+            if state == "half_open":
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failed or slow:
+                    self._transition("open")
+                else:
+                    self._calls.clear()
+                    self._transition("closed")
+                return
+            if state == "open":
+                return  # A call that started before the circuit opened
+
+            now = time.monotonic()
+            self._calls.append((now, failed, slow))
+            while self._calls and self._calls[0][0] < now - self.window:
+                self._calls.popleft()
+            total = len(self._calls)
+            if total < self.min_calls:
+                return
+            failures = sum(1 for _, call_failed, _ in self._calls if call_failed)
+            slow_calls = sum(1 for _, _, call_slow in self._calls if call_slow)
+            if failures / total >= self.failure_rate or slow_calls / total >= self.slow_rate:
+                self._transition("open")
+
+    def _refresh(self) -> str:
+        # Must hold the lock. An open circuit turns half-open once its cool-down is over.
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.open_seconds:
+            self._transition("half_open")
+        return self.state
+
+    def _transition(self, state: str):
+        if state == "open":
+            self.opened_at = time.monotonic()
+            logger.warning(f"🔌 Circuit for {self.name} opened; failing fast for {self.open_seconds:.0f}s. "
+                           f"Last error: {self.last_error}")
+        elif state == "closed" and self.state != "closed":
+            logger.info(f"🔌 Circuit for {self.name} closed again.")
+        self.state = state
+        self._probes_in_flight = 0
+        CIRCUIT_STATE.set(_STATE_VALUES[state], dependency=self.name)
+
+    def status(self) -> dict:
+        with self._lock:
+            state = self._refresh()
+            now = time.monotonic()
+            calls = [call for call in self._calls if call[0] >= now - self.window]
+            return {
+                "state": state,
+                "calls": len(calls),
+                "failures": sum(1 for _, failed, _ in calls if failed),
+                "slow_calls": sum(1 for _, _, slow in calls if slow),
+                "retry_after": round(max(0.0, self.opened_at + self.open_seconds - now), 1) if state == "open" else 0,
+                "last_error": self.last_error,
+            }
+
+
+class _DisabledBreaker(CircuitBreaker):
+    """Records nothing and never opens (CIRCUIT_BREAKERS_ENABLED=false)."""
+
+    def before_call(self):
+        pass
+
+    def _record(self, failed: bool, slow: bool):
+        pass
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """
+    Returns the process-wide breaker for a dependency, e.g. "github",
+    "gemini:gemini-2.5-flash" or "evaluation:https://host", creating it
+    on first use. Thresholds come from the environment; the slow-call
+    limit can be set per kind (the part before ":"), e.g.
+    CIRCUIT_GEMINI_SLOW_SECONDS.
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            kind = name.split(":", 1)[0]
+            breaker_class = CircuitBreaker if CIRCUIT_BREAKERS_ENABLED else _DisabledBreaker
+            breaker = breaker_class(
+                name,
+                window=float(os.getenv("CIRCUIT_WINDOW_SECONDS", "60")),
+                min_calls=int(os.getenv("CIRCUIT_MIN_CALLS", "10")),
+                failure_rate=float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5")),
+                slow_seconds=float(os.getenv(f"CIRCUIT_{kind.upper()}_SLOW_SECONDS", str(DEFAULT_SLOW_SECONDS.get(kind, 10)))),
+                slow_rate=float(os.getenv("CIRCUIT_SLOW_RATE", "0.8")),
+                open_seconds=float(os.getenv("CIRCUIT_OPEN_SECONDS", "30")),
+                probes=int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "1")),
+            )
+            _breakers[name] = breaker
+        return breaker
+
+
+def breaker_status() -> dict:
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.status() for name, breaker in sorted(breakers.items())}
@@ -1,38 +1,77 @@
 # evaluation_handler.py
 import requests
+import threading
 import time
 import json
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from circuit_breaker import get_breaker
+from observability import get_logger
 
-def notify_evaluation_server(url: str, payload: dict):
+logger = get_logger(__name__)
+
+# One keep-alive session per evaluation host, shared by all delivery threads
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _host(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def evaluation_breaker(url: str):
+    """The circuit breaker for the evaluation host `url` points at."""
+    return get_breaker(f"evaluation:{_host(url)}")
+
+
+def _session_for(url: str) -> requests.Session:
+    host = _host(url)
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            session.mount(host, HTTPAdapter(pool_connections=1, pool_maxsize=16))
+            _sessions[host] = session
+        return session
+
+
+def post_notification(url: str, payload: dict, breaker, timeout: float = 15) -> tuple[bool, str | None, bool]:
     """
-    Sends a POST request to the evaluation server with exponential backoff.
+    Makes a single delivery attempt to the evaluation server for a caller
+    that has already passed `breaker.before_call()`, and records the
+    outcome on the breaker. Returns (delivered, error, retryable).
     """
-    max_retries = 5
-    for i in range(max_retries):
-        try:
-            print(f"📞 Notifying evaluation server at {url} (Attempt {i+1}/{max_retries})")
-            response = requests.post(
-                url,
-                headers={"Content-Type": "application/json"},
-                data=json.dumps(payload),
-                timeout=15 # Set a 15-second timeout
-            )
-
-            if response.status_code == 200:
-                print("✅ Notification successful!")
-                print(f"Server responded with: {response.text}")
-                return True
-            else:
-                print(f"❌ Notification failed with status: {response.status_code}, body: {response.text}")
-
-        except requests.exceptions.RequestException as e:
-            print(f"❌ A network error occurred: {e}")
-
-        # If not the last attempt, wait before retrying
-        if i < max_retries - 1:
-            delay = 2 ** i  # 1, 2, 4, 8 seconds
-            print(f"Retrying in {delay} second(s)...")
-            time.sleep(delay)
-
-    print("🚫 All notification attempts failed.")
-    return False
\ No newline at end of file
+    try:
+        logger.info(f"📞 Notifying evaluation server at {url}")
+        started = time.monotonic()
+        response = _session_for(url).post(
+            url,
+            headers={"Content-Type": "application/json"},
+            data=json.dumps(payload),
+            timeout=timeout
+        )
+        # Other client errors mean the payload itself was rejected; retrying won't help
+        retryable = response.status_code >= 500 or response.status_code in (408, 429)
+        # A rejected payload still means the host is up, so only retryable statuses count against it
+        if retryable:
+            breaker.record_failure(f"HTTP {response.status_code}")
+        else:
+            breaker.record_success(time.monotonic() - started)
+
+        if 200 <= response.status_code < 300:
+            logger.info("✅ Notification successful!")
+            logger.debug(f"Server responded with: {response.text}")
+            return True, None, True
+
+        logger.error(f"❌ Notification failed with status: {response.status_code}, body: {response.text}")
+        return False, f"HTTP {response.status_code}: {response.text[:500]}", retryable
+
+    except requests.exceptions.RequestException as e:
+        breaker.record_failure(str(e))
+        logger.error(f"❌ A network error occurred: {e}")
+        return False, str(e), True
+    except BaseException:
+        breaker.release()
+        raise
+
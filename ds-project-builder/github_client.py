@@ -0,0 +1,287 @@
+# github_client.py
+import base64
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import requests
+from requests.adapters import HTTPAdapter
+from circuit_breaker import get_breaker
+from github_scheduler import RateLimitScheduler
+from observability import GITHUB_REQUEST_DURATION, get_logger, observe_stage
+
+logger = get_logger(__name__)
+
+GITHUB_API = "https://api.github.com"
+
+
+class GitHubAPIError(Exception):
+    """An error response from the GitHub REST API."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+class GitHubClient:
+    """
+    Process-wide GitHub REST client. All calls share one keep-alive
+    session; user and repo metadata are cached with a TTL, and reads go
+    out with If-None-Match so unchanged resources come back as 304s,
+    which don't count against the rate limit. Every request is paced by
+    a RateLimitScheduler and resumed after a rate-limit rejection, and
+    fails fast with CircuitOpen while GitHub is erroring (5xx or network
+    errors) or slow.
+    """
+
+    def __init__(self, token: str, username: str | None = None, api_url: str = GITHUB_API,
+                 metadata_ttl: float = 300, etag_cache_size: int = 512, pool_size: int = 32,
+                 scheduler: RateLimitScheduler | None = None, rate_limit_retries: int = 3):
+        self.api_url = api_url.rstrip("/")
+        self.scheduler = scheduler or RateLimitScheduler()
+        self.rate_limit_retries = rate_limit_retries
+        self.breaker = get_breaker("github")
+        self._username = username
+        self.metadata_ttl = metadata_ttl
+        self.etag_cache_size = etag_cache_size
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=pool_size))
+        self.session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=pool_size))
+        self.session.headers.update({
+            'Authorization': f'token {token}',
+            'Accept': 'application/vnd.github.v3+json',
+            'X-GitHub-Api-Version': '2022-11-28'
+        })
+        self._etag_cache = OrderedDict()
+        self._metadata = {}
+        self._lock = threading.Lock()
+
+    # --- Low-level requests ---
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        url = path if path.startswith("http") else f"{self.api_url}{path}"
+        kwargs.setdefault("timeout", 30)
+        write = method not in ("GET", "HEAD")
+        for attempt in range(self.rate_limit_retries + 1):
+            with observe_stage("github_schedule_wait"):
+                self.scheduler.acquire(write)
+            response = self._send(method, url, **kwargs)
+            wait = self.scheduler.observe(response)
+            if wait is None or attempt == self.rate_limit_retries:
+                return response
+            logger.warning(f"⏸️ GitHub rate limit on {method} {_endpoint_label(url)}; resuming in {wait:.0f}s.")
+        return response
+
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        self.breaker.before_call()
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = self.session.request(method, url, **kwargs)
+            status = response.status_code
+        except requests.RequestException as e:
+            self.breaker.record_failure(str(e))
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        finally:
+            GITHUB_REQUEST_DURATION.observe(time.perf_counter() - start, method=method,
+                                            endpoint=_endpoint_label(url), status=status)
+        # Client errors (404s, rate limits, validation) say nothing about GitHub's health
+        if status >= 500:
+            self.breaker.record_failure(f"{method} {_endpoint_label(url)} returned {status}")
+        else:
+            self.breaker.record_success(time.perf_counter() - start)
+        return response
+
+    def call(self, method: str, path: str, ok: tuple = (200, 201), **kwargs):
+        """
+        Makes a request and returns the decoded JSON body, raising
+        GitHubAPIError for any status not in `ok`.
+        """
+        response = self.request(method, path, **kwargs)
+        if response.status_code not in ok:
+            raise GitHubAPIError(response.status_code, _error_message(response))
+        return response.json() if response.content else None
+
+    def get_conditional(self, path: str, params: dict | None = None):
+        """
+        GET with If-None-Match; a 304 returns the cached body for free.
+        """
+        key = (path, tuple(sorted((params or {}).items())))
+        with self._lock:
+            cached = self._etag_cache.get(key)
+        headers = {"If-None-Match": cached[0]} if cached else {}
+
+        response = self.request("GET", path, params=params, headers=headers)
+        if response.status_code == 304 and cached:
+            with self._lock:
+                self._etag_cache.move_to_end(key)
+            return cached[1]
+        if response.status_code != 200:
+            raise GitHubAPIError(response.status_code, _error_message(response))
+
+        body = response.json()
+        etag = response.headers.get("ETag")
+        if etag:
+            with self._lock:
+                self._etag_cache[key] = (etag, body)
+                self._etag_cache.move_to_end(key)
+                while len(self._etag_cache) > self.etag_cache_size:
+                    self._etag_cache.popitem(last=False)
+        return body
+
+    def _cached_metadata(self, key: str, path: str):
+        now = time.time()
+        with self._lock:
+            entry = self._metadata.get(key)
+        if entry and now - entry[0] < self.metadata_ttl:
+            return entry[1]
+        body = self.get_conditional(path)
+        with self._lock:
+            self._metadata[key] = (now, body)
+        return body
+
+    def forget_repo(self, repo_name: str):
+        with self._lock:
+            self._metadata.pop(f"repo:{repo_name}", None)
+
+    # --- Users and repositories ---
+
+    @property
+    def username(self) -> str:
+        if not self._username:
+            self._username = self.get_user()["login"]
+        return self._username
+
+    def get_user(self) -> dict:
+        return self._cached_metadata("user", "/user")
+
+    def get_repo(self, repo_name: str) -> dict:
+        try:
+            return self._cached_metadata(f"repo:{repo_name}", f"/repos/{self.username}/{repo_name}")
+        except GitHubAPIError:
+            self.forget_repo(repo_name)
+            raise
+
+    def create_repo(self, repo_name: str, auto_init: bool = True) -> dict:
+        repo = self.call("POST", "/user/repos", json={"name": repo_name, "private": False, "auto_init": auto_init})
+        with self._lock:
+            self._metadata[f"repo:{repo_name}"] = (time.time(), repo)
+        return repo
+
+    def rename_repo(self, repo_name: str, new_name: str) -> dict:
+        repo = self.call("PATCH", f"/repos/{self.username}/{repo_name}", json={"name": new_name})
+        with self._lock:
+            self._metadata.pop(f"repo:{repo_name}", None)
+            self._metadata[f"repo:{new_name}"] = (time.time(), repo)
+        return repo
+
+    # --- Contents ---
+
+    def get_file_contents(self, repo_name: str, path: str, ref: str | None = None) -> dict:
+        params = {"ref": ref} if ref else None
+        return self.get_conditional(f"/repos/{self.username}/{repo_name}/contents/{path}", params)
+
+    def get_file_text(self, repo_name: str, path: str, ref: str | None = None) -> str:
+        contents = self.get_file_contents(repo_name, path, ref)
+        return base64.b64decode(contents["content"]).decode("utf-8")
+
+    def put_file(self, repo_name: str, path: str, content: str, message: str, branch: str, sha: str | None = None) -> dict:
+        payload = {
+            "message": message,
+            "content": base64.b64encode(content.encode("utf-8")).decode("ascii"),
+            "branch": branch,
+        }
+        if sha:
+            payload["sha"] = sha
+        return self.call("PUT", f"/repos/{self.username}/{repo_name}/contents/{path}", json=payload)
+
+    # --- Git Data API ---
+
+    def get_branch_head(self, repo_name: str, branch: str) -> str:
+        ref = self.get_conditional(f"/repos/{self.username}/{repo_name}/git/ref/heads/{branch}")
+        return ref["object"]["sha"]
+
+    def get_commit(self, repo_name: str, sha: str) -> dict:
+        # Commits are immutable, so the ETag cache always serves repeats
+        return self.get_conditional(f"/repos/{self.username}/{repo_name}/git/commits/{sha}")
+
+    def get_tree(self, repo_name: str, sha: str, recursive: bool = True) -> dict:
+        params = {"recursive": "1"} if recursive else None
+        return self.get_conditional(f"/repos/{self.username}/{repo_name}/git/trees/{sha}", params)
+
+    def create_tree(self, repo_name: str, base_tree: str, elements: list[dict]) -> dict:
+        return self.call("POST", f"/repos/{self.username}/{repo_name}/git/trees",
+                         json={"base_tree": base_tree, "tree": elements})
+
+    def create_commit(self, repo_name: str, message: str, tree_sha: str, parents: list[str]) -> dict:
+        return self.call("POST", f"/repos/{self.username}/{repo_name}/git/commits",
+                         json={"message": message, "tree": tree_sha, "parents": parents})
+
+    def update_branch(self, repo_name: str, branch: str, sha: str) -> dict:
+        return self.call("PATCH", f"/repos/{self.username}/{repo_name}/git/refs/heads/{branch}", json={"sha": sha})
+
+    # --- Pages ---
+
+    def enable_pages(self, repo_name: str, branch: str) -> requests.Response:
+        payload = {
+            "source": {"branch": branch, "path": "/"}
+        }
+        return self.request("POST", f"/repos/{self.username}/{repo_name}/pages", json=payload)
+
+
+_ENDPOINT_PATTERNS = [
+    (re.compile(r"^https?://[^/]+"), ""),
+    (re.compile(r"^/repos/[^/]+/[^/]+"), "/repos/{owner}/{repo}"),
+    (re.compile(r"/contents/.*$"), "/contents/{path}"),
+    (re.compile(r"/heads/.*$"), "/heads/{branch}"),
+    (re.compile(r"/[0-9a-f]{40}(?=/|$)"), "/{sha}"),
+    (re.compile(r"/\d+(?=/|$)"), "/{id}"),
+]
+
+
+def _endpoint_label(url: str) -> str:
+    """
+    Collapses a request URL to its route, e.g. /repos/{owner}/{repo}/git/trees/{sha},
+    so metrics have one series per endpoint rather than per repo or file.
+    """
+    path = url.split("?", 1)[0]
+    for pattern, replacement in _ENDPOINT_PATTERNS:
+        path = pattern.sub(replacement, path)
+    return path
+
+
+def _error_message(response: requests.Response) -> str:
+    try:
+        return response.json().get("message", response.text)
+    except ValueError:
+        return response.text
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_github_client() -> GitHubClient:
+    """
+    Returns the process-wide client, creating it on first use.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GitHubClient(
+                os.getenv("GITHUB_PAT"),
+                username=os.getenv("GITHUB_USERNAME"),
+                api_url=os.getenv("GITHUB_API_URL", GITHUB_API),
+                metadata_ttl=float(os.getenv("GITHUB_METADATA_TTL", "300")),
+                scheduler=RateLimitScheduler(
+                    write_interval=float(os.getenv("GITHUB_WRITE_INTERVAL", "1.0")),
+                    low_budget=int(os.getenv("GITHUB_LOW_BUDGET", "100")),
+                    max_park=float(os.getenv("GITHUB_MAX_PARK_SECONDS", "300")),
+                ),
+                rate_limit_retries=int(os.getenv("GITHUB_RATE_LIMIT_RETRIES", "3")),
+            )
+        return _client
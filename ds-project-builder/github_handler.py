@@ -1,143 +1,197 @@
 # github_handler.py
 import os
 import time
-import requests # <-- Make sure requests is imported
-from github import Github, GithubException
+import hashlib
+from github_client import GitHubAPIError, get_github_client
+from artifact_store import get_artifact_store
+from observability import get_logger
 
-def create_and_push_to_github(repo_name: str, files: dict) -> dict | None:
+logger = get_logger(__name__)
+
+# How long a stored artifact is trusted before re-checking the branch head
+ARTIFACT_VERIFY_AFTER = float(os.getenv("ARTIFACT_VERIFY_AFTER", "600"))
+
+def create_and_push_to_github(repo_name: str, files: dict, repo_pool=None) -> dict | None:
     """
     Creates/updates a GitHub repo, enables Pages via direct API call,
-    pushes files, and returns a dictionary with repo details.
+    pushes files, and returns a dictionary with repo details. A new repo
+    is claimed from `repo_pool` (a RepoPool) when one is ready.
     """
     try:
-        token = os.getenv("GITHUB_PAT")
-        username = os.getenv("GITHUB_USERNAME")
-        g = Github(token)
-        user = g.get_user()
+        client = get_github_client()
 
-        print(f"📦 Creating/accessing GitHub repo named: {repo_name}")
+        logger.info(f"📦 Creating/accessing GitHub repo named: {repo_name}")
 
         try:
-            repo = user.create_repo(repo_name, private=False)
-            print("✅ Repo created successfully.")
-        except GithubException as e:
-            if e.status == 422:
-                print(f"⚠️ Repo '{repo_name}' already exists. Using existing repo.")
-                repo = user.get_repo(repo_name)
-            else:
+            repo = client.get_repo(repo_name)
+            logger.info(f"⚠️ Repo '{repo_name}' already exists. Using existing repo.")
+        except GitHubAPIError as e:
+            if e.status != 404:
                 raise e
+            # A pooled repo already has the workflow, LICENSE and a live Pages site
+            repo = repo_pool.claim(repo_name) if repo_pool else None
+            if repo is None:
+                # auto_init gives the repo a first commit, which the Git Data API needs
+                repo = client.create_repo(repo_name, auto_init=True)
+                logger.info("✅ Repo created successfully.")
 
         # Push files FIRST before enabling Pages
+        push_mode = os.getenv("GITHUB_PUSH_MODE", "tree")
         last_commit_sha = None
-        for filename, content in files.items():
+        if push_mode == "tree":
             try:
-                # Use default_branch to be safe
-                existing_file = repo.get_contents(filename, ref=repo.default_branch)
-                commit = repo.update_file(
-                    path=existing_file.path,
-                    message=f"Update {filename}",
-                    content=content,
-                    sha=existing_file.sha,
-                    branch=repo.default_branch
-                )
-                print(f"🔄 Updated {filename} in repo.")
-                last_commit_sha = commit['commit'].sha
-            except GithubException:
-                commit = repo.create_file(
-                    path=filename,
-                    message=f"Create {filename}",
-                    content=content,
-                    branch=repo.default_branch
-                )
-                print(f"📄 Created {filename} in repo.")
-                last_commit_sha = commit['commit'].sha
+                last_commit_sha = push_files_as_single_commit(repo_name, repo["default_branch"], files)
+            except GitHubAPIError as e:
+                # Only 409 "Git Repository is empty" (repos created without auto_init) is worth the
+                # per-file fallback; anything else is a real failure that N more commits would hide
+                if e.status != 409:
+                    raise
+                logger.warning("⚠️ Repository is empty, falling back to per-file commits.")
+        if last_commit_sha is None:
+            last_commit_sha = push_files_individually(repo_name, repo["default_branch"], files)
 
         # --- ENABLE GITHUB PAGES AFTER FILES ARE PUSHED ---
-        print("🔧 Enabling GitHub Pages via direct API call...")
-        headers = {
-            'Authorization': f'token {token}',
-            'Accept': 'application/vnd.github.v3+json',
-            'X-GitHub-Api-Version': '2022-11-28'
-        }
-        payload = {
-            "source": {"branch": repo.default_branch, "path": "/"}
-        }
-        url = f"https://api.github.com/repos/{username}/{repo_name}/pages"
-        
-        response = requests.post(url, headers=headers, json=payload)
-        
-        # 201 means "Created successfully". 409 means "Conflict" (already enabled).
-        if response.status_code == 201:
-            print("✅ GitHub Pages has been enabled.")
-        elif response.status_code == 409:
-            print("✅ GitHub Pages was already enabled.")
+        if repo.get("has_pages"):
+            logger.info("✅ GitHub Pages was already enabled.")
         else:
-            print(f"⚠️ Could not enable GitHub Pages. Status: {response.status_code}, Body: {response.text}")
-            # We will continue anyway, as the workflow might still work.
-        
-        # --- WAIT FOR PAGES TO BE READY (check if it returns 200) ---
-        pages_url = f"https://{username}.github.io/{repo_name}/"
-        print(f"⏳ Waiting for GitHub Pages to be ready at {pages_url}...")
-        
-        max_wait = 60  # Wait up to 60 seconds
-        start_time = time.time()
-        pages_ready = False
-        
-        while time.time() - start_time < max_wait:
-            try:
-                check_response = requests.get(pages_url, timeout=5)
-                if check_response.status_code == 200:
-                    print(f"✅ GitHub Pages is live and returning 200 OK!")
-                    pages_ready = True
-                    break
-            except requests.RequestException:
-                pass  # Page not ready yet
-            
-            time.sleep(3)  # Wait 3 seconds before next check
-        
-        if not pages_ready:
-            print(f"⚠️ GitHub Pages did not respond with 200 within {max_wait} seconds. It may still be deploying.")
-        # ---------------------------------------------------
-
-        print(f"🎉 Successfully pushed all files. Commit SHA: {last_commit_sha}")
-        
+            logger.info("🔧 Enabling GitHub Pages via direct API call...")
+            response = client.enable_pages(repo_name, repo["default_branch"])
+
+            # 201 means "Created successfully". 409 means "Conflict" (already enabled).
+            if response.status_code == 201:
+                logger.info("✅ GitHub Pages has been enabled.")
+            elif response.status_code == 409:
+                logger.info("✅ GitHub Pages was already enabled.")
+            else:
+                logger.warning(f"⚠️ Could not enable GitHub Pages. Status: {response.status_code}, Body: {response.text}")
+                # We will continue anyway, as the workflow might still work.
+            if response.status_code in (201, 409):
+                repo["has_pages"] = True
+
+        # Readiness of this commit is tracked separately by pages_tracker.py
+        pages_url = f"https://{client.username}.github.io/{repo_name}/"
+
+        logger.info(f"🎉 Successfully pushed all files. Commit SHA: {last_commit_sha}")
+
         return {
-            "repo_url": repo.html_url,
+            "repo_url": repo["html_url"],
             "commit_sha": last_commit_sha,
             "pages_url": pages_url,
         }
 
     except Exception as e:
-        print(f"❌ An error occurred with GitHub: {e}")
+        logger.error(f"❌ An error occurred with GitHub: {e}")
         return None
-    
+
+
+def git_blob_sha(content: str) -> str:
+    """
+    Computes the SHA-1 git would assign to a blob with this content,
+    so unchanged files can be detected without any API call.
+    """
+    data = content.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def push_files_as_single_commit(repo_name: str, branch: str, files: dict, message: str | None = None) -> str:
+    """
+    Pushes all files as one tree and one commit via the Git Data API,
+    skipping files whose blob SHA already matches the branch head.
+    Returns the new commit SHA, or the current head SHA if nothing changed.
+    """
+    client = get_github_client()
+    head_sha = client.get_branch_head(repo_name, branch)
+    head_commit = client.get_commit(repo_name, head_sha)
+    head_tree = client.get_tree(repo_name, head_commit["tree"]["sha"], recursive=True)
+    existing_shas = {element["path"]: element["sha"] for element in head_tree["tree"] if element["type"] == "blob"}
+
+    changed = {path: content for path, content in files.items() if existing_shas.get(path) != git_blob_sha(content)}
+    skipped = len(files) - len(changed)
+    if not changed:
+        logger.info(f"⏭️ All {skipped} file(s) unchanged; nothing to commit.")
+        return head_sha
+
+    elements = [
+        {"path": path, "mode": "100644", "type": "blob", "content": content}
+        for path, content in changed.items()
+    ]
+    new_tree = client.create_tree(repo_name, head_tree["sha"], elements)
+    commit_message = message or f"Update {', '.join(sorted(changed))}"
+    new_commit = client.create_commit(repo_name, commit_message, new_tree["sha"], [head_sha])
+    client.update_branch(repo_name, branch, new_commit["sha"])
+
+    logger.info(f"📦 Committed {len(changed)} file(s) in a single commit ({skipped} unchanged skipped).")
+    return new_commit["sha"]
+
+
+def push_files_individually(repo_name: str, branch: str, files: dict) -> str | None:
+    """
+    Legacy push mode: one Contents API commit per file.
+    """
+    client = get_github_client()
+    last_commit_sha = None
+    for filename, content in files.items():
+        try:
+            # Use default_branch to be safe
+            existing_file = client.get_file_contents(repo_name, filename, ref=branch)
+            commit = client.put_file(repo_name, filename, content, f"Update {filename}", branch, sha=existing_file["sha"])
+            logger.info(f"🔄 Updated {filename} in repo.")
+        except GitHubAPIError:
+            commit = client.put_file(repo_name, filename, content, f"Create {filename}", branch)
+            logger.info(f"📄 Created {filename} in repo.")
+        last_commit_sha = commit['commit']['sha']
+    return last_commit_sha
+
+
 def get_file_from_repo(repo_name: str, file_path: str) -> str | None:
     """
     Fetches the content of a specific file from a GitHub repository.
     """
     try:
-        token = os.getenv("GITHUB_PAT")
-        username = os.getenv("GITHUB_USERNAME")
-        g = Github(token)
-        user = g.get_user()
-
-        print(f"🔎 Accessing repo '{repo_name}' to fetch '{file_path}'...")
-        repo = user.get_repo(repo_name)
-        
-        # Get the file content object
-        file_content = repo.get_contents(file_path, ref=repo.default_branch)
-        
-        # Decode the content from base64
-        decoded_content = file_content.decoded_content.decode('utf-8')
-        print(f"✅ Successfully fetched content of '{file_path}'.")
+        client = get_github_client()
+
+        logger.info(f"🔎 Accessing repo '{repo_name}' to fetch '{file_path}'...")
+        repo = client.get_repo(repo_name)
+
+        # Conditional read: an unchanged file is served from the ETag cache
+        decoded_content = client.get_file_text(repo_name, file_path, ref=repo["default_branch"])
+        logger.info(f"✅ Successfully fetched content of '{file_path}'.")
         return decoded_content
 
-    except GithubException as e:
+    except GitHubAPIError as e:
         if e.status == 404:
-            print(f"❌ Error fetching file: Repository '{repo_name}' or file '{file_path}' not found.")
+            logger.error(f"❌ Error fetching file: Repository '{repo_name}' or file '{file_path}' not found.")
         else:
-            print(f"❌ An error occurred fetching file from GitHub: {e}")
+            logger.error(f"❌ An error occurred fetching file from GitHub: {e}")
         return None
     except Exception as e:
-        print(f"❌ An unexpected error occurred: {e}")
-        return None
\ No newline at end of file
+        logger.error(f"❌ An unexpected error occurred: {e}")
+        return None
+
+
+def get_latest_files(repo_name: str) -> dict | None:
+    """
+    Returns the files of the repo's current state, preferring the local
+    artifact store over GitHub. A stored artifact that hasn't been checked
+    recently is verified against the branch head (a cheap conditional
+    read); on a miss or mismatch only index.html is fetched from GitHub.
+    """
+    store = get_artifact_store()
+    artifact = store.latest(repo_name)
+    if artifact:
+        if time.time() - artifact["verified_at"] < ARTIFACT_VERIFY_AFTER:
+            logger.info(f"📦 Using stored artifact for '{repo_name}' ({artifact['commit_sha'][:7]}).")
+            return artifact["files"]
+        try:
+            client = get_github_client()
+            head_sha = client.get_branch_head(repo_name, client.get_repo(repo_name)["default_branch"])
+            if head_sha == artifact["commit_sha"]:
+                store.mark_verified(repo_name, head_sha)
+                logger.info(f"📦 Using stored artifact for '{repo_name}' (verified at {head_sha[:7]}).")
+                return artifact["files"]
+            logger.warning(f"⚠️ Stored artifact for '{repo_name}' is stale (branch is at {head_sha[:7]}).")
+        except GitHubAPIError as e:
+            logger.warning(f"⚠️ Could not verify stored artifact for '{repo_name}': {e}")
+
+    existing_html = get_file_from_repo(repo_name, "index.html")
+    return {"index.html": existing_html} if existing_html else None
@@ -0,0 +1,98 @@
+# github_scheduler.py
+import threading
+import time
+from observability import Counter, Gauge, get_logger, register
+
+logger = get_logger(__name__)
+
+GITHUB_RATE_LIMITED = register(Counter("ds_github_rate_limited_total", "GitHub responses that parked traffic, by kind.", ("kind",)))
+GITHUB_BUDGET = register(Gauge("ds_github_rate_limit_remaining", "Requests left in the current GitHub rate-limit window."))
+
+
+class RateLimitScheduler:
+    """
+    Gates every GitHub request made by one client:
+
+    - Writes (anything but GET/HEAD) are spaced at least `write_interval`
+      seconds apart, as GitHub recommends for content-creating calls.
+    - The remaining budget is tracked from X-RateLimit-* headers. Once it
+      drops below `low_budget`, writes are spread evenly over the rest of
+      the window and queued reads (often free 304s) go first.
+    - A 403/429 rate-limit response parks all traffic until Retry-After or
+      the window reset, so callers can resume instead of failing.
+    """
+
+    def __init__(self, write_interval: float = 1.0, low_budget: int = 100, max_park: float = 300):
+        self.write_interval = write_interval
+        self.low_budget = low_budget
+        self.max_park = max_park
+        self.remaining = None
+        self.reset_at = 0.0
+        self._paused_until = 0.0
+        self._next_write_at = 0.0
+        self._waiting_reads = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, write: bool):
+        """Blocks until a request of this kind may be sent."""
+        with self._cond:
+            if not write:
+                self._waiting_reads += 1
+            try:
+                while (delay := self._delay(write, time.time())) > 0:
+                    self._cond.wait(delay)
+                if write:
+                    self._next_write_at = time.time() + self._write_spacing(time.time())
+            finally:
+                if not write:
+                    self._waiting_reads -= 1
+                    self._cond.notify_all()
+
+    def _budget_low(self) -> bool:
+        return self.remaining is not None and self.remaining < self.low_budget and self.reset_at > time.time()
+
+    def _delay(self, write: bool, now: float) -> float:
+        delay = self._paused_until - now
+        if write:
+            delay = max(delay, self._next_write_at - now)
+            if self._budget_low() and self._waiting_reads:
+                delay = max(delay, 0.05)
+        return delay
+
+    def _write_spacing(self, now: float) -> float:
+        if self._budget_low():
+            return max(self.write_interval, (self.reset_at - now) / max(self.remaining, 1))
+        return self.write_interval
+
+    def observe(self, response) -> float | None:
+        """
+        Records the budget reported by a response. If the response is a
+        rate-limit rejection worth waiting out, parks all traffic and
+        returns the wait in seconds; otherwise returns None.
+        """
+        headers = response.headers
+        now = time.time()
+        with self._cond:
+            if "X-RateLimit-Remaining" in headers:
+                self.remaining = int(headers["X-RateLimit-Remaining"])
+                self.reset_at = float(headers.get("X-RateLimit-Reset", 0))
+                GITHUB_BUDGET.set(self.remaining)
+
+            if response.status_code not in (403, 429):
+                return None
+            if headers.get("Retry-After"):
+                kind, wait = "secondary", float(headers["Retry-After"])
+            elif headers.get("X-RateLimit-Remaining") == "0":
+                kind, wait = "primary", max(0.0, self.reset_at - now) + 1
+            elif "rate limit" in response.text.lower():
+                # Secondary limits without Retry-After: GitHub asks for at least a minute
+                kind, wait = "secondary", 60.0
+            else:
+                return None  # An ordinary permission error
+
+            GITHUB_RATE_LIMITED.inc(kind=kind)
+            if wait > self.max_park:
+                return None
+            self._paused_until = max(self._paused_until, now + wait)
+            self._cond.notify_all()
+            return wait
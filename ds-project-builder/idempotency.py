@@ -0,0 +1,48 @@
+# idempotency.py
+import os
+import time
+from collections import OrderedDict
+
+
+class IdempotencyStore:
+    """
+    Remembers which job handles each (email, task, round, nonce), so a
+    retried request attaches to the in-flight job or gets its stored
+    result instead of starting a second generation and push.
+
+    Bounded by entry count and TTL. Failed jobs are forgotten, so a retry
+    after a failure runs again.
+    """
+
+    def __init__(self, ttl: float = 3600, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key_for(req) -> tuple:
+        return (req.email, req.task, req.round, req.nonce)
+
+    def get(self, key: tuple):
+        """Returns the Job for this key, or None if unknown, expired or failed."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, job = entry
+        if time.time() - stored_at >= self.ttl or job.status == "error":
+            del self._entries[key]
+            return None
+        return job
+
+    def put(self, key: tuple, job):
+        self._entries[key] = (time.time(), job)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def create_idempotency_store_from_env() -> IdempotencyStore:
+    return IdempotencyStore(
+        ttl=float(os.getenv("IDEMPOTENCY_TTL", "3600")),
+        max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000")),
+    )
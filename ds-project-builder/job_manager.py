@@ -0,0 +1,206 @@
+# job_manager.py
+import asyncio
+import contextvars
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from repo_locks import RepoLockManager, create_repo_lock_manager_from_env
+from observability import JOB_STAGE_DURATION, JOBS_TOTAL, get_logger, job_id_var
+
+logger = get_logger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already waiting or running."""
+
+
+class StageError(Exception):
+    """Raised by a stage function to fail its job with a readable message."""
+
+
+class StagePool:
+    """
+    A bounded worker pool for one pipeline stage (e.g. "llm", "github").
+    At most `workers` jobs run the stage at the same time; blocking stage
+    functions run on the pool's own threads so they never stall the event loop.
+    """
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.active = 0
+        self._semaphore = asyncio.Semaphore(workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-worker")
+
+    async def run(self, func, *args):
+        async with self._semaphore:
+            self.active += 1
+            try:
+                if asyncio.iscoroutinefunction(func):
+                    return await func(*args)
+                loop = asyncio.get_running_loop()
+                # run_in_executor doesn't carry contextvars over; keep the request/job ids for logging
+                context = contextvars.copy_context()
+                return await loop.run_in_executor(self._executor, context.run, func, *args)
+            finally:
+                self.active -= 1
+
+
+class Job:
+    """
+    Tracks a single /build or /revise request as it moves through the stages.
+    """
+
+    def __init__(self, kind: str, context: dict):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"  # queued -> running -> complete | error
+        self.stage = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.timings = {}
+        self.result = None
+        self.error = None
+        self.context = context
+        self._finished = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("complete", "error")
+
+    async def wait(self):
+        """Returns once the job has completed or failed."""
+        await self._finished.wait()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "timings": self.timings,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    Runs jobs as a sequence of stages. Each stage is executed inside the
+    StagePool it names, so throughput is bounded per stage instead of by
+    a single request at a time.
+    """
+
+    def __init__(self, stage_workers: dict, max_pending: int = 100, history_limit: int = 500, locks=None):
+        self.pools = {name: StagePool(name, workers) for name, workers in stage_workers.items()}
+        self.locks = locks or RepoLockManager()
+        self.max_pending = max_pending
+        self.history_limit = history_limit
+        self._jobs = OrderedDict()
+        self._tasks = set()
+
+    def pending_count(self) -> int:
+        return sum(1 for job in self._jobs.values() if not job.done)
+
+    def submit(self, kind: str, stages: list, context: dict, lock_key: str | None = None,
+               lock_until: str | None = None) -> Job:
+        """
+        Registers a job and schedules it on the running event loop.
+        `stages` is a list of (stage_name, pool_name, func) tuples; each
+        func receives the job context and raises StageError on failure.
+
+        With `lock_key`, the job holds that key's lock from its first stage
+        until `lock_until` finishes (or to the end), so jobs for the same
+        key run those stages one at a time, in submission order.
+        """
+        if self.pending_count() >= self.max_pending:
+            raise JobQueueFull(f"{self.max_pending} jobs are already pending")
+
+        job = Job(kind, context)
+        self._jobs[job.id] = job
+        self._evict_finished()
+
+        task = asyncio.get_running_loop().create_task(self._run(job, stages, lock_key, lock_until))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        logger.info(f"📥 Queued {kind} job {job.id}")
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    async def _run(self, job: Job, stages: list, lock_key: str | None = None, lock_until: str | None = None):
+        job_id_var.set(job.id)
+        job.status = "running"
+        job.started_at = time.time()
+        lock_token = None
+        try:
+            if lock_key:
+                job.stage = "repo_lock"
+                lock_token = await self.locks.acquire(lock_key)
+                elapsed = time.time() - job.started_at
+                job.timings["repo_lock"] = round(elapsed, 3)
+                JOB_STAGE_DURATION.observe(elapsed, kind=job.kind, stage="repo_lock")
+
+            for stage_name, pool_name, func in stages:
+                job.stage = stage_name
+                stage_start = time.time()
+                try:
+                    await self.pools[pool_name].run(func, job.context)
+                finally:
+                    elapsed = time.time() - stage_start
+                    job.timings[stage_name] = round(elapsed, 3)
+                    JOB_STAGE_DURATION.observe(elapsed, kind=job.kind, stage=stage_name)
+                if lock_token is not None and stage_name == lock_until:
+                    self.locks.release(lock_key, lock_token)
+                    lock_token = None
+
+            job.result = job.context.get("result")
+            job.status = "complete"
+            logger.info(f"✅ Job {job.id} complete in {time.time() - job.started_at:.1f}s")
+        except StageError as e:
+            job.error = str(e)
+            job.status = "error"
+            logger.error(f"❌ Job {job.id} failed at stage '{job.stage}': {e}")
+        except Exception as e:
+            job.error = f"Unexpected error: {e}"
+            job.status = "error"
+            logger.error(f"❌ Job {job.id} crashed at stage '{job.stage}': {e}")
+        finally:
+            if lock_token is not None:
+                self.locks.release(lock_key, lock_token)
+            job.finished_at = time.time()
+            JOBS_TOTAL.inc(kind=job.kind, status=job.status)
+            job.context = {}  # Drop generated files and request data once finished
+            job._finished.set()
+
+    def _evict_finished(self):
+        # Keep the job history bounded, dropping the oldest finished jobs first
+        while len(self._jobs) > self.history_limit:
+            oldest_finished = next((job_id for job_id, job in self._jobs.items() if job.done), None)
+            if oldest_finished is None:
+                break
+            del self._jobs[oldest_finished]
+
+
+def create_job_manager_from_env() -> JobManager:
+    """
+    Builds the process-wide JobManager using worker counts from the environment.
+    """
+    return JobManager(
+        stage_workers={
+            "llm": int(os.getenv("JOB_LLM_WORKERS", "4")),
+            "github": int(os.getenv("JOB_GITHUB_WORKERS", "4")),
+            "pages": int(os.getenv("JOB_PAGES_WORKERS", "50")),
+            "notify": int(os.getenv("JOB_NOTIFY_WORKERS", "8")),
+        },
+        max_pending=int(os.getenv("JOB_MAX_PENDING", "100")),
+        history_limit=int(os.getenv("JOB_HISTORY_LIMIT", "500")),
+        locks=create_repo_lock_manager_from_env(),
+    )
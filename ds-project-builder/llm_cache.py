@@ -0,0 +1,152 @@
+# llm_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class LLMResponseCache:
+    """
+    Caches parsed LLM outputs (the dict of files from a response),
+    keyed on a hash of the rendered prompt and model name.
+
+    Entries live in a bounded in-memory LRU backed by a size-capped
+    directory of JSON files; both tiers honour the same TTL. Callers on
+    the event loop use the *_async methods, which answer memory hits
+    inline and leave disk reads and writes to a worker thread.
+    """
+
+    def __init__(self, directory: str, max_memory_entries: int = 128,
+                 max_disk_bytes: int = 200 * 1024 * 1024, ttl: float = 7 * 24 * 3600):
+        self.directory = directory
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._disk_bytes = sum(os.path.getsize(path) for path in self._disk_files())
+
+    @staticmethod
+    def make_key(prompt: str, model_name: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        files = self._get_memory(key)
+        return files if files is not None else self._get_disk(key)
+
+    async def get_async(self, key: str) -> dict | None:
+        files = self._get_memory(key)
+        return files if files is not None else await asyncio.to_thread(self._get_disk, key)
+
+    def set(self, key: str, files: dict):
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, stored_at, dict(files))
+        self._write_disk(key, stored_at, files)
+
+    async def set_async(self, key: str, files: dict):
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, stored_at, dict(files))
+        await asyncio.to_thread(self._write_disk, key, stored_at, files)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._memory.pop(key, None)
+        self._remove(self._path(key))
+
+    async def delete_async(self, key: str):
+        with self._lock:
+            self._memory.pop(key, None)
+        await asyncio.to_thread(self._remove, self._path(key))
+
+    def _get_memory(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and time.time() - entry[0] < self.ttl:
+                self._memory.move_to_end(key)
+                return dict(entry[1])
+            self._memory.pop(key, None)
+        return None
+
+    def _get_disk(self, key: str) -> dict | None:
+        now = time.time()
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if now - stored["stored_at"] >= self.ttl:
+            self._remove(path)
+            return None
+
+        os.utime(path)  # Mark as recently used for disk eviction
+        with self._lock:
+            self._remember(key, stored["stored_at"], stored["files"])
+        return dict(stored["files"])
+
+    def _write_disk(self, key: str, stored_at: float, files: dict):
+        path = self._path(key)
+        data = json.dumps({"stored_at": stored_at, "files": files}).encode("utf-8")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._disk_bytes += len(data) - previous_size
+        self._evict_disk()
+
+    def _remember(self, key: str, stored_at: float, files: dict):
+        self._memory[key] = (stored_at, files)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _disk_files(self) -> list[str]:
+        return [
+            os.path.join(root, name)
+            for root, _, names in os.walk(self.directory)
+            for name in names if name.endswith(".json")
+        ]
+
+    def _remove(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+
+    def _evict_disk(self):
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        # Least recently used first (reads refresh mtime)
+        for path in sorted(self._disk_files(), key=os.path.getmtime):
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            self._remove(path)
+
+
+def create_llm_cache_from_env() -> LLMResponseCache | None:
+    """
+    Builds the response cache, or returns None when LLM_CACHE_ENABLED is off.
+    """
+    if os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    return LLMResponseCache(
+        os.getenv("LLM_CACHE_DIR", ".llm_cache"),
+        max_memory_entries=int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "128")),
+        max_disk_bytes=int(os.getenv("LLM_CACHE_MAX_DISK_MB", "200")) * 1024 * 1024,
+        ttl=float(os.getenv("LLM_CACHE_TTL_HOURS", "168")) * 3600,
+    )
@@ -0,0 +1,275 @@
+# llm_client.py
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from functools import cache
+from circuit_breaker import get_breaker
+from observability import LLM_PROMPT_TOKENS, LLM_TOKENS, get_logger, observe_stage
+
+logger = get_logger(__name__)
+
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def load_genai():
+    """
+    Imports and configures the Gemini SDK on first use. The import alone
+    takes most of the app's startup time, so it is kept off the import path.
+    """
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            import google.generativeai as genai
+            genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+            _genai = genai
+        return _genai
+
+
+@cache
+def retryable_errors() -> tuple:
+    """Errors worth retrying: quota (429), overload (503/500) and server-side timeouts."""
+    from google.api_core import exceptions as google_exceptions
+    return (
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+        asyncio.TimeoutError,
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough offline token estimate (~4 characters per token for English/code).
+    """
+    return len(text) // 4 + 1
+
+
+def retry_after_hint(error: Exception) -> float | None:
+    """
+    Extracts the server's suggested wait from a quota error, e.g.
+    "retry_delay { seconds: 27 }" or "Please retry in 27.3s".
+    """
+    message = str(error)
+    match = re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", message) or re.search(r"retry in ([\d.]+)s", message)
+    return float(match.group(1)) if match else None
+
+
+class TokenBucket:
+    """
+    Refills `rate_per_minute` units per minute, up to one minute's worth.
+    acquire() waits until enough units are available.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_second = rate_per_minute / 60
+        self.capacity = rate_per_minute
+        self.available = rate_per_minute
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    async def acquire(self, amount: float):
+        # A single request larger than the bucket would never fit, so clamp it
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.available < amount:
+                await asyncio.sleep((amount - self.available) / self.rate_per_second)
+                self._refill()
+            self.available -= amount
+
+    def adjust(self, amount: float):
+        """Debits (or credits, if negative) a correction once real usage is known."""
+        self._refill()
+        self.available = min(self.capacity, self.available - amount)
+
+
+class LatencyTracker:
+    """
+    Rolling window of recent successful call durations, used to decide
+    when a call is slow enough to be worth hedging.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> float | None:
+        """The p-th percentile, or None until enough calls have been seen."""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class AsyncLLMClient:
+    """
+    Async Gemini client that caps concurrent calls, paces requests and
+    tokens to the per-minute quota, enforces deadlines, and retries
+    transient failures honouring retry-after hints. Calls go through the
+    model's circuit breaker, so a degraded model fails fast with CircuitOpen.
+    """
+
+    def __init__(self, model_name: str, max_concurrency: int = 4, requests_per_minute: float = 60,
+                 tokens_per_minute: float = 1_000_000, expected_output_tokens: int = 4000,
+                 attempt_timeout: float = 120, deadline: float = 300, max_retries: int = 3):
+        self.model_name = model_name
+        self._model = None
+        self._model_lock = threading.Lock()
+        self.expected_output_tokens = expected_output_tokens
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._request_bucket = TokenBucket(requests_per_minute)
+        self._token_bucket = TokenBucket(tokens_per_minute)
+        self.latencies = LatencyTracker()
+        self.breaker = get_breaker(f"gemini:{model_name}")
+
+    @property
+    def model(self):
+        """The SDK model object, created (and the SDK loaded) on first use."""
+        with self._model_lock:
+            if self._model is None:
+                self._model = load_genai().GenerativeModel(self.model_name)
+            return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+
+    async def _get_model(self):
+        # Loading the SDK (or waiting on the warm-up thread that is loading it) must not block the loop
+        if self._model is None:
+            return await asyncio.to_thread(lambda: self.model)
+        return self._model
+
+    async def generate(self, prompt: str, consumer_factory=None) -> str:
+        """
+        Returns the response text for `prompt`, raising the last error if
+        every attempt fails or the overall deadline is reached.
+
+        With `consumer_factory`, the response is streamed: each attempt gets
+        a fresh consumer from the factory and every chunk is passed to it.
+        A consumer may raise to abort the generation early.
+        """
+        started = time.monotonic()
+        estimated_tokens = estimate_tokens(prompt) + self.expected_output_tokens
+
+        for attempt in range(self.max_retries + 1):
+            remaining = self.deadline - (time.monotonic() - started)
+            try:
+                with observe_stage("llm_budget_wait"):
+                    await asyncio.wait_for(self._acquire_budget(estimated_tokens), timeout=remaining)
+                async with self._semaphore:
+                    self.breaker.before_call()
+                    remaining = self.deadline - (time.monotonic() - started)
+                    consumer = consumer_factory() if consumer_factory else None
+                    call_started = time.monotonic()
+                    try:
+                        with observe_stage("llm_call"):
+                            response, text = await asyncio.wait_for(
+                                self._call(prompt, consumer),
+                                timeout=min(self.attempt_timeout, remaining),
+                            )
+                    except retryable_errors() as e:
+                        self.breaker.record_failure(f"{type(e).__name__}: {e}")
+                        raise
+                    except BaseException:
+                        # Aborted by its consumer or cancelled (e.g. a losing hedge): says nothing about the model
+                        self.breaker.release()
+                        raise
+                    self.latencies.record(time.monotonic() - call_started)
+                    self.breaker.record_success(time.monotonic() - call_started)
+                self._record_usage(response, estimated_tokens)
+                return text
+
+            except retryable_errors() as e:
+                delay = retry_after_hint(e) or min(30, 2 ** attempt + random.uniform(0, 1))
+                elapsed = time.monotonic() - started
+                if attempt == self.max_retries or elapsed + delay >= self.deadline:
+                    raise
+                logger.warning(f"⚠️ Gemini call failed ({type(e).__name__}), retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+    async def count_tokens(self, text: str) -> tuple[int, str]:
+        """
+        Returns the size of `text` in tokens and how it was measured:
+        "exact" from the API, or "estimate" if the API can't be reached.
+        """
+        try:
+            model = await self._get_model()
+            response = await asyncio.wait_for(model.count_tokens_async(text), timeout=10)
+            return response.total_tokens, "exact"
+        except Exception as e:
+            logger.debug(f"Token count unavailable, estimating instead: {e}")
+            return estimate_tokens(text), "estimate"
+
+    def has_idle_capacity(self) -> bool:
+        """True if a call started now would not have to queue for a slot (or fail fast)."""
+        return not self._semaphore.locked() and not self.breaker.is_open
+
+    async def _call(self, prompt: str, consumer) -> tuple:
+        model = await self._get_model()
+        if consumer is None:
+            response = await model.generate_content_async(prompt)
+            return response, response.text
+
+        response = await model.generate_content_async(prompt, stream=True)
+        parts = []
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                continue  # A chunk without text parts, e.g. only safety metadata
+            parts.append(text)
+            consumer(text)
+        return response, "".join(parts)
+
+    async def _acquire_budget(self, estimated_tokens: int):
+        await self._request_bucket.acquire(1)
+        await self._token_bucket.acquire(estimated_tokens)
+
+    def _record_usage(self, response, estimated_tokens: int):
+        usage = getattr(response, "usage_metadata", None)
+        total = getattr(usage, "total_token_count", 0) if usage else 0
+        if total:
+            self._token_bucket.adjust(total - estimated_tokens)
+
+        prompt_tokens = getattr(usage, "prompt_token_count", 0) if usage else 0
+        response_tokens = getattr(usage, "candidates_token_count", 0) if usage else 0
+        LLM_TOKENS.inc(prompt_tokens, model=self.model_name, direction="prompt")
+        LLM_TOKENS.inc(response_tokens, model=self.model_name, direction="response")
+        LLM_PROMPT_TOKENS.observe(prompt_tokens, model=self.model_name)
+        logger.info("Gemini call finished", extra={"fields": {
+            "model": self.model_name, "prompt_tokens": prompt_tokens, "response_tokens": response_tokens,
+        }})
+
+
+def create_llm_client_from_env(model_name: str | None = None) -> AsyncLLMClient:
+    """
+    Builds the LLM client using limits from the environment, for LLM_MODEL
+    unless another model is given.
+    """
+    return AsyncLLMClient(
+        model_name or os.getenv("LLM_MODEL", "gemini-2.5-flash"),
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+        requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60")),
+        tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000")),
+        attempt_timeout=float(os.getenv("LLM_TIMEOUT", "120")),
+        deadline=float(os.getenv("LLM_DEADLINE", "300")),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+    )
@@ -1,92 +1,257 @@
 # llm_handler.py
 import os
 import re
-import google.generativeai as genai
-from dotenv import load_dotenv
-import base64 # <-- Make sure base64 is imported
+import asyncio
+from llm_client import create_llm_client_from_env
+from llm_cache import LLMResponseCache, create_llm_cache_from_env
+from response_parser import MalformedResponseError, StreamingFileParser
+from attachment_profiler import build_attachment_context
+from prompt_builder import LiteralElider, PromptSection, build_prompt, minify_html
+from patch_applier import apply_search_replace, parse_search_replace_blocks
+from observability import Counter, get_logger, register
 
+logger = get_logger(__name__)
 
-load_dotenv()
+# The Gemini SDK itself is loaded on first use (or by the startup warm-up)
+llm_client = create_llm_client_from_env()
+llm_cache = create_llm_cache_from_env()
 
+# Hedging: once a call has run longer than this percentile of recent calls,
+# a second request races it (on LLM_HEDGE_MODEL if set). 0 disables hedging.
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "10"))
+# Responses that can't be parsed are retried this many times on LLM_FALLBACK_MODEL
+PARSE_RETRIES = int(os.getenv("LLM_PARSE_RETRIES", "1"))
 
-print(f"DEBUG: Loaded Google API Key starts with: {os.getenv('GOOGLE_API_KEY')[:8] if os.getenv('GOOGLE_API_KEY') else 'None'}")
 
+def _client_for(model_name: str | None):
+    # Reusing the primary client keeps one set of rate limits per model
+    if not model_name or model_name == llm_client.model_name:
+        return llm_client
+    return create_llm_client_from_env(model_name)
 
-# Configure the Gemini API client
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-model = genai.GenerativeModel('gemini-2.5-flash')
 
+hedge_client = _client_for(os.getenv("LLM_HEDGE_MODEL"))
+fallback_client = _client_for(os.getenv("LLM_FALLBACK_MODEL"))
 
-def parse_llm_response(content: str) -> dict | None:
+LLM_HEDGES = register(Counter("ds_llm_hedges_total", "Hedged LLM requests, by whether the hedge won.", ("outcome",)))
+LLM_PARSE_RETRIES = register(Counter("ds_llm_parse_retries_total", "Generations retried after an unparseable response.", ("model",)))
+
+# "patch" asks for SEARCH/REPLACE edits on revisions (with a full-regeneration
+# fallback); "full" always re-emits the whole index.html
+REVISE_MODE = os.getenv("LLM_REVISE_MODE", "patch")
+# Small files are cheap to re-emit, so only patch files at least this long
+PATCH_MIN_CHARS = int(os.getenv("LLM_PATCH_MIN_CHARS", "3000"))
+
+
+# Files every response must contain; any others are kept as well
+REQUIRED_FILES = ("index.html", "README.md")
+
+# Repo-relative paths the model may write: non-empty segments of safe characters, none made only
+# of dots. Rejects absolute paths, "..", echoed "[START ...]" placeholders and stray whitespace.
+_SAFE_SEGMENT = r"(?!\.+(?:/|$))[A-Za-z0-9._-]+"
+SAFE_PATH = re.compile(rf"{_SAFE_SEGMENT}(?:/{_SAFE_SEGMENT})*")
+
+
+def collect_parsed_files(parser: StreamingFileParser, required: tuple = REQUIRED_FILES) -> dict | None:
+    """
+    Returns the files a parser has extracted, or None if a required
+    file is missing.
+    """
+    missing = [path for path in required if path not in parser.files]
+    if missing:
+        unterminated = f" ('{parser.unterminated_path}' was never closed)" if parser.unterminated_path else ""
+        logger.error(f"❌ ERROR: Expected markers not found in LLM response! Missing: {', '.join(missing)}{unterminated}")
+        return None
+    files = {}
+    for path, content in parser.files.items():
+        if not SAFE_PATH.fullmatch(path):
+            logger.warning(f"⚠️ Skipping file with an unsafe path from the LLM response: {path!r}")
+            continue
+        files[path] = content
+    return files
+
+
+async def generate_files_streaming(prompt: str, on_file=None, required: tuple = REQUIRED_FILES) -> dict | None:
     """
-    A robust parser to extract multiple files from an LLM's response
-    using regular expressions.
+    Streams a generation through StreamingFileParser, so each file is
+    available (via `on_file`) as soon as its END marker arrives and a
+    malformed response is aborted early with MalformedResponseError.
+
+    Slow calls are hedged, and a response that can't be parsed is retried
+    on the fallback model up to PARSE_RETRIES times.
+    """
+    clients = [llm_client] + [fallback_client] * PARSE_RETRIES
+    for attempt, client in enumerate(clients):
+        if attempt:
+            LLM_PARSE_RETRIES.inc(model=client.model_name)
+            logger.warning(f"⚠️ Unparseable LLM response; retrying on {client.model_name} ({attempt}/{PARSE_RETRIES}).")
+        parsed_files = await generate_hedged(prompt, client, on_file, required)
+        if parsed_files:
+            return parsed_files
+    return None
+
+
+async def generate_hedged(prompt: str, client, on_file=None, required: tuple = REQUIRED_FILES) -> dict | None:
     """
+    Runs one generation on `client`. If it is still running after the
+    hedge delay and the hedge client has a free slot, races a second
+    request there and returns the first result that parses, cancelling
+    the other.
+    """
+    primary = asyncio.create_task(_generate_and_parse(client, prompt, on_file, required))
+    hedge_after = client.latencies.percentile(HEDGE_PERCENTILE) if HEDGE_PERCENTILE else None
+    if hedge_after is None:
+        return await primary
+
+    done, _ = await asyncio.wait({primary}, timeout=max(hedge_after, HEDGE_MIN_DELAY))
+    # A hedge that has to queue behind other calls only adds load, so skip it when saturated
+    if done or not hedge_client.has_idle_capacity():
+        return await primary
+
+    LLM_HEDGES.inc(outcome="launched")
+    logger.info(f"🐢 LLM call exceeded {max(hedge_after, HEDGE_MIN_DELAY):.1f}s; hedging on {hedge_client.model_name}.")
+    hedge = asyncio.create_task(_generate_and_parse(hedge_client, prompt, on_file, required))
+    pending = {primary, hedge}
+    error, unparseable = None, False
     try:
-        print(f"📄 Raw LLM Response (first 500 chars):\n{content[:500]}...")
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception():
+                    error = task.exception()
+                elif task.result():
+                    if task is hedge:
+                        LLM_HEDGES.inc(outcome="won")
+                    return task.result()
+                else:
+                    unparseable = True
+    finally:
+        for task in pending:
+            task.cancel()
+    # An unparseable response is worth a fallback retry; two failed calls are not
+    if error and not unparseable:
+        raise error
+    return None
 
-        # Use regex to find all file blocks, handling potential extra text
-        # re.DOTALL makes '.' match newlines, which is crucial here
-        html_match = re.search(r"\[START index.html\](.*?)\[END index.html\]", content, re.DOTALL)
-        readme_match = re.search(r"\[START README.md\](.*?)\[END README.md\]", content, re.DOTALL)
 
-        if not html_match or not readme_match:
-            print(f"❌ ERROR: Expected markers not found in LLM response!\nFull response:\n{content}")
-            return None
+async def _generate_and_parse(client, prompt: str, on_file, required: tuple) -> dict | None:
+    # Returns None for a response that can't be parsed, so it can be retried
+    parsers = []
 
-        html_code = html_match.group(1).strip()
-        readme_code = readme_match.group(1).strip()
+    def new_consumer():
+        parsers.append(StreamingFileParser(on_file=on_file or _log_received_file))
+        return parsers[-1].feed
 
-        return {
-            "index.html": html_code,
-            "README.md": readme_code
-        }
+    try:
+        response_text = await client.generate(prompt, consumer_factory=new_consumer)
+    except MalformedResponseError as e:
+        logger.error(f"❌ Aborted malformed LLM response: {e}")
+        return None
+    logger.debug(f"📄 Raw LLM Response (first 500 chars):\n{response_text[:500]}...")
+    return collect_parsed_files(parsers[-1], required)
 
-    except Exception as e:
-        print(f"❌ Error parsing LLM response: {e}")
+
+def _log_received_file(path: str, content: str):
+    logger.info(f"📥 Received {path} ({len(content)} chars)")
+
+
+async def _attachment_section(attachments: list | None, elider: LiteralElider, empty: str, revision: bool = False) -> PromptSection:
+    """
+    The attachments part of a prompt, with image Data URIs elided. Data
+    profiles are summarized further if the prompt is over budget.
+    """
+    # Profiling reads every attachment from disk, so keep it off the event loop
+    context = await asyncio.to_thread(
+        build_attachment_context, attachments, revision=revision, image_uri=elider.elide_attachment
+    )
+    if not context:
+        return PromptSection(empty)
+
+    def summarize(budget: int):
+        return lambda _: build_attachment_context(attachments, revision=revision, budget=budget, image_uri=elider.elide_attachment)
+
+    return PromptSection(context, priority=0, steps=(("summarize", summarize(1000)), ("outline", summarize(300))))
+
+
+async def _revision_sections(new_brief: str, existing_html: str, attachments: list | None, elider: LiteralElider,
+                       feedback: list | None = None) -> dict:
+    # New attachments give way before the code being revised
+    return {
+        "new_brief": new_brief,
+        "existing_html": PromptSection(
+            elider.elide_data_uris(existing_html), priority=1,
+            steps=(("minify", minify_html), ("elide_literals", elider.elide_strings)),
+        ),
+        "attachments": await _attachment_section(attachments, elider, "**New Attachments:** None provided.", revision=True),
+        "feedback": _feedback_section(feedback),
+    }
+
+
+def _feedback_section(feedback: list | None) -> str:
+    if not feedback:
+        return ""
+    problems = "\n".join(f"    - {problem}" for problem in feedback)
+    return f"**Your previous attempt failed these checks. Fix every one of them:**\n{problems}\n"
+
+
+async def generate_until_valid(generate, validate, trace: dict, retries: int) -> tuple[dict | None, list]:
+    """
+    Awaits `generate(feedback)` until `validate(files)` finds no problems,
+    feeding each attempt's problems into the next prompt, at most
+    `retries` extra times. Invalid responses are evicted from the cache so
+    they aren't served again. Returns the last files and their problems.
+    """
+    feedback = None
+    for attempt in range(retries + 1):
+        files = await generate(feedback)
+        if not files:
+            return None, []
+        problems = await validate(files)
+        if not problems:
+            return files, []
+        if llm_cache and trace.get("prompt_hash"):
+            await llm_cache.delete_async(trace["prompt_hash"])
+        logger.warning(f"⚠️ Generated files failed validation ({attempt + 1}/{retries + 1}): {'; '.join(problems)}")
+        feedback = problems
+    return files, problems
+
+
+async def get_cached_response(cache_key: str, use_cache: bool) -> dict | None:
+    """
+    Returns a previously parsed response for this exact prompt, if caching
+    is enabled for the request and the entry has not expired.
+    """
+    if not (use_cache and llm_cache):
         return None
+    cached_files = await llm_cache.get_async(cache_key)
+    if cached_files:
+        logger.info(f"⚡ Using cached LLM response ({cache_key[:12]}).")
+    return cached_files
 
 
-def generate_app_with_llm(brief: str, attachments: list | None = None) -> dict:
+async def generate_app_with_llm(brief: str, attachments: list | None = None, use_cache: bool = True, on_file=None, trace: dict | None = None, feedback: list | None = None) -> dict:
     """
     Generates application files (HTML, README) using Gemini,
     now with intelligent handling for different attachment types (data vs. assets).
+    If given, `trace` receives details of the call such as the prompt hash,
+    and `feedback` lists problems found in a previous attempt to fix.
     """
-    print("🤖 Sending brief to Gemini to generate code...")
-
-    attachment_context = ""
-    if attachments:
-        print(f"📄 Processing {len(attachments)} attachment(s)...")
-        for attachment in attachments:
-            try:
-                header, encoded_data = attachment['url'].split(',', 1)
-                mime_type = header.split(';')[0].split(':')[1]
-
-                # --- THIS IS THE NEW LOGIC ---
-                # If it's an image, we tell the LLM to use the data URI directly.
-                if mime_type.startswith('image/'):
-                    attachment_context += f"\n--- Asset Attachment: {attachment['name']} ---\n"
-                    attachment_context += f"Use this full Data URI as a source URL (e.g., in an <img> src attribute):\n"
-                    attachment_context += f"```\n{attachment['url']}\n```\n"
-                # Otherwise, we assume it's data and decode it.
-                else:
-                    decoded_content = base64.b64decode(encoded_data).decode('utf-8')
-                    attachment_context += f"\n--- Data Attachment: {attachment['name']} ---\n"
-                    attachment_context += f"```\n{decoded_content[:2000]}\n```\n" # Limit to first 2000 chars
+    logger.info("🤖 Sending brief to Gemini to generate code...")
 
-            except Exception as e:
-                print(f"⚠️  Could not process attachment {attachment['name']}: {e}")
-    
+    elider = LiteralElider()
     # The prompt is updated with clearer instructions
-    prompt = f"""
+    template = """
     You are an expert, minimalist web developer. You create simple, single-file web applications using only HTML and vanilla JavaScript.
 
     **Task:** Based on the following brief and any provided attachments, generate a complete and runnable `index.html` file and a professional `README.md` file.
 
     **Brief:** "{brief}"
-    {attachment_context if attachment_context else "**Attachments:** None provided."}
+    {attachments}
+    {elision_note}
+    {feedback}
     **Instructions:**
-    1.  If "Data Attachments" are provided, your JavaScript code MUST use the data from them to fulfill the brief.
+    1.  If "Data Attachments" are provided, your JavaScript code MUST use the data from them to fulfill the brief. Each one is shown as a profile (schema and sample rows); use its structure and values.
     2.  If "Asset Attachments" are provided, your HTML/CSS code MUST use the full Data URI as a source for elements like images. Do NOT try to decode the asset content.
     3.  Generate the content for `index.html`.
     4.  Generate the content for `README.md`.
@@ -122,50 +287,49 @@ def generate_app_with_llm(brief: str, attachments: list | None = None) -> dict:
     This project is licensed under the MIT License.
     [END README.md]
     """
+    prompt, prompt_tokens = await build_prompt("generate", template, {
+        "brief": brief,
+        "attachments": await _attachment_section(attachments, elider, "**Attachments:** None provided."),
+        "feedback": _feedback_section(feedback),
+    }, llm_client, elider)
+
+    cache_key = LLMResponseCache.make_key(prompt, llm_client.model_name)
+    if trace is not None:
+        trace.update(prompt_hash=cache_key, prompt_tokens=prompt_tokens)
+    # Cached and fresh responses both still hold placeholders for elided literals
+    cached_files = await get_cached_response(cache_key, use_cache)
+    if cached_files:
+        return elider.restore_files(cached_files)
 
     try:
-        response = model.generate_content(prompt)
-        # --- THIS IS THE UPGRADED PART ---
-        parsed_files = parse_llm_response(response.text)
+        parsed_files = await generate_files_streaming(prompt, on_file)
         if parsed_files:
-            print("✅ Code generated and parsed successfully!")
-            return parsed_files
+            logger.info("✅ Code generated and parsed successfully!")
+            if llm_cache:
+                await llm_cache.set_async(cache_key, parsed_files)
+            return elider.restore_files(parsed_files)
         else:
             raise ValueError("Failed to parse LLM response.")
             
     except Exception as e:
-        print(f"❌ Error generating code with LLM: {e}")
+        logger.error(f"❌ Error generating code with LLM: {e}")
         return None
 
-def revise_app_with_llm(new_brief: str, existing_html: str, attachments: list | None = None) -> dict | None:
+async def revise_app_with_llm(new_brief: str, existing_html: str, attachments: list | None = None, use_cache: bool = True, on_file=None, mode: str | None = None, trace: dict | None = None, feedback: list | None = None) -> dict | None:
     """
     Revises an existing HTML file using Gemini, now with intelligent
     handling for attachments during the revision process.
     """
-    print("🤖 Sending existing code and new brief to Gemini for revision...")
+    logger.info("🤖 Sending existing code and new brief to Gemini for revision...")
 
-    attachment_context = ""
-    if attachments:
-        print(f"📄 Processing {len(attachments)} attachment(s) for revision...")
-        for attachment in attachments:
-            try:
-                header, encoded_data = attachment['url'].split(',', 1)
-                mime_type = header.split(';')[0].split(':')[1]
+    if (mode or REVISE_MODE) == "patch" and len(existing_html) >= PATCH_MIN_CHARS:
+        patched_files = await revise_app_with_patch(new_brief, existing_html, attachments, use_cache, on_file, trace, feedback)
+        if patched_files:
+            return patched_files
+        logger.info("↩️ Patch revision failed; falling back to full regeneration.")
 
-                if mime_type.startswith('image/'):
-                    attachment_context += f"\n--- New Asset Attachment: {attachment['name']} ---\n"
-                    attachment_context += f"Incorporate this new asset. Use its full Data URI as a source URL:\n"
-                    attachment_context += f"```\n{attachment['url']}\n```\n"
-                else:
-                    decoded_content = base64.b64decode(encoded_data).decode('utf-8')
-                    attachment_context += f"\n--- New Data Attachment: {attachment['name']} ---\n"
-                    attachment_context += f"Incorporate this new data into the application logic:\n"
-                    attachment_context += f"```\n{decoded_content[:2000]}\n```\n"
-
-            except Exception as e:
-                print(f"⚠️  Could not process attachment {attachment['name']}: {e}")
-
-    prompt = f"""
+    elider = LiteralElider()
+    template = """
     You are an expert web developer specializing in updating existing code.
     Your task is to modify the provided HTML file based on a new request, potentially incorporating new data or assets from attachments.
 
@@ -186,8 +350,10 @@ def revise_app_with_llm(new_brief: str, existing_html: str, attachments: list |
     **NEW BRIEF:**
     "{new_brief}"
     ---
-    {attachment_context if attachment_context else "**New Attachments:** None provided."}
+    {attachments}
     ---
+    {elision_note}
+    {feedback}
 
     [START index.html]
     <!DOCTYPE html>
@@ -199,17 +365,107 @@ def revise_app_with_llm(new_brief: str, existing_html: str, attachments: list |
     ... your updated readme content ...
     [END README.md]
     """
+    prompt, prompt_tokens = await build_prompt(
+        "revise", template, await _revision_sections(new_brief, existing_html, attachments, elider, feedback), llm_client, elider
+    )
+
+    cache_key = LLMResponseCache.make_key(prompt, llm_client.model_name)
+    if trace is not None:
+        trace.update(prompt_hash=cache_key, prompt_tokens=prompt_tokens)
+    cached_files = await get_cached_response(cache_key, use_cache)
+    if cached_files:
+        return elider.restore_files(cached_files)
 
     try:
-        response = model.generate_content(prompt)
-        # --- THIS IS THE UPGRADED PART ---
-        parsed_files = parse_llm_response(response.text)
+        parsed_files = await generate_files_streaming(prompt, on_file)
         if parsed_files:
-            print("✅ Code revised and parsed successfully!")
-            return parsed_files
+            logger.info("✅ Code revised and parsed successfully!")
+            if llm_cache:
+                await llm_cache.set_async(cache_key, parsed_files)
+            return elider.restore_files(parsed_files)
         else:
             raise ValueError("Failed to parse LLM response.")
 
     except Exception as e:
-        print(f"❌ Error revising code with LLM: {e}")
-        return None
\ No newline at end of file
+        logger.error(f"❌ Error revising code with LLM: {e}")
+        return None
+
+
+async def revise_app_with_patch(new_brief: str, existing_html: str, attachments: list | None = None, use_cache: bool = True, on_file=None, trace: dict | None = None, feedback: list | None = None) -> dict | None:
+    """
+    Asks Gemini for SEARCH/REPLACE edits to index.html instead of the whole
+    file, and applies them locally. Returns None if the edits can't be
+    parsed or applied, so the caller can fall back to a full revision.
+    """
+    elider = LiteralElider()
+    template = """
+    You are an expert web developer specializing in updating existing code.
+    Your task is to modify the provided HTML file based on a new request, potentially incorporating new data or assets from attachments.
+
+    **Instructions:**
+    1.  Carefully analyze the "EXISTING index.html".
+    2.  Implement the changes described in the "NEW BRIEF".
+    3.  If new attachments are provided, integrate them as instructed (use data in JS, use asset URIs in HTML/CSS).
+    4.  Do NOT re-emit the whole index.html. Express every change to it as SEARCH/REPLACE blocks inside the `index.html.patch` file block.
+    5.  Each SEARCH section must copy lines from the EXISTING index.html exactly, including indentation, and include enough lines to match only one place. Blocks are applied in order.
+    6.  Generate the complete updated `README.md` that reflects the new functionality.
+
+    **CRITICAL INSTRUCTION:** You MUST respond with ONLY the file blocks in the specified format below. Do not add any explanation or conversational text outside of the file blocks. Your response must contain the `[START ...]` and `[END ...]` markers.
+
+    ---
+    **EXISTING index.html:**
+    ```html
+    {existing_html}
+    ```
+    ---
+    **NEW BRIEF:**
+    "{new_brief}"
+    ---
+    {attachments}
+    ---
+    {elision_note}
+    {feedback}
+
+    [START index.html.patch]
+    <<<<<<< SEARCH
+    ... exact lines from the existing index.html ...
+    =======
+    ... the lines that replace them ...
+    >>>>>>> REPLACE
+    [END index.html.patch]
+    [START README.md]
+    # Updated Project Title
+    ... your updated readme content ...
+    [END README.md]
+    """
+    sections = await _revision_sections(new_brief, existing_html, attachments, elider, feedback)
+    original_html = sections["existing_html"].text
+    prompt, prompt_tokens = await build_prompt("revise_patch", template, sections, llm_client, elider)
+    if sections["existing_html"].text != original_html:
+        # Edits would quote the minified page, and applying them would ship it reformatted
+        logger.info("↩️ index.html had to be compressed to fit the prompt; skipping patch revision.")
+        return None
+
+    # The key covers existing_html, so a cached result always matches the file it patched
+    cache_key = LLMResponseCache.make_key(prompt, llm_client.model_name)
+    if trace is not None:
+        trace.update(prompt_hash=cache_key, prompt_tokens=prompt_tokens)
+    cached_files = await get_cached_response(cache_key, use_cache)
+    if cached_files:
+        return elider.restore_files(cached_files)
+
+    try:
+        parsed_files = await generate_files_streaming(prompt, on_file, required=("index.html.patch", "README.md"))
+        if not parsed_files:
+            return None
+        blocks = parse_search_replace_blocks(parsed_files.pop("index.html.patch"))
+        # Edits quote the HTML as the prompt showed it, with only data URIs elided
+        parsed_files["index.html"] = apply_search_replace(original_html, blocks)
+        logger.info(f"✅ Applied {len(blocks)} edit(s) to index.html.")
+        if llm_cache:
+            await llm_cache.set_async(cache_key, parsed_files)
+        return elider.restore_files(parsed_files)
+
+    except Exception as e:
+        logger.warning(f"⚠️ Could not revise code with edits: {e}")
+        return None
@@ -0,0 +1,243 @@
+# notification_outbox.py
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from circuit_breaker import CircuitOpen
+from evaluation_handler import evaluation_breaker, post_notification
+from observability import NOTIFICATIONS_TOTAL, get_logger, observe_stage
+
+logger = get_logger(__name__)
+
+
+class NotificationOutbox:
+    """
+    A SQLite-backed outbox of evaluation notifications. Entries survive
+    process restarts and are delivered by OutboxDispatcher until they
+    succeed or run out of attempts and are dead-lettered. Delivered
+    entries are kept for `retention_days`, then purged.
+    """
+
+    def __init__(self, db_path: str, max_attempts: int = 8, base_delay: float = 1, max_delay: float = 300,
+                 lease_seconds: float = 60, retention_days: float = 7):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS notifications (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    delivered_at REAL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_notifications_due ON notifications (status, next_attempt_at)")
+
+    def add_listener(self, callback):
+        """Registers a callback invoked (from any thread) after each enqueue."""
+        self._listeners.append(callback)
+
+    def enqueue(self, url: str, payload: dict) -> int:
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO notifications (url, payload, next_attempt_at, created_at) VALUES (?, ?, ?, ?)",
+                (url, json.dumps(payload), now, now),
+            )
+        logger.info(f"📮 Queued notification {cursor.lastrowid} for {url}")
+        for callback in self._listeners:
+            callback()
+        return cursor.lastrowid
+
+    def claim_due(self, limit: int) -> list[dict]:
+        """
+        Returns up to `limit` entries that are due and leases them, so an
+        entry left behind by a crashed dispatcher becomes due again later.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT * FROM notifications WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE notifications SET next_attempt_at = ? WHERE id = ?",
+                [(now + self.lease_seconds, row["id"]) for row in rows],
+            )
+        return [dict(row) for row in rows]
+
+    def next_due_in(self) -> float | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM notifications WHERE status = 'pending'"
+            ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def mark_delivered(self, entry_id: int):
+        NOTIFICATIONS_TOTAL.inc(outcome="delivered")
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE notifications SET status = 'delivered', attempts = attempts + 1, delivered_at = ?, last_error = NULL WHERE id = ?",
+                (time.time(), entry_id),
+            )
+
+    def mark_failed(self, entry: dict, error: str, retryable: bool = True):
+        attempts = entry["attempts"] + 1
+        if not retryable or attempts >= self.max_attempts:
+            status, next_attempt_at = "dead", entry["next_attempt_at"]
+            NOTIFICATIONS_TOTAL.inc(outcome="dead")
+            logger.warning(f"🚫 Notification {entry['id']} dead-lettered after {attempts} attempt(s): {error}")
+        else:
+            # Full jitter keeps retries from many entries from arriving in lockstep
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempts - 1)))
+            status, next_attempt_at = "pending", time.time() + delay
+            NOTIFICATIONS_TOTAL.inc(outcome="retry")
+            logger.info(f"Retrying notification {entry['id']} in {delay:.1f} second(s)...")
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE notifications SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (status, attempts, next_attempt_at, error, entry["id"]),
+            )
+
+    def postpone(self, entry_id: int, delay: float, reason: str):
+        """Pushes an entry back by `delay` seconds without using up one of its attempts."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE notifications SET next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (time.time() + delay, reason, entry_id),
+            )
+
+    def purge_delivered(self) -> int:
+        """Deletes delivered entries older than the retention period; returns how many."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM notifications WHERE status = 'delivered' AND delivered_at < ?",
+                (time.time() - self.retention_days * 86400,),
+            )
+        if cursor.rowcount:
+            logger.info(f"🧹 Purged {cursor.rowcount} delivered notification(s) from the outbox.")
+        return cursor.rowcount
+
+    def get(self, entry_id: int) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM notifications WHERE id = ?", (entry_id,)).fetchone()
+        return dict(row) if row else None
+
+    def dead_letters(self, limit: int = 100) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM notifications WHERE status = 'dead' ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM notifications GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+class OutboxDispatcher:
+    """
+    Delivers outbox entries from the event loop. Each HTTP attempt runs in
+    a thread using the per-host keep-alive sessions of evaluation_handler,
+    so a slow evaluation server only occupies one delivery slot. Entries
+    for a host whose circuit is open are held back until it half-opens,
+    without counting as attempts. Old delivered entries are purged every
+    `purge_interval` seconds.
+    """
+
+    def __init__(self, outbox: NotificationOutbox, concurrency: int = 8, poll_interval: float = 5,
+                 purge_interval: float = 3600):
+        self.outbox = outbox
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.purge_interval = purge_interval
+        self._purged_at = 0.0
+        self._wakeup = None
+        self._loop = None
+        self._task = None
+        self._in_flight = set()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.outbox.add_listener(lambda: self._loop.call_soon_threadsafe(self._wakeup.set))
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            if time.monotonic() - self._purged_at >= self.purge_interval:
+                self._purged_at = time.monotonic()
+                self.outbox.purge_delivered()
+            free_slots = self.concurrency - len(self._in_flight)
+            for entry in self.outbox.claim_due(free_slots) if free_slots > 0 else []:
+                task = asyncio.create_task(self._deliver(entry))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+
+            next_due = self.outbox.next_due_in()
+            timeout = self.poll_interval if next_due is None else min(self.poll_interval, next_due)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0.05))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, entry: dict):
+        breaker = evaluation_breaker(entry["url"])
+        try:
+            breaker.before_call()
+        except CircuitOpen as e:
+            # Jittered, so held-back entries don't all race for the half-open probe
+            self.outbox.postpone(entry["id"], max(1.0, e.retry_after) + random.uniform(0, 1), str(e))
+            self._wakeup.set()
+            return
+        with observe_stage("notify_delivery"):
+            ok, error, retryable = await asyncio.to_thread(
+                post_notification, entry["url"], json.loads(entry["payload"]), breaker
+            )
+        if ok:
+            self.outbox.mark_delivered(entry["id"])
+        else:
+            self.outbox.mark_failed(entry, error, retryable)
+        self._wakeup.set()
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> NotificationOutbox:
+    """
+    Returns the process-wide outbox, opening the database on first use.
+    """
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = NotificationOutbox(
+                os.getenv("OUTBOX_DB_PATH", "outbox.db"),
+                max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8")),
+                retention_days=float(os.getenv("OUTBOX_RETENTION_DAYS", "7")),
+            )
+        return _outbox
@@ -0,0 +1,170 @@
+# observability.py
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Set per HTTP request (and inherited by the job it starts) and per job
+request_id_var = contextvars.ContextVar("request_id", default=None)
+job_id_var = contextvars.ContextVar("job_id", default=None)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+# --- Metrics ---
+
+def _format_labels(names: tuple, values: tuple, extra: dict | None = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                out.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return out
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * len(self.buckets), [0, 0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            total[0] += 1
+            total[1] += value
+            self._series[key] = (counts, total)
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, (count, total)) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    out.append(f"{self.name}_bucket{_format_labels(self.labels, key, {'le': bound})} {bucket_count}")
+                out.append(f"{self.name}_bucket{_format_labels(self.labels, key, {'le': '+Inf'})} {count}")
+                out.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+                out.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return out
+
+
+STAGE_DURATION = Histogram("ds_stage_duration_seconds", "Time spent in each processing stage.", ("stage", "outcome"))
+JOB_STAGE_DURATION = Histogram("ds_job_stage_duration_seconds", "Time each job spent in a pipeline stage, including queueing for a worker.", ("kind", "stage"))
+JOBS_TOTAL = Counter("ds_jobs_total", "Finished jobs by kind and status.", ("kind", "status"))
+LLM_TOKENS = Counter("ds_llm_tokens_total", "Gemini tokens used, by direction.", ("model", "direction"))
+LLM_PROMPT_TOKENS = Histogram("ds_llm_prompt_tokens", "Prompt size per LLM call, in tokens.", ("model",),
+                              buckets=(500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000, 256000, 1000000))
+GITHUB_REQUEST_DURATION = Histogram("ds_github_request_duration_seconds", "GitHub API request latency.", ("method", "endpoint", "status"))
+NOTIFICATIONS_TOTAL = Counter("ds_notifications_total", "Evaluation notification attempts by outcome.", ("outcome",))
+
+REGISTRY = [STAGE_DURATION, JOB_STAGE_DURATION, JOBS_TOTAL, LLM_TOKENS, LLM_PROMPT_TOKENS, GITHUB_REQUEST_DURATION, NOTIFICATIONS_TOTAL]
+
+
+def register(metric):
+    """Adds a metric defined elsewhere to the /metrics output."""
+    REGISTRY.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def observe_stage(stage: str):
+    """
+    Times the enclosed block into ds_stage_duration_seconds, labelled
+    with whether it raised.
+    """
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, stage=stage, outcome=outcome)
+
+
+# --- Structured logging ---
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for name, var in (("request_id", request_id_var), ("job_id", job_id_var)):
+            value = var.get()
+            if value:
+                entry[name] = value
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_configured = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Returns a logger that writes one JSON object per line to stdout,
+    tagged with the current request and job ids.
+    """
+    global _configured
+    if not _configured:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+        root = logging.getLogger("ds")
+        root.addHandler(handler)
+        root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        root.propagate = False
+        _configured = True
+    return logging.getLogger(f"ds.{name}")
@@ -0,0 +1,339 @@
+# output_validator.py
+import json
+import os
+import queue
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from functools import cache
+from html.parser import HTMLParser
+from observability import Counter, observe_stage, register
+
+# "enforce" fails the job if the output is still invalid after the retries,
+# "warn" pushes it anyway, "off" skips validation
+VALIDATION_MODE = os.getenv("OUTPUT_VALIDATION", "enforce")
+# Re-generations (with the problems fed back) before giving up
+VALIDATION_RETRIES = int(os.getenv("OUTPUT_VALIDATION_RETRIES", "2"))
+MIN_HTML_BYTES = int(os.getenv("OUTPUT_MIN_HTML_BYTES", "200"))
+MAX_HTML_BYTES = int(os.getenv("OUTPUT_MAX_HTML_BYTES", str(5 * 1024 * 1024)))
+# Seconds Node may take to syntax-check one script before it is restarted
+NODE_CHECK_TIMEOUT = float(os.getenv("OUTPUT_NODE_CHECK_TIMEOUT", "10"))
+MAX_ERRORS = 10
+
+OUTPUT_VALIDATIONS = register(Counter("ds_output_validations_total", "Generated outputs validated before push, by result.", ("result",)))
+
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+# Elements whose end tag HTML lets authors leave out
+OPTIONAL_END_TAGS = {"html", "head", "body", "p", "li", "dt", "dd", "option", "optgroup", "tr", "td", "th",
+                     "thead", "tbody", "tfoot", "colgroup", "caption", "rt", "rp"}
+JS_SCRIPT_TYPES = {"", "text/javascript", "application/javascript", "module"}
+
+
+class _HTMLChecker(HTMLParser):
+    """Tracks open elements to find unclosed or stray tags, and collects inline scripts."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.open = []
+        self.errors = []
+        self.scripts = []
+        self._script = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_ELEMENTS:
+            return
+        line = self.getpos()[0]
+        self.open.append((tag, line))
+        if tag == "script":
+            self._script = (dict(attrs), line, [])
+
+    def handle_data(self, data):
+        if self._script:
+            self._script[2].append(data)
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS:
+            return
+        line = self.getpos()[0]
+        if tag == "script" and self._script:
+            attrs, start_line, parts = self._script
+            self.scripts.append((attrs, start_line, "".join(parts)))
+            self._script = None
+        for i in range(len(self.open) - 1, -1, -1):
+            if self.open[i][0] == tag:
+                for unclosed, opened_at in self.open[i + 1:]:
+                    if unclosed not in OPTIONAL_END_TAGS:
+                        self.errors.append(f"<{unclosed}> opened on line {opened_at} is not closed before </{tag}> on line {line}")
+                del self.open[i:]
+                return
+        self.errors.append(f"</{tag}> on line {line} has no matching opening tag")
+
+    def finish(self) -> list[str]:
+        self.close()
+        for tag, opened_at in self.open:
+            if tag not in OPTIONAL_END_TAGS:
+                self.errors.append(f"<{tag}> opened on line {opened_at} is never closed (is the file truncated?)")
+        return self.errors
+
+
+# Characters after which a "/" starts a regular expression rather than a division
+_REGEX_PREFIX = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_KEYWORDS = {"return", "typeof", "instanceof", "in", "of", "new", "delete", "void", "throw", "case", "do", "else", "yield", "await"}
+_CLOSERS = {")": "(", "]": "[", "}": "{"}
+
+
+def scan_js_brackets(code: str) -> str | None:
+    """
+    A fallback for when Node.js isn't installed: checks that brackets
+    balance and strings, template literals, comments and regex literals
+    are terminated. Returns the first problem found, or None.
+    """
+    stack = []
+    i, line, n = 0, 1, len(code)
+    previous = ""
+    while i < n:
+        c = code[i]
+        if stack and stack[-1][0] == "`":
+            # Inside a template literal
+            if c == "\\":
+                i += 2
+                continue
+            if c == "\n":
+                line += 1
+            if c == "`":
+                stack.pop()
+                previous = "a"
+            elif code.startswith("${", i):
+                stack.append(("${", line))
+                i += 1
+            i += 1
+            continue
+
+        if c == "\n":
+            line += 1
+        if c.isspace():
+            i += 1
+            continue
+        if code.startswith("//", i):
+            i = code.find("\n", i)
+            i = n if i == -1 else i
+            continue
+        if code.startswith("/*", i):
+            end = code.find("*/", i + 2)
+            if end == -1:
+                return f"unterminated comment starting on line {line}"
+            line += code.count("\n", i, end)
+            i = end + 2
+            continue
+        if c in "'\"":
+            j = i + 1
+            while j < n and code[j] != c:
+                if code[j] == "\n":
+                    return f"unterminated string on line {line}"
+                j += 2 if code[j] == "\\" else 1
+            if j >= n:
+                return f"unterminated string on line {line}"
+            i, previous = j + 1, "a"
+            continue
+        if c == "`":
+            stack.append(("`", line))
+            i += 1
+            continue
+        if c == "/" and (previous in _REGEX_PREFIX or previous in _REGEX_KEYWORDS):
+            j, in_class = i + 1, False
+            while j < n and code[j] != "\n" and (in_class or code[j] != "/"):
+                if code[j] == "\\":
+                    j += 1
+                elif code[j] == "[":
+                    in_class = True
+                elif code[j] == "]":
+                    in_class = False
+                j += 1
+            if j < n and code[j] == "/":
+                i, previous = j + 1, "a"
+                continue
+            # Not a terminated regex on this line; treat it as division
+        if c.isalnum() or c in "_$":
+            j = i
+            while j < n and (code[j].isalnum() or code[j] in "_$"):
+                j += 1
+            word = code[i:j]
+            i, previous = j, word if word in _REGEX_KEYWORDS else "a"
+            continue
+
+        if c in "([{":
+            stack.append((c, line))
+        elif c in _CLOSERS:
+            if stack and stack[-1][0] == "${" and c == "}":
+                stack.pop()
+            elif not stack or stack[-1][0] != _CLOSERS[c]:
+                expected = f" (expected a match for '{stack[-1][0]}' from line {stack[-1][1]})" if stack else ""
+                return f"unexpected '{c}' on line {line}{expected}"
+            else:
+                stack.pop()
+        previous = c
+        i += 1
+
+    if stack:
+        opener, opened_at = stack[-1]
+        what = "template literal" if opener == "`" else f"'{opener}'"
+        return f"unclosed {what} from line {opened_at}"
+    return None
+
+
+# Compiles (without running) each classic script sent on stdin as one JSON line
+_NODE_CHECKER = r"""
+const vm = require("vm");
+require("readline").createInterface({ input: process.stdin }).on("line", (line) => {
+  let error = null;
+  try {
+    new vm.Script(JSON.parse(line), { filename: "inline.js" });
+  } catch (e) {
+    const at = /inline\.js:(\d+)/.exec(e.stack);
+    error = `${e.name}: ${e.message}` + (at ? ` on line ${at[1]}` : "");
+  }
+  process.stdout.write(JSON.stringify(error) + "\n");
+});
+"""
+
+
+class NodeSyntaxChecker:
+    """
+    A long-lived Node.js process that syntax-checks scripts sent over a
+    pipe, so each check costs a compile instead of a ~70ms process start.
+    Restarted on the next check if it dies; killed if an answer takes
+    longer than `timeout` seconds.
+    """
+
+    def __init__(self, node: str, timeout: float = NODE_CHECK_TIMEOUT):
+        self.node = node
+        self.timeout = timeout
+        self._process = None
+        self._answers = None
+        self._lock = threading.Lock()
+
+    def check(self, code: str) -> str | None:
+        with self._lock:
+            try:
+                if self._process is None or self._process.poll() is not None:
+                    self._start()
+                self._process.stdin.write(json.dumps(code) + "\n")
+                self._process.stdin.flush()
+                return json.loads(self._answers.get(timeout=self.timeout))
+            except (OSError, ValueError, queue.Empty):
+                self._stop()
+                return scan_js_brackets(code)
+
+    def _start(self):
+        self._process = subprocess.Popen(
+            [self.node, "-e", _NODE_CHECKER], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            text=True, encoding="utf-8",
+        )
+        # A reader thread lets check() give up on a wedged process instead of blocking in readline()
+        self._answers = queue.Queue()
+        threading.Thread(target=_read_lines, args=(self._process.stdout, self._answers), daemon=True).start()
+
+    def _stop(self):
+        if self._process is not None:
+            self._process.kill()
+        self._process = None
+
+
+def _read_lines(stream, lines: queue.Queue):
+    for line in stream:
+        lines.put(line)
+    lines.put("")  # EOF: the pending check fails to parse and falls back
+
+
+@cache
+def _node_checker() -> NodeSyntaxChecker | None:
+    node = shutil.which("node")
+    return NodeSyntaxChecker(node) if node else None
+
+
+def check_js_syntax(code: str, module: bool = False) -> str | None:
+    """
+    Syntax-checks a script with Node.js when it is installed, falling
+    back to scan_js_brackets(). Returns the first error, or None.
+    """
+    checker = _node_checker()
+    if not checker:
+        return scan_js_brackets(code)
+    if not module:
+        return checker.check(code)
+    # Modules can't be compiled by vm.Script, so they get a one-off `node --check`
+    with tempfile.NamedTemporaryFile("w", suffix=".mjs", encoding="utf-8", delete=False) as f:
+        f.write(code)
+    try:
+        result = subprocess.run([checker.node, "--check", f.name], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return scan_js_brackets(code)
+    finally:
+        os.remove(f.name)
+    if result.returncode == 0:
+        return None
+    message = next((line for line in result.stderr.splitlines() if "Error" in line), "syntax error")
+    line = re.search(rf"{re.escape(f.name)}:(\d+)", result.stderr)
+    return f"{message.strip()} on line {line.group(1)}" if line else message.strip()
+
+
+def check_query_parameters(html: str, checks: list) -> list[str]:
+    """
+    Checks that every `?name=` query parameter the evaluation checks
+    mention is actually read somewhere in the page.
+    """
+    errors = []
+    names = {name for check in checks or () for name in re.findall(r"[?&]([A-Za-z_][\w-]*)=", check)}
+    for name in sorted(names):
+        reads_search = "URLSearchParams" in html or "location.search" in html or "location.href" in html
+        if not (reads_search and re.search(rf"""["'`]{re.escape(name)}["'`]""", html)):
+            errors.append(
+                f"The checks pass a `?{name}=` query parameter, but index.html never reads it "
+                f"(e.g. new URLSearchParams(location.search).get('{name}'))"
+            )
+    return errors
+
+
+def validate_files(files: dict, checks: list | None = None) -> list[str]:
+    """
+    Fast local checks on generated files before they're pushed: sizes,
+    HTML well-formedness, inline script syntax and the query parameters
+    the checks rely on. Returns a list of problems (empty if none).
+    """
+    with observe_stage("validate"):
+        html = files.get("index.html") or ""
+        size = len(html.encode("utf-8"))
+        if size < MIN_HTML_BYTES:
+            errors = [f"index.html is only {size} bytes; it must be a complete page"]
+        elif size > MAX_HTML_BYTES:
+            errors = [f"index.html is {size} bytes, over the {MAX_HTML_BYTES}-byte limit"]
+        else:
+            errors = _validate_html(html) + check_query_parameters(html, checks)
+        if not (files.get("README.md") or "").strip():
+            errors.append("README.md is empty")
+
+    OUTPUT_VALIDATIONS.inc(result="fail" if errors else "pass")
+    return errors[:MAX_ERRORS]
+
+
+def _validate_html(html: str) -> list[str]:
+    errors = []
+    if not re.search(r"</html\s*>\s*$", html, re.IGNORECASE):
+        errors.append("index.html does not end with </html> (is the file truncated?)")
+    checker = _HTMLChecker()
+    try:
+        checker.feed(html)
+        errors += checker.finish()
+    except Exception as e:
+        errors.append(f"index.html could not be parsed: {e}")
+
+    for attrs, start_line, code in checker.scripts:
+        script_type = (attrs.get("type") or "").strip().lower()
+        if attrs.get("src") or script_type not in JS_SCRIPT_TYPES or not code.strip():
+            continue
+        error = check_js_syntax(code, module=script_type == "module")
+        if error:
+            errors.append(f"JavaScript error in the <script> starting on line {start_line} of index.html: {error}")
+    return errors
@@ -0,0 +1,153 @@
+# pages_tracker.py
+import asyncio
+import os
+import threading
+import time
+from github_client import get_github_client
+from observability import get_logger
+
+logger = get_logger(__name__)
+
+
+class PagesReadinessTracker:
+    """
+    Watches GitHub Pages until the deployment for a specific commit is live.
+
+    All polling runs on one background event loop, so many repos can be
+    tracked at once without tying up a worker thread per repo. `track()`
+    returns a concurrent.futures.Future (usable from threads or, via
+    `wait()`, from async code) that resolves to a status dict.
+    """
+
+    def __init__(self, timeout: float = 120, initial_delay: float = 2, max_delay: float = 15,
+                 backoff: float = 1.5, max_concurrent_checks: int = 16):
+        self.timeout = timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.max_concurrent_checks = max_concurrent_checks
+        self._loop = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+        self._tracked = {}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._semaphore = asyncio.Semaphore(self.max_concurrent_checks)
+                threading.Thread(target=self._loop.run_forever, name="pages-tracker", daemon=True).start()
+            return self._loop
+
+    def track(self, repo_name: str, commit_sha: str, pages_url: str, callback=None):
+        """
+        Starts tracking (or joins an existing track of) this repo/commit.
+        `callback`, if given, is called with the status dict when done.
+        """
+        loop = self._ensure_loop()
+        key = (repo_name, commit_sha)
+        with self._lock:
+            future = self._tracked.get(key)
+            if future is None:
+                future = asyncio.run_coroutine_threadsafe(self._poll(repo_name, commit_sha, pages_url), loop)
+                self._tracked[key] = future
+                future.add_done_callback(lambda _: self._forget(key))
+        if callback:
+            future.add_done_callback(lambda f: callback(f.result()))
+        return future
+
+    async def wait(self, repo_name: str, commit_sha: str, pages_url: str) -> dict:
+        """
+        Awaitable form of track() for code running on another event loop.
+        """
+        return await asyncio.wrap_future(self.track(repo_name, commit_sha, pages_url))
+
+    def _forget(self, key):
+        with self._lock:
+            self._tracked.pop(key, None)
+
+    async def _poll(self, repo_name: str, commit_sha: str, pages_url: str) -> dict:
+        logger.info(f"⏳ Tracking GitHub Pages deployment of {commit_sha[:7]} at {pages_url}...")
+        start_time = time.time()
+        delay = self.initial_delay
+        state = "pending"
+
+        while time.time() - start_time < self.timeout:
+            try:
+                async with self._semaphore:
+                    state = await asyncio.to_thread(self._check, repo_name, commit_sha)
+            except Exception as e:
+                logger.warning(f"⚠️ Pages status check failed for {repo_name}: {e}")
+                state = "pending"
+
+            if state in ("ready", "failed"):
+                break
+            # A deployment that is already building finishes soon, so poll it quickly;
+            # otherwise back off while GitHub has not picked the commit up yet.
+            delay = self.initial_delay if state == "deploying" else min(delay * self.backoff, self.max_delay)
+            await asyncio.sleep(delay)
+
+        elapsed = round(time.time() - start_time, 1)
+        ready = state == "ready"
+        if ready:
+            logger.info(f"✅ GitHub Pages is serving commit {commit_sha[:7]} ({elapsed}s).")
+        elif state == "failed":
+            logger.error(f"❌ GitHub Pages deployment of {commit_sha[:7]} failed.")
+        else:
+            logger.warning(f"⚠️ GitHub Pages did not deploy {commit_sha[:7]} within {self.timeout} seconds. It may still be deploying.")
+        return {"ready": ready, "state": state, "commit_sha": commit_sha, "pages_url": pages_url, "elapsed": elapsed}
+
+    def _check(self, repo_name: str, commit_sha: str) -> str:
+        """
+        Returns "ready", "failed", "deploying" or "pending" for this commit,
+        using the deployments API (Actions-based Pages) and then the legacy
+        Pages builds API (branch-based Pages).
+        """
+        client = get_github_client()
+        repo_api = f"/repos/{client.username}/{repo_name}"
+
+        response = client.request(
+            "GET",
+            f"{repo_api}/deployments",
+            params={"sha": commit_sha, "environment": "github-pages", "per_page": 1},
+            timeout=10,
+        )
+        deployments = response.json() if response.status_code == 200 else []
+        if deployments:
+            statuses = client.request("GET", deployments[0]["statuses_url"], params={"per_page": 1}, timeout=10)
+            latest = statuses.json()[0]["state"] if statuses.status_code == 200 and statuses.json() else "queued"
+            if latest == "success":
+                return "ready"
+            if latest in ("failure", "error"):
+                return "failed"
+            return "deploying"
+
+        response = client.request("GET", f"{repo_api}/pages/builds/latest", timeout=10)
+        if response.status_code == 200:
+            build = response.json()
+            if build.get("commit") == commit_sha:
+                if build.get("status") == "built":
+                    return "ready"
+                if build.get("status") == "errored":
+                    return "failed"
+                return "deploying"
+        return "pending"
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_pages_tracker() -> PagesReadinessTracker:
+    """
+    Returns the process-wide tracker, creating it on first use.
+    """
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = PagesReadinessTracker(
+                timeout=float(os.getenv("PAGES_WAIT_TIMEOUT", "120")),
+                initial_delay=float(os.getenv("PAGES_POLL_INITIAL_DELAY", "2")),
+                max_delay=float(os.getenv("PAGES_POLL_MAX_DELAY", "15")),
+            )
+        return _tracker
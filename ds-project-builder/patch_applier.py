@@ -0,0 +1,138 @@
+# patch_applier.py
+
+
+class PatchError(ValueError):
+    """Raised when LLM edits can't be parsed or applied cleanly."""
+
+
+def parse_search_replace_blocks(text: str) -> list[tuple[str, str]]:
+    """
+    Parses edits written as:
+
+        <<<<<<< SEARCH
+        exact lines from the current file
+        =======
+        replacement lines
+        >>>>>>> REPLACE
+
+    and returns them as (search, replace) pairs in order.
+    """
+    blocks = []
+    state = None
+    search, replace = [], []
+    for line in text.splitlines():
+        marker = line.strip()
+        if marker.startswith("<<<<<<<") and marker.endswith("SEARCH"):
+            if state is not None:
+                raise PatchError("SEARCH block opened before the previous one was closed")
+            state, search, replace = "search", [], []
+        elif state == "search" and marker and set(marker) == {"="}:
+            state = "replace"
+        elif state == "replace" and marker.startswith(">>>>>>>") and marker.endswith("REPLACE"):
+            blocks.append(("\n".join(search), "\n".join(replace)))
+            state = None
+        elif state == "search":
+            search.append(line)
+        elif state == "replace":
+            replace.append(line)
+
+    if state is not None:
+        raise PatchError("Last SEARCH/REPLACE block is not terminated")
+    if not blocks:
+        raise PatchError("No SEARCH/REPLACE blocks found")
+    return blocks
+
+
+def _find_whole_lines(text: str, search: str) -> list[int]:
+    """
+    Offsets where `search` occurs verbatim starting at the beginning of a
+    line and ending at the end of one, so a match never splits a line.
+    """
+    starts = []
+    position = text.find(search)
+    while position != -1:
+        end = position + len(search)
+        if (position == 0 or text[position - 1] == "\n") and (end == len(text) or text[end] in "\r\n"):
+            starts.append(position)
+        position = text.find(search, position + 1)
+    return starts
+
+
+def _reindent(replace: str, search: str, matched_line: str) -> str:
+    """
+    Shifts REPLACE by the indentation SEARCH left out of the line it
+    matched, unless REPLACE already carries that indentation.
+    """
+    def indent(line: str) -> str:
+        return line[:len(line) - len(line.lstrip())]
+
+    file_indent = indent(matched_line.rstrip("\r\n"))
+    search_indent = indent(next((line for line in search.splitlines() if line.strip()), ""))
+    replace_lines = replace.splitlines(keepends=True)
+    first = next((line for line in replace_lines if line.strip()), "")
+    if not file_indent.startswith(search_indent) or indent(first).startswith(file_indent):
+        return replace
+    extra = file_indent[len(search_indent):]
+    return "".join(extra + line if line.strip() else line for line in replace_lines)
+
+
+def _find_lines_ignoring_indent(text: str, search: str) -> tuple[int, int, str] | None:
+    """
+    Locates `search` in `text` comparing whole lines with surrounding
+    whitespace ignored. Returns the (start, end) character span of the
+    unique match and its first line, or None if there is no match.
+    """
+    lines = text.splitlines(keepends=True)
+    wanted = [line.strip() for line in search.splitlines()]
+    while wanted and not wanted[0]:
+        wanted.pop(0)
+    while wanted and not wanted[-1]:
+        wanted.pop()
+    if not wanted:
+        return None
+
+    stripped = [line.strip() for line in lines]
+    matches = [i for i in range(len(lines) - len(wanted) + 1) if stripped[i:i + len(wanted)] == wanted]
+    if not matches:
+        return None
+    if len(matches) > 1:
+        raise PatchError(f"SEARCH text matches {len(matches)} places")
+
+    start = sum(len(line) for line in lines[:matches[0]])
+    end = start + sum(len(line) for line in lines[matches[0]:matches[0] + len(wanted)])
+    # Keep the line ending that closed the matched region
+    last_line = lines[matches[0] + len(wanted) - 1]
+    end -= len(last_line) - len(last_line.rstrip("\r\n"))
+    return start, end, lines[matches[0]]
+
+
+def apply_search_replace(original: str, blocks: list[tuple[str, str]]) -> str:
+    """
+    Applies the blocks in order. Each SEARCH must match exactly one run
+    of whole lines, first verbatim and then ignoring indentation (with
+    REPLACE re-indented to the matched lines); otherwise PatchError.
+    """
+    result = original
+    for number, (search, replace) in enumerate(blocks, 1):
+        if not search.strip():
+            raise PatchError(f"Block {number} has an empty SEARCH section")
+
+        starts = _find_whole_lines(result, search)
+        if len(starts) == 1:
+            result = result[:starts[0]] + replace + result[starts[0] + len(search):]
+            continue
+        if len(starts) > 1:
+            raise PatchError(f"Block {number}: SEARCH text matches {len(starts)} places")
+
+        try:
+            span = _find_lines_ignoring_indent(result, search)
+        except PatchError as e:
+            raise PatchError(f"Block {number}: {e}")
+        if span is None:
+            raise PatchError(f"Block {number}: SEARCH text not found in the current file")
+        start, end, matched_line = span
+        result = result[:start] + _reindent(replace, search, matched_line) + result[end:]
+
+    if "</html>" in original.lower() and "</html>" not in result.lower():
+        raise PatchError("Edits removed the closing </html> tag")
+    return result
@@ -0,0 +1,192 @@
+# prompt_builder.py
+import os
+import re
+from llm_client import estimate_tokens
+from observability import Counter, Histogram, get_logger, register
+
+logger = get_logger(__name__)
+
+# Soft cap on prompt size; larger prompts are compressed section by section
+PROMPT_TOKEN_BUDGET = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "100000"))
+# Prompts estimated below this share of the budget skip the exact (API) count
+EXACT_COUNT_THRESHOLD = float(os.getenv("LLM_EXACT_COUNT_THRESHOLD", "0.5"))
+# Data URIs and string literals at least this long are swapped for placeholders
+LITERAL_MIN_CHARS = int(os.getenv("LLM_ELIDE_MIN_CHARS", "512"))
+
+PROMPT_TOKENS = register(Histogram(
+    "ds_prompt_tokens", "Prompt size per request after budgeting, in tokens.", ("prompt", "method"),
+    buckets=(500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000, 256000, 1000000),
+))
+PROMPT_COMPRESSIONS = register(Counter(
+    "ds_prompt_compressions_total", "Compression steps applied to fit a prompt in its budget.", ("prompt", "section", "step"),
+))
+
+_DATA_URI = re.compile(r"data:[\w.+-]+/[\w.+-]+(?:;[\w.+-]+=?[\w.+-]*)*,[A-Za-z0-9+/=%]+")
+_STRING_LITERAL = re.compile(r"""(["'`])((?:\\.|(?!\1)[^\\\n])*)\1""")
+_PLACEHOLDER = re.compile(r"(?:data:[\w.+-]+/[\w.+-]+(?:;[\w.+-]+=?[\w.+-]*)*,)?__ELIDED_(\d+)__")
+
+
+class LiteralElider:
+    """
+    Swaps long literals (embedded images, big inline strings) for short
+    placeholders before text goes into a prompt, and swaps them back into
+    the files the model returns. The model never needs the bytes, only a
+    place to keep them.
+    """
+
+    def __init__(self, min_chars: int = LITERAL_MIN_CHARS):
+        self.min_chars = min_chars
+        self.literals = []
+        self._ids = {}
+
+    def _placeholder(self, literal) -> str:
+        if literal not in self._ids:
+            self.literals.append(literal)
+            self._ids[literal] = len(self.literals)
+        return f"__ELIDED_{self._ids[literal]}__"
+
+    def elide_data_uris(self, text: str) -> str:
+        def replace(match):
+            uri = match.group(0)
+            if len(uri) < self.min_chars:
+                return uri
+            # Keep the media type so the model still knows what the asset is
+            return uri.split(",", 1)[0] + "," + self._placeholder(uri)
+        return _DATA_URI.sub(replace, text)
+
+    def elide_attachment(self, ref) -> str:
+        """
+        A spooled attachment's data URI, or a placeholder for it if long.
+        The bytes are only read back by restore().
+        """
+        if ref.encoded_size() < self.min_chars:
+            return ref.data_uri()
+        return f"data:{ref.media_type};base64,{self._placeholder(ref)}"
+
+    def elide_strings(self, text: str) -> str:
+        def replace(match):
+            quote, body = match.groups()
+            if len(body) < self.min_chars:
+                return match.group(0)
+            return quote + self._placeholder(body) + quote
+        return _STRING_LITERAL.sub(replace, text)
+
+    def restore(self, text: str) -> str:
+        values = {}
+
+        def replace(match):
+            index = int(match.group(1)) - 1
+            if not 0 <= index < len(self.literals):
+                return match.group(0)
+            if index not in values:
+                literal = self.literals[index]
+                values[index] = literal if isinstance(literal, str) else literal.data_uri()
+            literal = values[index]
+            # A data URI placeholder is restored whole, prefix included
+            if match.group(0).startswith("data:") and not literal.startswith("data:"):
+                return match.group(0).split(",", 1)[0] + "," + literal
+            return literal
+        return _PLACEHOLDER.sub(replace, text) if self.literals else text
+
+    def restore_files(self, files: dict) -> dict:
+        return {path: self.restore(content) for path, content in files.items()}
+
+    def note(self) -> str:
+        """Prompt instruction explaining the placeholders, if any were made."""
+        if not self.literals:
+            return ""
+        return (
+            "**Note:** Long values such as Data URIs are shown as placeholders like `__ELIDED_1__`. "
+            "Copy a placeholder exactly wherever its value is needed; it is replaced with the full value afterwards.\n"
+        )
+
+
+_VERBATIM_BLOCK = re.compile(r"(<(pre|textarea)\b.*?</\2\s*>)", re.IGNORECASE | re.DOTALL)
+_HTML_COMMENT = re.compile(r"<!--(?!\[if).*?-->", re.DOTALL)
+_SCRIPT_OR_STYLE = re.compile(r"(<(script|style)\b.*?</\2\s*>)", re.IGNORECASE | re.DOTALL)
+
+
+def minify_html(html: str) -> str:
+    """
+    Drops HTML comments, indentation and blank lines. <pre> and <textarea>
+    contents are kept as they are, and comments inside <script>/<style>
+    are left alone.
+    """
+    out = []
+    for i, part in enumerate(_VERBATIM_BLOCK.split(html)):
+        # split() interleaves the text, each verbatim block and its tag name
+        if i % 3 == 1:
+            out.append(part)
+            continue
+        if i % 3 == 2:
+            continue
+        pieces = _SCRIPT_OR_STYLE.split(part)
+        part = "".join(
+            piece if j % 3 == 1 else _HTML_COMMENT.sub("", piece)
+            for j, piece in enumerate(pieces) if j % 3 != 2
+        )
+        out.append("\n".join(line.strip() for line in part.splitlines() if line.strip()))
+    return "".join(out)
+
+
+class PromptSection:
+    """
+    A variable part of a prompt. When the prompt is over budget, sections
+    are compressed lowest `priority` first, each applying its `steps`
+    (name, function of the current text) in order until the prompt fits.
+    """
+
+    def __init__(self, text: str, priority: int = 0, steps: tuple = ()):
+        self.text = text
+        self.priority = priority
+        self.steps = steps
+
+
+async def build_prompt(kind: str, template: str, sections: dict, client, elider: LiteralElider | None = None,
+                       budget: int | None = None) -> tuple[str, int]:
+    """
+    Renders `template` with `sections` (plain strings or PromptSections)
+    and compresses it to fit `budget` tokens. Returns the prompt and its
+    size. Sizes are estimated offline, and counted by the API (at most
+    once, before compressing) when a prompt is large enough for the
+    difference to matter.
+    """
+    budget = budget or PROMPT_TOKEN_BUDGET
+
+    def render() -> str:
+        texts = {name: section.text if isinstance(section, PromptSection) else section for name, section in sections.items()}
+        return template.format(elision_note=elider.note() if elider else "", **texts)
+
+    async def count(prompt: str) -> tuple[int, str]:
+        estimate = estimate_tokens(prompt)
+        if estimate < budget * EXACT_COUNT_THRESHOLD:
+            return estimate, "estimate"
+        return await client.count_tokens(prompt)
+
+    prompt = render()
+    tokens, method = await count(prompt)
+    original_tokens = tokens
+    # Calibrates the offline estimate against the exact count while compressing
+    scale = tokens / estimate_tokens(prompt)
+
+    compressible = sorted(
+        ((name, section) for name, section in sections.items() if isinstance(section, PromptSection)),
+        key=lambda item: item[1].priority,
+    )
+    for name, section in compressible:
+        for step_name, step in section.steps:
+            if tokens <= budget:
+                break
+            section.text = step(section.text)
+            PROMPT_COMPRESSIONS.inc(prompt=kind, section=name, step=step_name)
+            prompt = render()
+            tokens = int(estimate_tokens(prompt) * scale)
+
+    if tokens != original_tokens:
+        # The compressed size comes from the calibrated estimate; counting again would cost another round trip
+        method = "calibrated" if method == "exact" else method
+        logger.info(f"🗜️ Compressed {kind} prompt from ~{original_tokens} to ~{tokens} tokens.")
+    if tokens > budget:
+        logger.warning(f"⚠️ {kind} prompt is still {tokens} tokens, over its {budget}-token budget.")
+    PROMPT_TOKENS.observe(tokens, prompt=kind, method=method)
+    return prompt, tokens
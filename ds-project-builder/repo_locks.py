@@ -0,0 +1,139 @@
+# repo_locks.py
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+
+class RepoLockManager:
+    """
+    Serializes work per repository within this process: one holder per
+    key at a time, later requests for the same key wait in FIFO order,
+    and different keys never wait on each other.
+    """
+
+    def __init__(self):
+        self._queues = {}
+
+    async def acquire(self, key: str):
+        """Waits for the lock on `key` and returns a token for release()."""
+        queue = self._queues.setdefault(key, deque())
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        if len(queue) == 1:
+            waiter.set_result(None)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            self.release(key, waiter)
+            raise
+        return waiter
+
+    def release(self, key: str, token):
+        queue = self._queues.get(key)
+        if not queue or token not in queue:
+            return
+        was_holder = queue[0] is token
+        queue.remove(token)
+        # Skip waiters that were cancelled while queued
+        while queue and queue[0].cancelled():
+            queue.popleft()
+        if not queue:
+            del self._queues[key]
+        elif was_holder and not queue[0].done():
+            queue[0].set_result(None)
+
+    def waiting(self, key: str) -> int:
+        """Number of requests holding or queued for `key`."""
+        return len(self._queues.get(key, ()))
+
+
+class SQLiteRepoLockManager:
+    """
+    Cross-process variant of RepoLockManager for running several app
+    workers: each acquire() takes a ticket in a shared SQLite table and
+    holds the lock once its ticket is the oldest for the repo. Tickets are
+    kept alive by heartbeats, so a crashed worker's tickets expire after
+    `lease_seconds` instead of blocking the repo forever.
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = 60, poll_interval: float = 0.5):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._heartbeats = {}
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS repo_lock_tickets (
+                    ticket INTEGER PRIMARY KEY AUTOINCREMENT,
+                    repo TEXT NOT NULL,
+                    owner TEXT NOT NULL,
+                    heartbeat_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_repo_lock_tickets ON repo_lock_tickets (repo, ticket)")
+
+    def _execute(self, sql: str, params: tuple = ()):
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params)
+
+    def _take_ticket(self, key: str) -> int:
+        return self._execute(
+            "INSERT INTO repo_lock_tickets (repo, owner, heartbeat_at) VALUES (?, ?, ?)",
+            (key, f"{os.getpid()}-{uuid.uuid4().hex[:8]}", time.time()),
+        ).lastrowid
+
+    def _is_first(self, key: str, ticket: int) -> bool:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE repo_lock_tickets SET heartbeat_at = ? WHERE ticket = ?", (now, ticket))
+            self._conn.execute(
+                "DELETE FROM repo_lock_tickets WHERE repo = ? AND heartbeat_at < ?", (key, now - self.lease_seconds)
+            )
+            first = self._conn.execute("SELECT MIN(ticket) FROM repo_lock_tickets WHERE repo = ?", (key,)).fetchone()[0]
+        return first == ticket
+
+    async def acquire(self, key: str) -> int:
+        # Taken synchronously so tickets keep this process's call order
+        ticket = self._take_ticket(key)
+        try:
+            while not await asyncio.to_thread(self._is_first, key, ticket):
+                await asyncio.sleep(self.poll_interval)
+        except asyncio.CancelledError:
+            self._execute("DELETE FROM repo_lock_tickets WHERE ticket = ?", (ticket,))
+            raise
+        self._heartbeats[ticket] = asyncio.get_running_loop().create_task(self._heartbeat(ticket))
+        return ticket
+
+    async def _heartbeat(self, ticket: int):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await asyncio.to_thread(
+                self._execute, "UPDATE repo_lock_tickets SET heartbeat_at = ? WHERE ticket = ?", (time.time(), ticket)
+            )
+
+    def release(self, key: str, token: int):
+        heartbeat = self._heartbeats.pop(token, None)
+        if heartbeat:
+            heartbeat.cancel()
+        self._execute("DELETE FROM repo_lock_tickets WHERE ticket = ?", (token,))
+
+    def waiting(self, key: str) -> int:
+        return self._execute("SELECT COUNT(*) FROM repo_lock_tickets WHERE repo = ?", (key,)).fetchone()[0]
+
+
+def create_repo_lock_manager_from_env():
+    """
+    In-process locks by default; set REPO_LOCK_DB_PATH to share locks
+    between worker processes on the same host.
+    """
+    db_path = os.getenv("REPO_LOCK_DB_PATH")
+    if not db_path:
+        return RepoLockManager()
+    return SQLiteRepoLockManager(db_path, lease_seconds=float(os.getenv("REPO_LOCK_LEASE_SECONDS", "60")))
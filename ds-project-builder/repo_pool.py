@@ -0,0 +1,210 @@
+# repo_pool.py
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from github_client import GitHubAPIError, get_github_client
+from github_handler import push_files_as_single_commit
+from observability import Counter, Gauge, get_logger, register
+from pages_tracker import get_pages_tracker
+
+logger = get_logger(__name__)
+
+# Ready-to-use repos kept on hand for new tasks; 0 disables the pool
+REPO_POOL_SIZE = int(os.getenv("REPO_POOL_SIZE", "0"))
+REPO_POOL_PREFIX = os.getenv("REPO_POOL_PREFIX", "ds-pool-")
+
+REPO_POOL_REPOS = register(Gauge("ds_repo_pool_repos", "Pre-provisioned repositories by state.", ("state",)))
+REPO_POOL_CLAIMS = register(Counter(
+    "ds_repo_pool_claims_total", "New repositories taken from the pool (hit) or created on demand (miss).", ("result",),
+))
+
+PLACEHOLDER_HTML = """<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>Coming soon</title></head>
+<body><p>This site is being set up.</p></body>
+</html>
+"""
+
+
+class RepoPool:
+    """
+    Pre-created repositories waiting for a task, recorded in SQLite so
+    the pool survives restarts. A repo is "provisioning" until its files
+    are pushed and its first Pages deployment is live, then "ready".
+    claim() renames the oldest ready repo to a task's name.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS repo_pool (
+                    name TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+        self._update_gauges()
+
+    def add_listener(self, callback):
+        """`callback()` is called (from any thread) whenever a repo leaves the pool."""
+        self._listeners.append(callback)
+
+    def add(self, name: str):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO repo_pool VALUES (?, 'provisioning', ?)", (name, time.time()))
+        self._update_gauges()
+
+    def mark_ready(self, name: str):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE repo_pool SET state = 'ready' WHERE name = ?", (name,))
+        self._update_gauges()
+
+    def provisioning(self) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name FROM repo_pool WHERE state = 'provisioning' ORDER BY created_at"
+            ).fetchall()
+        return [name for (name,) in rows]
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM repo_pool GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+    def claim(self, repo_name: str) -> dict | None:
+        """
+        Renames a ready pooled repo to `repo_name` and returns its metadata,
+        or None if the pool is empty or the rename fails.
+        """
+        client = get_github_client()
+        try:
+            while True:
+                with self._lock, self._conn:
+                    row = self._conn.execute(
+                        "SELECT name, created_at FROM repo_pool WHERE state = 'ready' ORDER BY created_at LIMIT 1"
+                    ).fetchone()
+                    if row is None:
+                        REPO_POOL_CLAIMS.inc(result="miss")
+                        return None
+                    self._conn.execute("DELETE FROM repo_pool WHERE name = ?", (row[0],))
+
+                try:
+                    repo = client.rename_repo(row[0], repo_name)
+                except GitHubAPIError as e:
+                    if e.status == 404:
+                        logger.warning(f"⚠️ Pooled repo '{row[0]}' no longer exists; trying the next one.")
+                        continue
+                    # Anything else (e.g. the name is taken) leaves the pooled repo usable
+                    with self._lock, self._conn:
+                        self._conn.execute("INSERT OR IGNORE INTO repo_pool VALUES (?, 'ready', ?)", row)
+                    logger.warning(f"⚠️ Could not rename pooled repo '{row[0]}' to '{repo_name}': {e}")
+                    REPO_POOL_CLAIMS.inc(result="miss")
+                    return None
+
+                REPO_POOL_CLAIMS.inc(result="hit")
+                logger.info(f"♻️ Claimed pooled repo '{row[0]}' as '{repo_name}'.")
+                return repo
+        finally:
+            self._update_gauges()
+            for callback in self._listeners:
+                callback()
+
+    def _update_gauges(self):
+        counts = self.counts()
+        for state in ("provisioning", "ready"):
+            REPO_POOL_REPOS.set(counts.get(state, 0), state=state)
+
+
+class RepoPoolProvisioner:
+    """
+    Keeps the pool topped up to `size` from the event loop, one repo at a
+    time: creates it, pushes the template `files` (plus a placeholder
+    index.html), enables Pages and waits out the first deployment, which
+    is the slow part of a new repo. Wakes whenever a repo is claimed; a
+    failure is retried after `retry_interval` seconds.
+    """
+
+    def __init__(self, pool: RepoPool, files: dict, size: int = REPO_POOL_SIZE, retry_interval: float = 30):
+        self.pool = pool
+        self.files = {"index.html": PLACEHOLDER_HTML, **files}
+        self.size = size
+        self.retry_interval = retry_interval
+        self._wakeup = None
+        self._task = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.pool.add_listener(lambda: loop.call_soon_threadsafe(self._wakeup.set))
+        self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            # Repos left half-provisioned by a restart are finished first
+            name = next(iter(self.pool.provisioning()), None)
+            if name is None and sum(self.pool.counts().values()) < self.size:
+                name = f"{REPO_POOL_PREFIX}{uuid.uuid4().hex[:12]}"
+                self.pool.add(name)
+            if name is None:
+                await self._wakeup.wait()
+                continue
+            try:
+                await self._provision(name)
+            except Exception as e:
+                logger.warning(f"⚠️ Provisioning pooled repo '{name}' failed, retrying in {self.retry_interval:.0f}s: {e}")
+                await asyncio.sleep(self.retry_interval)
+
+    async def _provision(self, name: str):
+        started = time.perf_counter()
+        commit_sha, pages_url = await asyncio.to_thread(self._prepare, name)
+        status = await get_pages_tracker().wait(name, commit_sha, pages_url)
+        if not status["ready"]:
+            # Pages is configured either way; the task's own push triggers the next deployment
+            logger.warning(f"⚠️ First Pages deployment of pooled repo '{name}' is {status['state']}.")
+        self.pool.mark_ready(name)
+        logger.info(f"🏊 Pooled repo '{name}' is ready ({time.perf_counter() - started:.1f}s).")
+
+    def _prepare(self, name: str) -> tuple[str, str]:
+        client = get_github_client()
+        try:
+            repo = client.get_repo(name)
+        except GitHubAPIError as e:
+            if e.status != 404:
+                raise
+            repo = client.create_repo(name, auto_init=True)
+        branch = repo["default_branch"]
+        commit_sha = push_files_as_single_commit(name, branch, self.files, message="Set up repository")
+        if not repo.get("has_pages"):
+            response = client.enable_pages(name, branch)
+            if response.status_code not in (201, 409):
+                raise GitHubAPIError(response.status_code, f"could not enable Pages: {response.text}")
+            repo["has_pages"] = True
+        return commit_sha, f"https://{client.username}.github.io/{name}/"
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_repo_pool() -> RepoPool:
+    """
+    Returns the process-wide repo pool, opening the database on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RepoPool(os.getenv("REPO_POOL_DB_PATH", "repo_pool.db"))
+        return _pool
@@ -0,0 +1,285 @@
+# request_spool.py
+import base64
+import codecs
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+from urllib.parse import unquote_to_bytes
+from observability import get_logger
+
+logger = get_logger(__name__)
+
+# Largest request body accepted, in bytes
+MAX_BODY_BYTES = int(os.getenv("MAX_BODY_BYTES", str(50 * 1024 * 1024)))
+# Data URIs at least this long are written to disk as they arrive instead of kept in memory
+SPOOL_MIN_BYTES = int(os.getenv("SPOOL_MIN_BYTES", str(64 * 1024)))
+SPOOL_DIR = os.getenv("SPOOL_DIR") or os.path.join(tempfile.gettempdir(), "ds-spool")
+
+READ_CHUNK_BYTES = 64 * 1024
+MARKER_PREFIX = "spool:"
+
+
+class BodyTooLarge(ValueError):
+    """Raised when a request body exceeds the configured maximum."""
+
+
+class AttachmentRef:
+    """
+    A spooled attachment: its metadata stays in memory, its decoded bytes
+    live in a file until the request's spool is cleaned up.
+    """
+
+    def __init__(self, name: str, media_type: str, size: int, path: str, sha256: str):
+        self.name = name
+        self.media_type = media_type  # e.g. "text/csv;charset=utf-8"
+        self.size = size
+        self.path = path
+        self.sha256 = sha256
+
+    @property
+    def mime_type(self) -> str:
+        return self.media_type.split(";")[0].strip().lower()
+
+    def iter_bytes(self, chunk_size: int = READ_CHUNK_BYTES):
+        with open(self.path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def data_uri(self) -> str:
+        """The attachment as a base64 data URI. Builds the whole string, so only for output."""
+        with open(self.path, "rb") as f:
+            return f"data:{self.media_type};base64,{base64.b64encode(f.read()).decode('ascii')}"
+
+    def encoded_size(self) -> int:
+        """Length of data_uri(), without building it."""
+        return len(f"data:{self.media_type};base64,") + (self.size + 2) // 3 * 4
+
+
+class DataURIWriter:
+    """
+    Decodes a data URI fed in pieces ("data:<type>[;base64],<payload>")
+    straight into a file, hashing the decoded bytes on the way.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.media_type = None
+        self.size = 0
+        self._header = ""
+        self._base64 = False
+        self._pending = ""
+        self._hash = hashlib.sha256()
+        self._file = open(path, "wb")
+
+    def write(self, text: str):
+        if self.media_type is None:
+            self._header += text
+            if "," not in self._header:
+                return
+            header, text = self._header.split(",", 1)
+            params = header[len("data:"):].split(";")
+            self._base64 = params[-1].strip().lower() == "base64"
+            self.media_type = ";".join(params[:-1] if self._base64 else params) or "text/plain"
+        self._pending += text
+        if self._base64:
+            self._pending = re.sub(r"\s+", "", self._pending)
+            usable = len(self._pending) - len(self._pending) % 4
+        else:
+            # Don't split a %XX escape across writes
+            usable = len(self._pending)
+            escape = self._pending.rfind("%", max(0, usable - 2))
+            if escape != -1:
+                usable = escape
+        if usable:
+            self._emit(self._pending[:usable])
+            self._pending = self._pending[usable:]
+
+    def _emit(self, text: str):
+        data = base64.b64decode(text) if self._base64 else unquote_to_bytes(text)
+        self._hash.update(data)
+        self.size += len(data)
+        self._file.write(data)
+
+    def close(self, name: str = "") -> AttachmentRef:
+        if self.media_type is None:
+            self._file.close()
+            raise ValueError("not a data URI")
+        if self._pending:
+            self._emit(self._pending + "=" * (-len(self._pending) % 4) if self._base64 else self._pending)
+        self._file.close()
+        return AttachmentRef(name, self.media_type, self.size, self.path, self._hash.hexdigest())
+
+
+class Spool:
+    """
+    A per-request temp directory holding the payloads of its attachments.
+    Attachments are referred to by marker strings ("spool:<n>") until
+    resolve() turns them into AttachmentRefs; cleanup() deletes the files.
+    """
+
+    def __init__(self, root: str = SPOOL_DIR):
+        os.makedirs(root, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix="req-", dir=root)
+        self.refs = {}
+
+    def new_writer(self) -> tuple[str, DataURIWriter]:
+        marker = f"{MARKER_PREFIX}{len(self.refs) + 1}"
+        self.refs[marker] = None  # Reserved until the writer is closed
+        return marker, DataURIWriter(os.path.join(self.directory, str(len(self.refs))))
+
+    def add(self, marker: str, ref: AttachmentRef):
+        self.refs[marker] = ref
+
+    def adopt(self, attachments: list | None):
+        """
+        Spools attachments that arrived small enough to be parsed inline,
+        so every attachment is handled the same way downstream. Each
+        attachment's `url` is replaced by its marker.
+        """
+        for attachment in attachments or ():
+            if attachment.url in self.refs:
+                self.refs[attachment.url].name = attachment.name
+                continue
+            if not attachment.url.startswith("data:"):
+                continue
+            marker, writer = self.new_writer()
+            writer.write(attachment.url)
+            try:
+                self.add(marker, writer.close(attachment.name))
+            except ValueError:
+                continue
+            attachment.url = marker
+
+    def resolve(self, attachments: list | None) -> list | None:
+        """AttachmentRefs for a request's attachments, skipping any that couldn't be spooled."""
+        if not attachments:
+            return None
+        refs = [self.refs.get(attachment.url) for attachment in attachments]
+        return [ref for ref in refs if ref is not None]
+
+    def cleanup(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+_STRING_SPECIAL = re.compile(rb'["\\]')
+_URL_KEY = re.compile(rb'"url"\s*:\s*$')
+_DATA_URI_HEADER = re.compile(rb'data:[^,"]{0,200},')
+
+
+class SpoolingJSONReader:
+    """
+    Reads a JSON document in chunks and keeps it in memory, except for
+    data URIs under a "url" key that grow past `threshold` bytes: those
+    are decoded into the spool as they arrive and replaced in the
+    document by their marker.
+    """
+
+    def __init__(self, spool: Spool, threshold: int = SPOOL_MIN_BYTES):
+        self.spool = spool
+        self.threshold = threshold
+        self._out = bytearray()
+        self._in_string = False
+        self._url_value = False
+        self._string = bytearray()
+        self._writer = None
+        self._marker = None
+        self._decoder = None
+        self._carry = b""
+
+    def feed(self, chunk: bytes):
+        chunk = self._carry + chunk
+        self._carry = b""
+        position = 0
+        while position < len(chunk):
+            if not self._in_string:
+                quote = chunk.find(b'"', position)
+                if quote == -1:
+                    self._out += chunk[position:]
+                    return
+                self._out += chunk[position:quote]
+                self._in_string = True
+                self._url_value = bool(_URL_KEY.search(self._out[-64:]))
+                self._string = bytearray()
+                position = quote + 1
+                continue
+
+            special = _STRING_SPECIAL.search(chunk, position)
+            if special is None:
+                self._append(chunk[position:])
+                return
+            index = special.start()
+            if chunk[index:index + 1] == b'"':
+                self._append(chunk[position:index])
+                self._end_string()
+                position = index + 1
+                continue
+            # An escape: \uXXXX takes six bytes, anything else two. Never split one across chunks.
+            length = 6 if chunk[index + 1:index + 2] == b"u" else 2
+            if index + length > len(chunk):
+                self._append(chunk[position:index])
+                self._carry = chunk[index:]
+                return
+            self._append(chunk[position:index + length])
+            position = index + length
+
+    def _append(self, data: bytes):
+        if not data:
+            return
+        if self._writer:
+            self._write_spooled(data)
+            return
+        self._string += data
+        if self._url_value and len(self._string) >= self.threshold and _DATA_URI_HEADER.match(self._string):
+            self._marker, self._writer = self.spool.new_writer()
+            self._decoder = codecs.getincrementaldecoder("utf-8")()
+            data, self._string = bytes(self._string), bytearray()
+            self._write_spooled(data)
+
+    def _write_spooled(self, data: bytes):
+        text = self._decoder.decode(data)
+        if "\\" in text:
+            # Escapes are never split across pieces, so each piece unescapes on its own
+            text = json.loads(f'"{text}"')
+        self._writer.write(text)
+
+    def _end_string(self):
+        self._in_string = False
+        if not self._writer:
+            self._out += b'"' + self._string + b'"'
+            self._string = bytearray()
+            return
+        try:
+            self.spool.add(self._marker, self._writer.close())
+        except ValueError:
+            self.spool.refs.pop(self._marker, None)
+        self._out += json.dumps(self._marker).encode()
+        self._writer = self._marker = None
+
+    def finish(self):
+        """Parses what was read, with spooled strings replaced by markers."""
+        if self._in_string or self._carry:
+            raise ValueError("request body ended inside a string")
+        return json.loads(bytes(self._out))
+
+
+async def read_spooled_json(request, spool: Spool, max_bytes: int = MAX_BODY_BYTES):
+    """
+    Streams a request's JSON body through a SpoolingJSONReader, raising
+    BodyTooLarge as soon as more than `max_bytes` have been sent.
+    """
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise BodyTooLarge(f"Request body is larger than {max_bytes} bytes")
+    reader = SpoolingJSONReader(spool)
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise BodyTooLarge(f"Request body is larger than {max_bytes} bytes")
+        reader.feed(chunk)
+    if len(spool.refs):
+        logger.info(f"📦 Spooled {len(spool.refs)} attachment(s) from a {received}-byte request body")
+    return reader.finish()
@@ -0,0 +1,94 @@
+# response_parser.py
+import re
+
+START_MARKER = re.compile(r"\[START ([^\]\n]{1,200})\]")
+# Longest possible "[START <path>]" marker; a split marker can't be longer
+MAX_MARKER_LENGTH = 208
+
+
+class MalformedResponseError(ValueError):
+    """Raised when a (partial) LLM response clearly can't yield valid files."""
+
+
+class StreamingFileParser:
+    """
+    Incrementally extracts `[START path] ... [END path]` blocks from an LLM
+    response as it streams in. Each file is emitted (via `on_file`) as soon
+    as its END marker arrives, and any number of files is supported.
+
+    Raises MalformedResponseError early when no START marker shows up in
+    the first `max_preamble_bytes`, or the response exceeds `max_total_bytes`,
+    so a doomed generation can be cancelled instead of paid for in full.
+    """
+
+    def __init__(self, on_file=None, max_preamble_bytes: int = 4000, max_total_bytes: int = 2_000_000):
+        self.on_file = on_file
+        self.max_preamble_bytes = max_preamble_bytes
+        self.max_total_bytes = max_total_bytes
+        self.files = {}
+        self.total_bytes = 0
+        self._buffer = ""
+        self._current_path = None
+        self._end_marker = None
+        self._search_from = 0
+        self._seen_start = False
+        self._preamble_bytes = 0
+
+    def feed(self, chunk: str) -> list[tuple[str, str]]:
+        """
+        Consumes the next piece of the response and returns the files
+        completed by it, as (path, content) pairs.
+        """
+        self.total_bytes += len(chunk)
+        if self.total_bytes > self.max_total_bytes:
+            raise MalformedResponseError(f"Response exceeded {self.max_total_bytes} bytes")
+
+        self._buffer += chunk
+        completed = []
+        while True:
+            if self._current_path is None:
+                if not self._find_start():
+                    break
+            else:
+                end = self._buffer.find(self._end_marker, self._search_from)
+                if end == -1:
+                    # Only the tail could still hold the start of a split END marker
+                    self._search_from = max(0, len(self._buffer) - len(self._end_marker) + 1)
+                    break
+                content = self._buffer[:end].strip()
+                self._buffer = self._buffer[end + len(self._end_marker):]
+                completed.append(self._emit(self._current_path, content))
+                self._current_path = None
+        return completed
+
+    def _find_start(self) -> bool:
+        match = START_MARKER.search(self._buffer)
+        if match is None:
+            # Text outside blocks is discarded, keeping enough for a split marker
+            discarded = max(0, len(self._buffer) - MAX_MARKER_LENGTH)
+            self._buffer = self._buffer[discarded:]
+            if not self._seen_start:
+                self._preamble_bytes += discarded
+                if self._preamble_bytes + len(self._buffer) > self.max_preamble_bytes:
+                    raise MalformedResponseError(
+                        f"No [START ...] marker in the first {self.max_preamble_bytes} bytes"
+                    )
+            return False
+
+        self._seen_start = True
+        self._current_path = match.group(1).strip()
+        self._end_marker = f"[END {self._current_path}]"
+        self._buffer = self._buffer[match.end():]
+        self._search_from = 0
+        return True
+
+    def _emit(self, path: str, content: str) -> tuple[str, str]:
+        self.files[path] = content
+        if self.on_file:
+            self.on_file(path, content)
+        return path, content
+
+    @property
+    def unterminated_path(self) -> str | None:
+        """Path of a block that was opened but never closed, if any."""
+        return self._current_path
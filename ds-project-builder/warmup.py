@@ -0,0 +1,56 @@
+# warmup.py
+import threading
+import time
+from observability import get_logger
+
+logger = get_logger(__name__)
+
+
+class WarmUp:
+    """
+    Runs slow dependency initialization (SDK imports, TLS handshakes,
+    database opens) on a background thread after startup, so the process
+    can accept liveness checks immediately. `steps` maps a name to a
+    no-argument callable; a failing step is reported, doesn't block the
+    others, and is retried every `retry_interval` seconds until it succeeds.
+    """
+
+    def __init__(self, steps: dict, retry_interval: float = 10):
+        self.steps = steps
+        self.retry_interval = retry_interval
+        self._status = {name: {"status": "pending"} for name in steps}
+        self._done = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="warm-up", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        started = time.perf_counter()
+        self._run_steps(self.steps)
+        self._done.set()
+        logger.info(f"🔥 Warm-up finished in {time.perf_counter() - started:.2f}s")
+        while failed := {name: step for name, step in self.steps.items() if self._status[name]["status"] != "ok"}:
+            time.sleep(self.retry_interval)
+            self._run_steps(failed)
+
+    def _run_steps(self, steps: dict):
+        for name, step in steps.items():
+            step_started = time.perf_counter()
+            try:
+                step()
+                self._status[name] = {"status": "ok"}
+            except Exception as e:
+                self._status[name] = {"status": "error", "error": str(e)}
+                logger.warning(f"⚠️ Warm-up step '{name}' failed: {e}")
+            self._status[name]["seconds"] = round(time.perf_counter() - step_started, 3)
+
+    @property
+    def ready(self) -> bool:
+        """True once every step has succeeded."""
+        return self._done.is_set() and all(step["status"] == "ok" for step in self._status.values())
+
+    def status(self) -> dict:
+        return {"ready": self.ready, "finished": self._done.is_set(), "steps": dict(self._status)}
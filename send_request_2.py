@@ -32,7 +32,7 @@ try:
     response = requests.post(url, json=payload)
 
     # Check the HTTP status code from the server
-    if response.status_code == 200:
+    if response.status_code in (200, 202):
         print("✅ Success! Server responded with:")
         print(response.json()) # Print the JSON response from the server
     else: